@@ -1,4 +1,5 @@
 import asyncio
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 import json
@@ -7,17 +8,29 @@ from google.adk.tools import ToolContext
 import re
 from google.adk.events import Event, EventActions
 import time
-from google.api_core.exceptions import ServiceUnavailable, DeadlineExceeded, InternalServerError 
-import traceback
+import threading
+import uuid
+import os
+from collections import OrderedDict
+from google.genai import types
 
 # Import your agents
 from process_mapping_agent.excel_understanding_agent import excel_understanding_agent
 from process_mapping_agent.mapping_agent import process_visualization_agent as mapping_agent
+from process_mapping_agent.mapping_agent import render_process_map_directly
+from process_mapping_agent.tools.diagram_store import get_diagram, put_diagram
+from process_mapping_agent.tools.generate_process_diagram_tool import render_process_diagram_update
+from process_mapping_agent.tools.process_map_diff import summarize_changes
+from process_mapping_agent.tools.process_map_patch import apply_step_ops, assign_step_ids, compact_map, map_fingerprint
+from process_mapping_agent.tools.product_scoring import select_products
 from process_mapping_agent.sub_agents.product_selector_agent import product_selector_agent
 from process_mapping_agent.sub_agents.feedback_agent import feedback_agent
 from process_mapping_agent.sub_agents.final_output_agent import final_output_agent
 
 from file_store import FILES
+from job_queue import JobQueue, report_progress
+from llm_cache import LLM_CACHE
+from retry_policy import RetryPolicy, StreamInterruptedError, get_retry_metrics
 
 def clean_json_string(text):
     """Removes markdown code blocks and extra whitespace."""
@@ -66,38 +79,18 @@ def json_safe(obj):
 
 
 
-def run_with_retry(func, *args, retries=3, delay=2, **kwargs):
-    """
-    Robust execution wrapper. Retries on ANY crash.
-    """
-    last_exception = None
-    
-    for attempt in range(retries):
-        try:
-            return func(*args, **kwargs)
-            
-        except Exception as e:
-            # We now catch EVERYTHING (Exception), not just specific ones.
-            # This ensures 'AttributeError', 'RuntimeError', etc. are all retried.
-            
-            error_name = type(e).__name__
-            print(f"⚠️ [Attempt {attempt+1}/{retries}] Hit error: {error_name} - {e}")
-            
-            # Specific check: If it's a fatal Auth error, don't retry (waste of time)
-            if "PermissionDenied" in str(e) or "Unauthenticated" in str(e):
-                raise e
-            
-            last_exception = e
-            
-            # Exponential backoff: Wait 2s, then 4s, then 6s
-            sleep_time = delay * (attempt + 1)
-            time.sleep(sleep_time)
-
-    # If we get here, it's a persistent failure.
-    print(f"❌ All {retries} retries failed.")
-    print("Traceback of last error:")
-    traceback.print_exc() # Print full details to console for debugging
-    raise last_exception
+# Shared by every agent call (see retry_policy.py): jittered exponential
+# backoff, no retries for errors that would just happen again, an overall
+# deadline per call and one circuit breaker for the model endpoint.
+LLM_RETRY_POLICY = RetryPolicy(max_attempts=3, base_delay=2.0, deadline=180.0)
+
+# Product Selector:
+#   "rules"        -> local scoring, LLM only to break a tie (default)
+#   "rules+reason" -> local scoring, LLM also writes the reason text
+#   "llm"          -> the LLM does everything (old behaviour)
+PRODUCT_SELECTOR_MODE = os.environ.get("PRODUCT_SELECTOR_MODE", "rules").lower()
+
+
 # ----------------------------------------------------------------------------
 # Helper: create a Runner for each agent
 # ----------------------------------------------------------------------------
@@ -117,32 +110,104 @@ _feedback_runner = _make_runner(feedback_agent)
 _final_output_runner = _make_runner(final_output_agent)
 
 
+# ----------------------------------------------------------------------------
+# Background event loop
+# ----------------------------------------------------------------------------
+# One long-lived loop in a daemon thread runs every agent call. The model's
+# HTTP client (and its connection pool) is cached per event loop, so with
+# asyncio.run per call it was rebuilt and torn down on every call and retry.
+# Keeping one loop alive lets those connections be reused across agents and
+# requests, and makes nest_asyncio unnecessary.
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="agent-runner-loop", daemon=True
+            ).start()
+    return _loop
+
+
+def run_sync(coro):
+    """Runs a coroutine on the shared background loop and blocks for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+
+def _new_run_session_id(session_id):
+    """
+    Every agent call runs in its own throwaway ADK session, prefixed with the
+    browser session id. Concurrent users (or reruns) never share history.
+    """
+    return f"{session_id}-{uuid.uuid4().hex[:8]}"
+
+
+async def _run_in_session(runner, message, session_id, run_session_id):
+    try:
+        return await runner.run_debug(
+            message, user_id=session_id, session_id=run_session_id
+        )
+    finally:
+        # Clean up on completion AND on failure, or InMemorySessionService grows forever
+        await runner.session_service.delete_session(
+            app_name=runner.app_name, user_id=session_id, session_id=run_session_id
+        )
+
+
 # ----------------------------------------------------------------------------
 # RUN FUNCTIONS USED BY STREAMLIT
 # ----------------------------------------------------------------------------
 
 
-def run_understanding_agent(uploaded_files):
-    session_id = "default_session" 
+async def arun_understanding_agent(uploaded_files, session_id="default_session"):
+    # The metadata tool looks the uploads up by the ADK session id
+    run_session_id = _new_run_session_id(session_id)
 
-    FILES[session_id] = {
+    FILES[run_session_id] = {
         f.name: f.getvalue() for f in uploaded_files
     }
     
-    file_names = list(FILES[session_id].keys())
+    file_names = list(FILES[run_session_id].keys())
     prompt = f"Please analyze these files: {file_names}. Call the specified metadata tool."
 
     # Simple run, no complex session injection needed
-    def _attempt_run():
-        events = asyncio.run(
-            _understanding_runner.run_debug(prompt, session_id=session_id)
-        ) 
+    async def _attempt_run():
+        events = await _run_in_session(
+            _understanding_runner, prompt, session_id, run_session_id
+        )
         
         llm_text = extract_text_from_events(events)
         return json.loads(llm_text)
-    return run_with_retry(_attempt_run, retries=3)
 
-def run_product_selector_agent(understanding_json):
+    try:
+        return await LLM_RETRY_POLICY.run(_attempt_run)
+    finally:
+        # The bytes are only needed while the tool runs. Abandoned sessions
+        # are also dropped by the file store's TTL.
+        FILES.discard(run_session_id)
+
+
+def run_understanding_agent(uploaded_files, session_id="default_session"):
+    return run_sync(arun_understanding_agent(uploaded_files, session_id))
+
+async def arun_product_selector_agent(understanding_json, session_id="default_session", use_cache=True):
+    # 0. Local rule-based scoring; the LLM is only needed for ties (or prose)
+    if PRODUCT_SELECTOR_MODE != "llm":
+        selection = select_products(understanding_json)
+        if selection is not None:
+            needs_llm = selection["tied"] or (
+                PRODUCT_SELECTOR_MODE == "rules+reason" and selection["result"]["top_5_tools"]
+            )
+            if not needs_llm:
+                return json.dumps(selection["result"])
+            return await _llm_finish_product_selection(understanding_json, selection, session_id, use_cache)
+
     # 1. Force conversion to String (Reliable!)
     # Whether it's the Mock Dict or real result, we turn it into a string.
     if isinstance(understanding_json, (dict, list)):
@@ -151,35 +216,137 @@ def run_product_selector_agent(understanding_json):
         json_str = understanding_json
 
 
-    def _attempt_run():
-        events = asyncio.run(
-            _product_selector_runner.run_debug(
-                json_str
-            )
+    async def _attempt_run():
+        events = await _run_in_session(
+            _product_selector_runner, json_str,
+            session_id, _new_run_session_id(session_id)
         )
         return extract_text_from_events(events)
     
-    # 3. Extract text safely
-    return run_with_retry(_attempt_run, retries=3)
+    # 3. Extract text safely (same input + same agent -> cached answer)
+    return await LLM_CACHE.run(
+        product_selector_agent, json_str,
+        lambda: LLM_RETRY_POLICY.run(_attempt_run), use_cache=use_cache
+    )
+
 
+async def _llm_finish_product_selection(understanding_json, selection, session_id, use_cache=True):
+    """
+    Sends the rule-based ranking to the Product Selector LLM to pick between
+    tied tools and/or write the reason. The ranking stays authoritative: a
+    pick outside the candidates is ignored, and any failure returns the
+    rule-based result as is.
+    """
+    result = dict(selection["result"])
+    candidates = selection["tied"] or [result["recommended_tool"]]
+
+    if isinstance(understanding_json, str):
+        understanding_json = json.loads(clean_json_string(understanding_json))
+    payload = {
+        **understanding_json,
+        "rule_based_ranking": {
+            "top_5_tools": result["top_5_tools"],
+            "candidates": candidates,
+            "scores": selection["ranking"][:5],
+        },
+    }
+
+    message = json.dumps(payload)
+
+    async def _attempt_run():
+        events = await _run_in_session(
+            _product_selector_runner, message,
+            session_id, _new_run_session_id(session_id)
+        )
+        return extract_text_from_events(events)
+
+    try:
+        llm_text = await LLM_CACHE.run(
+            product_selector_agent, message,
+            lambda: LLM_RETRY_POLICY.run(_attempt_run), use_cache=use_cache
+        )
+        llm_result = json.loads(clean_json_string(llm_text))
+    except Exception as e:
+        print(f"Product Selector LLM step failed ({e}), using the rule-based result.")
+        return json.dumps(result)
+
+    if llm_result.get("recommended_tool") in candidates:
+        result["recommended_tool"] = llm_result["recommended_tool"]
+    if llm_result.get("reason_for_recommendation"):
+        result["reason_for_recommendation"] = llm_result["reason_for_recommendation"]
+    return json.dumps(result)
+
+
+def run_product_selector_agent(understanding_json, session_id="default_session", use_cache=True):
+    return run_sync(arun_product_selector_agent(understanding_json, session_id, use_cache))
+
+
+async def arun_mapping_agent(understanding_json, session_id="default_session", direct=True, use_cache=True):
+    # 0. Fast path: a valid process_map is rendered locally, no LLM call.
+    #    Rendering runs in a worker thread so the event loop isn't blocked.
+    if direct:
+        result = await asyncio.to_thread(render_process_map_directly, understanding_json)
+        if result is not None:
+            return result
 
-def run_mapping_agent(understanding_json):
     # 1. Force conversion to String
     if isinstance(understanding_json, (dict, list)):
         json_str = json.dumps(understanding_json)
     else:
         json_str = understanding_json
 
-    def _attempt_run():
-        events = asyncio.run(
-            _mapping_runner.run_debug(
-                json_str
-            )
+    async def _attempt_run():
+        events = await _run_in_session(
+            _mapping_runner, json_str,
+            session_id, _new_run_session_id(session_id)
         )
 
         return extract_text_from_events(events)
-    
-    return run_with_retry(_attempt_run, retries=3)
+
+    # A cached diagram reference is only good while the diagram is still stored
+    return await LLM_CACHE.run(
+        mapping_agent, json_str, lambda: LLM_RETRY_POLICY.run(_attempt_run),
+        use_cache=use_cache, validate=lambda text: get_diagram(text) is not None
+    )
+
+
+def run_mapping_agent(understanding_json, session_id="default_session", direct=True, use_cache=True):
+    return run_sync(arun_mapping_agent(understanding_json, session_id, direct, use_cache))
+
+
+async def arun_mapping_and_product(understanding_json, session_id="default_session", use_cache=True):
+    """
+    Step 3: both agents only need understanding_json, so they are fanned out
+    together on ONE event loop. Wall time is the slower of the two LLM
+    round-trips instead of their sum.
+    Returns (map_result, product_result, timings).
+    """
+    timings = {}
+
+    async def _timed(name, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            timings[f"{name}_seconds"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    map_result, product_result = await asyncio.gather(
+        _timed("mapping", arun_mapping_agent(understanding_json, session_id, use_cache=use_cache)),
+        _timed("product_selector", arun_product_selector_agent(understanding_json, session_id, use_cache)),
+    )
+    timings["total_seconds"] = round(time.perf_counter() - start, 3)
+    # What running them back to back would have cost
+    timings["saved_seconds"] = round(
+        timings["mapping_seconds"] + timings["product_selector_seconds"] - timings["total_seconds"], 3
+    )
+    print(f"⏱️ Step 3 timings: {timings}")
+
+    return map_result, product_result, timings
+
+
+def run_mapping_and_product_agents(understanding_json, session_id="default_session", use_cache=True):
+    return run_sync(arun_mapping_and_product(understanding_json, session_id, use_cache))
 
 
     # # 2. Inject into variable named "text" (or "understanding_json")
@@ -193,9 +360,70 @@ def run_mapping_agent(understanding_json):
     # return extract_text_from_events(events)
 
 
-# agent_runner.py
-
-def run_feedback_agent(understanding_json, product_selection, user_feedback):
+# ----------------------------------------------------------------------------
+# Feedback conversations
+# ----------------------------------------------------------------------------
+# The Feedback Agent answers with step operations (FeedbackPatchSchema), not
+# the whole map, and each browser session keeps one ADK session with it. The
+# full map is only sent as a checkpoint: on the first turn, every
+# FEEDBACK_CHECKPOINT_TURNS turns (so the history stays short), and whenever
+# the map isn't the one the conversation ended with (new analysis, failed turn).
+# Turns in between send just the feedback.
+
+FEEDBACK_CHECKPOINT_TURNS = int(os.environ.get("FEEDBACK_CHECKPOINT_TURNS", "5"))
+# Open feedback conversations kept; the least recently used one is dropped.
+FEEDBACK_THREADS_MAX = int(os.environ.get("FEEDBACK_THREADS_MAX", "256"))
+
+# browser session id -> {"run_session_id", "turns", "fingerprint", "last_turn"}.
+# Only touched from coroutines on the background loop.
+_FEEDBACK_THREADS = OrderedDict()
+
+_FEEDBACK_METRICS = {
+    "turns": 0,
+    "checkpoints": 0,
+    "deltas": 0,
+    "ops_applied": 0,
+    "ops_rejected": 0,
+    "prompt_tokens": 0,
+    "output_tokens": 0,
+}
+
+
+def get_feedback_metrics():
+    metrics = dict(_FEEDBACK_METRICS)
+    turns = metrics["turns"]
+    metrics["avg_output_tokens"] = round(metrics["output_tokens"] / turns, 1) if turns else 0.0
+    metrics["open_conversations"] = len(_FEEDBACK_THREADS)
+    return metrics
+
+
+def _drop_feedback_thread(session_id):
+    thread = _FEEDBACK_THREADS.pop(session_id, None)
+    if thread is not None:
+        # Scheduled, not awaited: this also runs while a turn is being cancelled
+        asyncio.ensure_future(_feedback_runner.session_service.delete_session(
+            app_name=_feedback_runner.app_name, user_id=session_id, session_id=thread["run_session_id"]
+        ))
+
+
+def _new_feedback_thread(session_id):
+    _drop_feedback_thread(session_id)
+    thread = {"run_session_id": _new_run_session_id(session_id), "turns": 0, "fingerprint": None, "last_turn": None}
+    _FEEDBACK_THREADS[session_id] = thread
+    while len(_FEEDBACK_THREADS) > FEEDBACK_THREADS_MAX:
+        _drop_feedback_thread(next(iter(_FEEDBACK_THREADS)))
+    return thread
+
+
+def _record_usage(events):
+    for event in events:
+        usage = getattr(event, "usage_metadata", None)
+        if usage is not None:
+            _FEEDBACK_METRICS["prompt_tokens"] += usage.prompt_token_count or 0
+            _FEEDBACK_METRICS["output_tokens"] += usage.candidates_token_count or 0
+
+
+async def arun_feedback_agent(understanding_json, product_selection, user_feedback, session_id="default_session"):
     """
     Runs the feedback loop. 
     NOTE: We replaced 'map_png_bytes' with 'product_selection' 
@@ -209,32 +437,158 @@ def run_feedback_agent(understanding_json, product_selection, user_feedback):
     if isinstance(product_selection, str):
         product_selection = json.loads(product_selection)
 
-    # 2. Construct the Payload to match your PROMPT'S "INPUT FORMAT"
-    # We use a placeholder for the path because the agent just needs to know one exists.
-    payload = {
-        "mapping_agent_output": {
-            "process_map": understanding_json.get("process_map", []),
-            "process_diagram_path": "process_map.png" 
-        },
-        "product_agent_output": product_selection,
-        "user_feedback": user_feedback
+    # 2. Give every step a stable id: the agent's operations refer to them
+    current_map = assign_step_ids(understanding_json.get("process_map", []))
+    current_tool = (product_selection or {}).get("recommended_tool")
+    fingerprint = map_fingerprint(current_map, current_tool)
+
+    async def _attempt_run():
+        # 3. Checkpoint (full state, new conversation) or delta (feedback only)
+        thread = _FEEDBACK_THREADS.get(session_id)
+        checkpoint = (
+            thread is None
+            or thread["fingerprint"] != fingerprint
+            or thread["turns"] >= FEEDBACK_CHECKPOINT_TURNS
+        )
+        if checkpoint:
+            thread = _new_feedback_thread(session_id)
+            # We use a placeholder for the path because the agent just needs to know one exists.
+            payload = {
+                "mode": "checkpoint",
+                "mapping_agent_output": {
+                    "process_map": compact_map(current_map),
+                    "process_diagram_path": "process_map.png"
+                },
+                "product_agent_output": product_selection,
+                "user_feedback": user_feedback
+            }
+        else:
+            _FEEDBACK_THREADS.move_to_end(session_id)
+            payload = {"mode": "delta", "user_feedback": user_feedback}
+            if thread["last_turn"]:
+                payload["last_turn"] = thread["last_turn"]
+
+        # 4. Run the Agent in the conversation's session (kept between turns)
+        try:
+            events = await _feedback_runner.run_debug(
+                json.dumps(payload), user_id=session_id, session_id=thread["run_session_id"]
+            )
+            text = extract_text_from_events(events)
+        except BaseException:
+            # The session may hold half a turn now: the next attempt starts from a checkpoint
+            _drop_feedback_thread(session_id)
+            raise
+
+        _FEEDBACK_METRICS["turns"] += 1
+        _FEEDBACK_METRICS["checkpoints" if checkpoint else "deltas"] += 1
+        _record_usage(events)
+        return text
+
+    result_text = await LLM_RETRY_POLICY.run(_attempt_run)
+
+    # 5. Apply the operations locally, then redraw from the diff and replace
+    #    changes_made with a computed summary
+    result_text, state = await asyncio.to_thread(apply_feedback_ops, result_text, current_map, current_tool)
+    thread = _FEEDBACK_THREADS.get(session_id)
+    if state is None:
+        _drop_feedback_thread(session_id)  # no usable answer: don't build on it
+    elif thread is not None:
+        thread["turns"] += 1
+        thread["fingerprint"] = state["fingerprint"]
+        thread["last_turn"] = state["last_turn"]
+
+    return await asyncio.to_thread(
+        apply_process_map_diff, result_text, current_map, current_tool
+    )
+
+
+def apply_feedback_ops(result_text, current_map, current_tool=None):
+    """
+    Applies the Feedback Agent's process_map_ops to current_map and writes
+    the result into "updated_process_map" (what the rest of the app reads).
+    Returns (result_text, state); state is None when the answer couldn't be
+    used, else {"fingerprint" of the new map + tool, "last_turn" notes for the agent}.
+    """
+    try:
+        data = json.loads(clean_json_string(result_text))
+    except (TypeError, ValueError):
+        return result_text, None
+    if not isinstance(data, dict):
+        return result_text, None
+
+    if "process_map_ops" in data:
+        updated_map, applied, rejected = apply_step_ops(current_map, data.get("process_map_ops") or [])
+        _FEEDBACK_METRICS["ops_applied"] += len(applied)
+        _FEEDBACK_METRICS["ops_rejected"] += len(rejected)
+        data["updated_process_map"] = updated_map
+    else:
+        # Full-map answer (older prompt): still accepted
+        updated_map, applied, rejected = assign_step_ids(data.get("updated_process_map") or current_map), [], []
+        data["updated_process_map"] = updated_map
+
+    last_turn = {}
+    if rejected:
+        print(f"DEBUG: {len(rejected)} feedback op(s) rejected: {[op['error'] for op in rejected]}")
+        last_turn["rejected_ops"] = rejected
+        data["rejected_ops"] = rejected
+        data["agent_response_message"] = (
+            f"{data.get('agent_response_message', '')} "
+            f"({len(rejected)} of the requested changes could not be applied.)"
+        ).strip()
+    renamed = {
+        op["requested_step_id"] or op["fields"]["step_name"]: op["step_id"]
+        for op in applied if "requested_step_id" in op
     }
+    if renamed:
+        last_turn["renamed_ids"] = renamed
 
-    # 3. Convert to String for the "Direct Message" pattern
-    json_str = json.dumps(payload)
+    new_tool = data.get("updated_recommended_tool") or current_tool
+    state = {"fingerprint": map_fingerprint(updated_map, new_tool), "last_turn": last_turn or None}
+    return json.dumps(data), state
 
-    # 4. Run the Agent
-    def _attempt_run():
-        events = asyncio.run(
-            _feedback_runner.run_debug(json_str)
-        )
 
-        # 5. Use the SAFE extractor
-        return extract_text_from_events(events)
+def apply_process_map_diff(result_text, previous_map, previous_tool=None):
+    """
+    Post-processes the Feedback Agent's JSON: diffs updated_process_map
+    against the map it was given, redraws the diagram incrementally and
+    writes a structured change summary ("change_summary") plus a computed
+    changes_made. Unparseable output is returned unchanged.
+    """
+    try:
+        data = json.loads(clean_json_string(result_text))
+    except (TypeError, ValueError):
+        return result_text
+    if not isinstance(data, dict):
+        return result_text
+
+    updated_map = data.get("updated_process_map") or []
+    if not updated_map:
+        return result_text
+
+    try:
+        png_bytes, diff = render_process_diagram_update(previous_map, updated_map, fmt="png")
+        if diff["has_changes"]:
+            data["updated_process_diagram_path"] = put_diagram(png_bytes, "png")
+    except Exception as e:
+        print(f"DEBUG: Incremental diagram update failed: {e}")
+        return result_text
+
+    summary = summarize_changes(diff)
+    new_tool = data.get("updated_recommended_tool")
+    if new_tool and new_tool != previous_tool:
+        tool_change = f"Recommended tool -> {new_tool}"
+        summary = tool_change if summary == "none" else f"{summary}; {tool_change}"
 
-    return run_with_retry(_attempt_run, retries=3)
+    data["change_summary"] = diff
+    data["changes_made"] = summary
+    return json.dumps(data)
 
-def run_final_output_agent(understanding_json, product_selection, feedback):
+
+def run_feedback_agent(understanding_json, product_selection, user_feedback, session_id="default_session"):
+    return run_sync(arun_feedback_agent(understanding_json, product_selection, user_feedback, session_id))
+
+
+def _final_output_message(understanding_json, product_selection, feedback):
     # 1. Structure the data to match your Agent Prompt's "INPUT CONTEXT"
     #    We assume the png is always at this standard path.
     payload = {
@@ -246,17 +600,254 @@ def run_final_output_agent(understanding_json, product_selection, feedback):
         "feedback_history": feedback
     }
 
-    # 2. Create a NEW Runner instance locally.
-    #    This ensures the agent starts with a blank memory slate every time you click the button.
-    
-
-    # 3. Send as a single JSON string.
+    # 2. Send as a single JSON string.
     #    This prevents the "User > key" iteration issue.
-    def _attempt_run():
-        events = asyncio.run(
-            _final_output_runner.run_debug(json.dumps(payload))
+    return json.dumps(payload)
+
+
+async def arun_final_output_agent(understanding_json, product_selection, feedback, session_id="default_session",
+                                  use_cache=True):
+    # Every call runs in a fresh throwaway session, so the agent starts with a blank memory slate
+    message = _final_output_message(understanding_json, product_selection, feedback)
+
+    async def _attempt_run():
+        events = await _run_in_session(
+            _final_output_runner, message,
+            session_id, _new_run_session_id(session_id)
         )
 
         return extract_text_from_events(events)
 
-    return run_with_retry(_attempt_run, retries=3)
\ No newline at end of file
+    return await LLM_CACHE.run(
+        final_output_agent, message, lambda: LLM_RETRY_POLICY.run(_attempt_run), use_cache=use_cache
+    )
+
+
+def run_final_output_agent(understanding_json, product_selection, feedback, session_id="default_session",
+                           use_cache=True):
+    return run_sync(arun_final_output_agent(understanding_json, product_selection, feedback, session_id, use_cache))
+
+
+# ----------------------------------------------------------------------------
+# Streaming Final Output
+# ----------------------------------------------------------------------------
+# The report is long, so instead of waiting for the whole answer the app
+# shows it as the model writes it (SSE streaming: partial events carry the
+# new text, the last event carries the whole answer).
+
+_STREAM_METRICS = {
+    "streams": 0,
+    "cached": 0,
+    "last_ttft_seconds": None,
+    "last_total_seconds": None,
+    "ttft_seconds_total": 0.0,
+    "total_seconds_total": 0.0,
+}
+_stream_metrics_lock = threading.Lock()
+
+
+def get_stream_metrics():
+    with _stream_metrics_lock:
+        metrics = dict(_STREAM_METRICS)
+    streams = metrics.pop("streams")
+    ttft_total = metrics.pop("ttft_seconds_total")
+    total_total = metrics.pop("total_seconds_total")
+    metrics["streams"] = streams
+    metrics["avg_ttft_seconds"] = round(ttft_total / streams, 3) if streams else None
+    metrics["avg_total_seconds"] = round(total_total / streams, 3) if streams else None
+    return metrics
+
+
+def _record_stream(ttft, total, cached):
+    with _stream_metrics_lock:
+        _STREAM_METRICS["streams"] += 1
+        _STREAM_METRICS["cached"] += int(cached)
+        _STREAM_METRICS["last_ttft_seconds"] = round(ttft, 3)
+        _STREAM_METRICS["last_total_seconds"] = round(total, 3)
+        _STREAM_METRICS["ttft_seconds_total"] += ttft
+        _STREAM_METRICS["total_seconds_total"] += total
+
+
+def _event_text(event):
+    """Answer text of one event (thoughts and function calls left out)."""
+    content = getattr(event, "content", None)
+    if not content or not content.parts:
+        return ""
+    return "".join(
+        part.text for part in content.parts
+        if getattr(part, "text", None) and not getattr(part, "thought", False)
+    )
+
+
+async def _stream_in_session(runner, message, session_id, run_session_id):
+    """Like _run_in_session, but yields the events as they arrive (SSE streaming)."""
+    await runner.session_service.create_session(
+        app_name=runner.app_name, user_id=session_id, session_id=run_session_id
+    )
+    try:
+        events = runner.run_async(
+            user_id=session_id,
+            session_id=run_session_id,
+            new_message=types.Content(role="user", parts=[types.Part(text=message)]),
+            run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+        )
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+    finally:
+        # Clean up on completion AND on failure, or InMemorySessionService grows forever
+        await runner.session_service.delete_session(
+            app_name=runner.app_name, user_id=session_id, session_id=run_session_id
+        )
+
+
+async def astream_final_output_agent(understanding_json, product_selection, feedback,
+                                     session_id="default_session", use_cache=True):
+    """
+    Async generator over the Final Output Agent's answer:
+      {"type": "delta", "text": <new text>}   as the model writes
+      {"type": "done", "text": <whole report>, "ttft_seconds", "total_seconds", "cached"}
+    A cached report arrives as a single delta.
+
+    LLM_RETRY_POLICY retries the call as usual until the first text has been
+    shown; a failure after that raises StreamInterruptedError instead of
+    starting the report over.
+    """
+    message = _final_output_message(understanding_json, product_selection, feedback)
+    start = time.perf_counter()
+
+    cache_key, cached = await LLM_CACHE.lookup(final_output_agent, message, use_cache)
+    if cached is not None:
+        elapsed = time.perf_counter() - start
+        _record_stream(elapsed, elapsed, cached=True)
+        yield {"type": "delta", "text": cached}
+        yield {"type": "done", "text": cached, "ttft_seconds": elapsed, "total_seconds": elapsed, "cached": True}
+        return
+
+    deltas = asyncio.Queue()
+    first_token = []
+
+    async def _attempt_run():
+        final_text, streamed = None, []
+        try:
+            async for event in _stream_in_session(
+                _final_output_runner, message, session_id, _new_run_session_id(session_id)
+            ):
+                text = _event_text(event)
+                if not text:
+                    continue
+                if event.partial:
+                    if not first_token:
+                        first_token.append(time.perf_counter() - start)
+                    streamed.append(text)
+                    deltas.put_nowait(text)
+                else:
+                    # The closing event repeats the whole answer
+                    final_text = text
+        except Exception as e:
+            if streamed:
+                raise StreamInterruptedError(f"Report stream failed after {len(streamed)} chunks: {e}") from e
+            raise
+        final_text = final_text or "".join(streamed)
+        if not final_text.strip():
+            raise ValueError("No text output found in agent response.")
+        return final_text, bool(streamed)
+
+    # The whole call (retries included) runs as one task on this loop; this
+    # generator forwards its chunks as they are queued
+    call = asyncio.ensure_future(LLM_RETRY_POLICY.run(_attempt_run))
+    next_delta = None
+    try:
+        while True:
+            next_delta = asyncio.ensure_future(deltas.get())
+            await asyncio.wait({next_delta, call}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_delta.done():
+                break
+            yield {"type": "delta", "text": next_delta.result()}
+        while not deltas.empty():
+            yield {"type": "delta", "text": deltas.get_nowait()}
+        final_text, streamed = call.result()
+    finally:
+        # Also runs when the consumer stops early
+        for task in (next_delta, call):
+            if task is not None and not task.done():
+                task.cancel()
+
+    if not streamed:
+        # Nothing came through as partial events (e.g. a model without SSE)
+        first_token.append(time.perf_counter() - start)
+        yield {"type": "delta", "text": final_text}
+
+    ttft, total = first_token[0], time.perf_counter() - start
+    await LLM_CACHE.store(cache_key, final_output_agent, final_text, total)
+    _record_stream(ttft, total, cached=False)
+    print(f"Final output streamed: first token {ttft:.2f}s, complete {total:.2f}s")
+    yield {"type": "done", "text": final_text, "ttft_seconds": ttft, "total_seconds": total, "cached": False}
+
+
+# ----------------------------------------------------------------------------
+# Background jobs
+# ----------------------------------------------------------------------------
+# The app submits each pipeline step as a job (see job_queue.py) instead of
+# blocking its script thread: a rerun (any click) used to kill the run and
+# start the paid LLM calls over. Jobs live on the shared loop above.
+
+AGENT_JOB_WORKERS = int(os.environ.get("AGENT_JOB_WORKERS", "8"))
+AGENT_JOBS = JobQueue(_get_loop, workers=AGENT_JOB_WORKERS)
+
+
+async def arun_analysis(uploaded_files, session_id="default_session", use_cache=True,
+                        understanding_json=None, map_result=None, product_result=None):
+    """
+    Steps 2 + 3 as one job. Any of understanding_json / map_result /
+    product_result that is given (mock data) replaces that agent's run.
+    Returns {"understanding_json", "map_result", "product_result", "step3_timings"}.
+    """
+    if understanding_json is None:
+        report_progress("Running Understanding Agent (Gemini)...")
+        understanding_json = await arun_understanding_agent(uploaded_files, session_id)
+        if isinstance(understanding_json, str):
+            understanding_json = json.loads(clean_json_string(understanding_json))
+
+    step3_timings = None
+    if map_result is None and product_result is None:
+        # 3a + 3b. Both agents only need understanding_json -> run them together
+        report_progress("Running Mapping & Product Selector Agents...")
+        map_result, product_result, step3_timings = await arun_mapping_and_product(
+            understanding_json, session_id, use_cache
+        )
+    else:
+        if map_result is None:
+            report_progress("Running Mapping Agent...")
+            map_result = await arun_mapping_agent(understanding_json, session_id, use_cache=use_cache)
+        if product_result is None:
+            report_progress("Running Product Selector Agent...")
+            product_result = await arun_product_selector_agent(understanding_json, session_id, use_cache)
+
+    return {
+        "understanding_json": understanding_json,
+        "map_result": map_result,
+        "product_result": product_result,
+        "step3_timings": step3_timings,
+    }
+
+
+async def acollect_final_output(understanding_json, product_selection, feedback, session_id="default_session",
+                                use_cache=True):
+    """
+    Final output as a job: progress is {"text": <report so far>} while it
+    streams, the result is the stream's "done" item.
+    """
+    text = ""
+    async for item in astream_final_output_agent(understanding_json, product_selection, feedback,
+                                                 session_id, use_cache):
+        if item["type"] == "done":
+            return item
+        text += item["text"]
+        report_progress({"text": text})
+
+
+def get_job_stats():
+    return AGENT_JOBS.stats()
@@ -4,17 +4,27 @@ import re
 from typing import List, Any, Union, Dict
 import streamlit as st
 import datetime
-from docx import Document
-from docx.shared import Inches
-from io import BytesIO
-import nest_asyncio
-nest_asyncio.apply()  # <--- The Magic Line. Fixes the loop issues.
+import uuid
+import copy
+import hashlib
+from functools import partial
+from process_mapping_agent.tools.diagram_store import get_diagram
+from process_mapping_agent.tools.diagram_cache import get_diagram_cache_stats
+from process_mapping_agent.tools.diagram_render_service import get_render_service_stats
+from process_mapping_agent.tools.generate_process_diagram_tool import get_layout_stats
+from llm_cache import get_llm_cache_stats
+from report_export import get_docx_cache_stats, report_docx
+from report_store import REPORT_STORE, get_report_store_stats
+from job_queue import make_dedupe_key
 from agent_runner import (
-    run_understanding_agent,
-    run_mapping_agent,
-    run_product_selector_agent,
-    run_feedback_agent,
-    run_final_output_agent
+    AGENT_JOBS,
+    arun_analysis,
+    arun_feedback_agent,
+    acollect_final_output,
+    get_job_stats,
+    get_feedback_metrics,
+    get_stream_metrics,
+    get_retry_metrics
 )
 
 # --- MOCK DATA CONSTANTS ---
@@ -40,12 +50,27 @@ st.set_page_config(page_title="Excel Process Mapping", layout="wide")
 
 
 
-if "saved_reports" not in st.session_state:
-    st.session_state["saved_reports"] = []  # List of {timestamp, content, png_bytes, title}
+# Saved reports live in report_store (SQLite), keyed on this user id. The id
+# is never put in the URL (it would be a bearer token in links and history):
+# - signed in through Streamlit auth (st.login) -> derived from the account
+# - otherwise a random id for this browser session; the user can opt in to
+#   keeping the reports with the "restore key" in the sidebar
+if st.user.get("is_logged_in") and st.user.get("email"):
+    st.session_state["user_id"] = "auth-" + hashlib.sha256(st.user["email"].casefold().encode()).hexdigest()
+elif "user_id" not in st.session_state:
+    st.session_state["user_id"] = uuid.uuid4().hex
+if "user" in st.query_params:
+    # Links from older versions carried the id: never honour them, and drop it
+    del st.query_params["user"]
 
 if "is_dev" not in st.session_state:
     st.session_state["is_dev"] = False
 
+# One id per browser session, carried into every agent run so concurrent
+# users never see (or overwrite) each other's uploads.
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
+
 # --- HELPER FUNCTIONS ---
 
 def _clear_analysis_state():
@@ -56,78 +81,134 @@ def _clear_analysis_state():
         "product_result", 
         "feedback_result", 
         "feedback_history", 
-        "feedback_log"
+        "feedback_log",
+        "step3_timings"
     ]
     for key in keys_to_clear:
         if key in st.session_state:
             del st.session_state[key]
 
-def _save_report_to_app(report_content, map_path):
-    """Saves the current report to the sidebar list."""
+def _save_report_to_app(report_content, png_bytes):
+    """Saves the current report to the report store (listed in the sidebar)."""
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
     
     # Extract a title from the report or use default
     title = f"Report - {timestamp}"
     
-    # Store PNG bytes so we don't rely on the file system for saved reports
-    png_bytes = None
-    if map_path and os.path.exists(map_path):
-        with open(map_path, "rb") as f:
-            png_bytes = f.read()
-
-    report_entry = {
-        "id": len(st.session_state["saved_reports"]) + 1,
-        "title": title,
-        "content": report_content,
-        "png_bytes": png_bytes,
-        "timestamp": timestamp
-    }
-    st.session_state["saved_reports"].append(report_entry)
+    # Compressed on disk; the session only keeps the report on screen
+    REPORT_STORE.save(st.session_state["user_id"], title, report_content, png_bytes)
     st.toast(f"✅ Saved '{title}' to App!")
 
+# --- BACKGROUND JOBS ---
+# Agent runs are submitted to agent_runner.AGENT_JOBS and run off the script
+# thread, so clicks/reruns don't kill them. The page polls the session's job
+# for each step and picks the result up when it is done.
+
+JOB_POLL_SECONDS = 1.0
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _watch_job(kind, on_done, render_progress=None):
+    """
+    Shows the progress of this session's `kind` job (with a Cancel button);
+    once it finishes, hands the result to on_done and reruns the whole app.
+    Failures are kept in st.session_state[f"{kind}_error"].
+    """
+    session_id = st.session_state["session_id"]
+    job = AGENT_JOBS.latest(session_id, kind)
+    if job is None:
+        return
+
+    if job["status"] in ("queued", "running"):
+        progress = job["progress"]
+        if render_progress and progress:
+            render_progress(progress)
+        else:
+            label = progress if isinstance(progress, str) else "Queued..."
+            st.info(f"⏳ {label} ({job['run_seconds']:.0f}s)")
+        if st.button("✖ Cancel", key=f"cancel_{kind}"):
+            AGENT_JOBS.cancel(job["id"], session_id)
+            st.rerun()
+        return
+
+    AGENT_JOBS.forget(session_id, kind)
+    if job["status"] == "done":
+        try:
+            # Results can be shared by deduplicated jobs: never mutate them in place
+            on_done(copy.deepcopy(job["result"]))
+        except Exception as e:
+            st.session_state[f"{kind}_error"] = f"Failed: {e}"
+    elif job["status"] == "failed":
+        st.session_state[f"{kind}_error"] = f"Failed: {job['error']}"
+    st.rerun()
+
+def _show_job(kind, on_done, render_progress=None):
+    """Renders the watcher only while there is something to watch (plus the last error)."""
+    error = st.session_state.pop(f"{kind}_error", None)
+    if error:
+        st.error(error)
+    if AGENT_JOBS.latest(st.session_state["session_id"], kind):
+        _watch_job(kind, on_done, render_progress)
+
+def _apply_feedback_result(result_str):
+    """Applies the Feedback Agent's answer to the session (map, products, log)."""
+    new_data = _smart_parse_json(result_str)
+    
+    # 1. CAPTURE THE VOICE MESSAGE
+    if new_data.get("agent_response_message"):
+        st.session_state["last_agent_response"] = new_data["agent_response_message"]
+    else:
+        # Fallback if agent is silent
+        st.session_state["last_agent_response"] = "Updates applied successfully."
+
+    # A. Update Map Path
+    if new_data.get("updated_process_diagram_path"):
+        st.session_state["map_result"] = new_data["updated_process_diagram_path"]
+        
+    # B. Update Product Recs
+    if new_data.get("updated_recommended_tool"):
+        current_prods = _smart_parse_json(st.session_state.get("product_result", {}))
+        current_prods["recommended_tool"] = new_data["updated_recommended_tool"]
+        current_prods["reason_for_recommendation"] = new_data.get("updated_reason_for_tool", "")
+        st.session_state["product_result"] = current_prods
+            
+    # C. Update Core JSON
+    if new_data.get("updated_process_map"):
+        st.session_state["understanding_json"]["process_map"] = new_data["updated_process_map"]
+
+    # D. Save Log & Refresh
+    # Only save to history if actual changes occurred.
+    changes_text = new_data.get("changes_made", "").lower()
+    
+    # List of phrases that mean "Nothing happened"
+    no_change_phrases = ["none", "no changes", "no changes made", "n/a"]
+    
+    is_meaningful_change = (
+        changes_text and 
+        changes_text not in no_change_phrases and 
+        "no changes" not in changes_text
+    )
+
+    if is_meaningful_change:
+        st.session_state["feedback_log"] = new_data
+        st.session_state["feedback_history"].append(new_data) # Only append real work
+        print("DEBUG: Change logged.")
+    else:
+        print("DEBUG: Skipped logging (Conversation only).")
+
+
 st.title("📊 Excel Process Mapping Assistant")
 
 def _extract_png_bytes(map_result: Any) -> bytes | None:
-    if isinstance(map_result, str) and os.path.exists(map_result):
+    # Diagram references ("process_map_<hash>.png") resolve from memory
+    if isinstance(map_result, str) and get_diagram(map_result):
+        return get_diagram(map_result)
+    elif isinstance(map_result, str) and os.path.exists(map_result):
         with open(map_result, "rb") as f:
             return f.read()
     elif isinstance(map_result, (bytes, bytearray)):
         return bytes(map_result)
     return None
 
-def _generate_docx(report_text: str, image_bytes: bytes = None, image_path: str = None) -> BytesIO:
-    """Converts Markdown to Docx (handles both file path and raw bytes for images)."""
-    doc = Document()
-    doc.add_heading('Final Process Report', 0)
-    lines = report_text.split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if line.startswith('# '): doc.add_heading(line[2:], level=1)
-        elif line.startswith('## '): doc.add_heading(line[3:], level=2)
-        elif line.startswith('### '): doc.add_heading(line[4:], level=3)
-        elif "![Process Map]" in line:
-            doc.add_heading('Process Flowchart', level=2)
-            try:
-                # Prioritize bytes (for saved reports), fall back to path (for live)
-                if image_bytes:
-                    doc.add_picture(BytesIO(image_bytes), width=Inches(6))
-                elif image_path and os.path.exists(image_path):
-                    doc.add_picture(image_path, width=Inches(6))
-                else:
-                    doc.add_paragraph("[Image Missing]")
-            except Exception as e:
-                doc.add_paragraph(f"[Error rendering image: {e}]")
-        elif line.startswith('* ') or line.startswith('- '):
-            doc.add_paragraph(line[2:].replace('**', ''), style='List Bullet')
-        elif line:
-            doc.add_paragraph(line.replace('**', ''))
-            
-    buffer = BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
-
 def _smart_parse_json(data: Any) -> Dict:
     """Robustly parses JSON from LLM output, handling Markdown code blocks."""
     if isinstance(data, dict):
@@ -218,21 +299,21 @@ def _mark_as_saved():
 # --- MODALS (DIALOGS) ---
 
 @st.dialog("💾 Unsaved Report Detected")
-def show_unsaved_warning(current_report, map_path):
+def show_unsaved_warning(current_report, png_bytes):
     st.warning("You have a generated report on screen. Starting a new analysis will lose it unless you save.")
     
     col1, col2, col3 = st.columns(3)
     
     with col1:
         if st.button("📂 Save in App", use_container_width=True):
-            _save_report_to_app(current_report, map_path)
+            _save_report_to_app(current_report, png_bytes)
             # Clear the 'current' report so we can proceed
             del st.session_state["final_output"]
             st.rerun()
             
     with col2:
-        # Generate DOCX for instant download
-        docx = _generate_docx(current_report, image_path=map_path)
+        # Built only when clicked (and then cached), not on every dialog render
+        docx = partial(report_docx, current_report, png_bytes)
         st.download_button("📄 Save as Word", data=docx, file_name="Report.docx", mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document", use_container_width=True)
         
     with col3:
@@ -241,7 +322,12 @@ def show_unsaved_warning(current_report, map_path):
             st.rerun()
 
 @st.dialog("📄 Saved Report Viewer", width="large")
-def view_saved_report(report):
+def view_saved_report(report_id):
+    # Only the titles are loaded for the sidebar; the report itself on open
+    report = REPORT_STORE.load(st.session_state["user_id"], report_id)
+    if report is None:
+        st.error("This report is no longer available (it may have been removed to stay within your storage quota).")
+        return
     st.markdown(f"### {report['title']}")
     
     # 1. Render content (handle image replacement)
@@ -258,7 +344,7 @@ def view_saved_report(report):
     with c1:
         st.download_button("📥 Download Markdown", report["content"], file_name=f"{report['title']}.md")
     with c2:
-        docx = _generate_docx(report["content"], image_bytes=report["png_bytes"])
+        docx = partial(report_docx, report["content"], report["png_bytes"])
         st.download_button("📥 Download Word Doc", docx, file_name=f"{report['title']}.docx", mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
 
 @st.dialog("🔐 Developer Login")
@@ -280,13 +366,30 @@ with st.sidebar:
     st.markdown("4️⃣ Final Output")
     
     st.header("🗂️ Saved Reports")
-    if not st.session_state["saved_reports"]:
+    saved_reports = REPORT_STORE.list_reports(st.session_state["user_id"])
+    if not saved_reports:
         st.caption("No reports saved yet.")
     else:
-        for rep in st.session_state["saved_reports"]:
+        for rep in saved_reports:
             # Use a button to trigger the dialog
             if st.button(f"📄 {rep['title']}", key=f"btn_{rep['id']}"):
-                view_saved_report(rep)
+                view_saved_report(rep["id"])
+
+    if not st.session_state["user_id"].startswith("auth-"):
+        with st.expander("🔑 Restore key"):
+            st.caption(
+                "Saved reports belong to this browser session. To open them again later, "
+                "keep this key somewhere private: anyone who has it can read and delete them."
+            )
+            st.code(st.session_state["user_id"], language=None)
+            restore_key = st.text_input("Restore reports with a key", type="password", key="restore_key")
+            if st.button("Restore") and restore_key.strip():
+                # Only keys this app hands out: never an account's id or a guessable string
+                if re.fullmatch(r"[0-9a-f]{32}", restore_key.strip()):
+                    st.session_state["user_id"] = restore_key.strip()
+                    st.rerun()
+                else:
+                    st.error("That is not a valid restore key.")
 
     st.markdown("---")
     # --- CONDITIONAL DEBUG SECTION ---
@@ -297,9 +400,24 @@ with st.sidebar:
         use_mock_understanding = st.checkbox("Mock Step 2 (Understanding)", value=True)
         use_mock_mapping = st.checkbox("Mock Step 3a (Mapping)", value=False)
         use_mock_product = st.checkbox("Mock Step 3b (Product Selector)", value=False)
+        bypass_llm_cache = st.checkbox("Bypass LLM response cache", value=False)
         
         st.success("👨‍💻 Developer Mode Active")
 
+        with st.expander("📈 Runtime Metrics"):
+            st.json({
+                "model_retries": get_retry_metrics(),
+                "diagram_cache": get_diagram_cache_stats(),
+                "diagram_renderer": get_render_service_stats(),
+                "diagram_layouts": get_layout_stats(),
+                "llm_cache": get_llm_cache_stats(),
+                "docx_exports": get_docx_cache_stats(),
+                "saved_reports": get_report_store_stats(),
+                "feedback_patches": get_feedback_metrics(),
+                "final_output_stream": get_stream_metrics(),
+                "jobs": get_job_stats(),
+            })
+
         if st.button("Logout"):
             st.session_state["is_dev"] = False
             st.rerun()
@@ -309,6 +427,7 @@ with st.sidebar:
         use_mock_understanding = False
         use_mock_mapping = False
         use_mock_product = False
+        bypass_llm_cache = False
         
         # The "Secret Door" Button
         if st.button("🔒 Developer Access", type="tertiary"):
@@ -340,7 +459,7 @@ if run_button:
     if "final_output" in st.session_state and not st.session_state.get("report_is_saved", False):
         show_unsaved_warning(
             st.session_state["final_output"], 
-            "process_map.png" # Assuming this is the current live file
+            st.session_state.get("final_png_bytes")
         )
     else:
         # PROCEED: No unsaved report, safe to run
@@ -355,39 +474,39 @@ if run_button:
             st.error("Please upload a file or enable Mock Understanding.")
             st.stop()
 
-    # --- STEP 2: UNDERSTANDING AGENT ---
+    # --- STEP 2 + 3: UNDERSTANDING, THEN MAPPING & PRODUCT (one background job) ---
     if use_mock_understanding:
         st.warning("⚠️ Using MOCK DATA for Understanding Agent.")
-        understanding_json = MOCK_UNDERSTANDING_JSON
-    else:
-        with st.spinner("Running Understanding Agent (Gemini)..."):
-            raw_understanding = run_understanding_agent(uploaded_files)
-            understanding_json = _smart_parse_json(raw_understanding)
-    
-    st.session_state["understanding_json"] = understanding_json
-
-    # --- STEP 3: MAPPING & PRODUCT ---
-    
-    # 3a. Mapping Agent
     if use_mock_mapping:
         st.warning("⚠️ Skipping Mapping Agent (Mock Mode).")
-        map_result = 'process_map.png' 
-    else:
-        with st.spinner("Running Mapping Agent..."):
-            map_result = run_mapping_agent(understanding_json)
-    
-    st.session_state["map_result"] = map_result
-
-    # 3b. Product Selector
     if use_mock_product:
         st.warning("⚠️ Using MOCK DATA for Product Selector.")
-        product_result = MOCK_PRODUCT_RESULT
-    else:
-        with st.spinner("Running Product Selector Agent..."):
-            raw_product = run_product_selector_agent(understanding_json)
-            product_result = _smart_parse_json(raw_product)
-            
-    st.session_state["product_result"] = product_result
+
+    files = uploaded_files or []
+    AGENT_JOBS.submit(
+        st.session_state["session_id"], "analysis", arun_analysis,
+        files,
+        session_id=st.session_state["session_id"],
+        use_cache=not bypass_llm_cache,
+        understanding_json=MOCK_UNDERSTANDING_JSON if use_mock_understanding else None,
+        map_result='process_map.png' if use_mock_mapping else None,
+        product_result=MOCK_PRODUCT_RESULT if use_mock_product else None,
+        # Same files + options while a run is in flight -> share that run
+        dedupe_key=make_dedupe_key(
+            "analysis",
+            [] if use_mock_understanding else [hashlib.sha256(f.getvalue()).hexdigest() for f in files],
+            use_mock_understanding, use_mock_mapping, use_mock_product, bypass_llm_cache
+        )
+    )
+
+def _on_analysis_done(result):
+    st.session_state["understanding_json"] = _smart_parse_json(result["understanding_json"])
+    st.session_state["map_result"] = result["map_result"]
+    st.session_state["product_result"] = _smart_parse_json(result["product_result"])
+    if result["step3_timings"]:
+        st.session_state["step3_timings"] = result["step3_timings"]
+
+_show_job("analysis", _on_analysis_done)
 
 # --- DISPLAY OUTPUTS ---
 
@@ -409,6 +528,9 @@ if "understanding_json" in st.session_state and "final_output" not in st.session
 if "map_result" in st.session_state or "product_result" in st.session_state:
     st.markdown("---")
     st.subheader("Step 3 – Mapping & Product Recommendations")
+
+    if st.session_state["is_dev"] and st.session_state.get("step3_timings"):
+        st.caption(f"⏱️ Step 3 timings: {st.session_state['step3_timings']}")
     
     col_map, col_prod = st.columns(2)
     
@@ -491,70 +613,28 @@ if "understanding_json" in st.session_state and "map_result" in st.session_state
         if not feedback_text.strip():
             st.warning("Please enter feedback.")
         else:
-            with st.spinner("Running Feedback Agent..."):
-                # Run Agent
-                result_str = run_feedback_agent(
-                    understanding_json=st.session_state["understanding_json"],
-                    product_selection=st.session_state.get("product_result", {}),
-                    user_feedback=feedback_text.strip()
+            AGENT_JOBS.submit(
+                st.session_state["session_id"], "feedback", arun_feedback_agent,
+                understanding_json=st.session_state["understanding_json"],
+                product_selection=st.session_state.get("product_result", {}),
+                user_feedback=feedback_text.strip(),
+                session_id=st.session_state["session_id"],
+                # Double clicks / resubmitting the same feedback share one run
+                dedupe_key=make_dedupe_key(
+                    "feedback", st.session_state["session_id"], feedback_text.strip(),
+                    st.session_state["understanding_json"], st.session_state.get("product_result", {})
                 )
-                
-                # --- UPDATE STATE & RERUN ---
-                try:
-                    new_data = _smart_parse_json(result_str)
-                    
-                    # 1. CAPTURE THE VOICE MESSAGE
-                    if new_data.get("agent_response_message"):
-                        st.session_state["last_agent_response"] = new_data["agent_response_message"]
-                    else:
-                        # Fallback if agent is silent
-                        st.session_state["last_agent_response"] = "Updates applied successfully."
-
-                    # A. Update Map Path
-                    if new_data.get("updated_process_diagram_path"):
-                        st.session_state["map_result"] = new_data["updated_process_diagram_path"]
-                        
-                    # B. Update Product Recs
-                    if new_data.get("updated_recommended_tool"):
-                        current_prods = _smart_parse_json(st.session_state.get("product_result", {}))
-                        current_prods["recommended_tool"] = new_data["updated_recommended_tool"]
-                        current_prods["reason_for_recommendation"] = new_data.get("updated_reason_for_tool", "")
-                        st.session_state["product_result"] = current_prods
-                            
-                    # C. Update Core JSON
-                    if new_data.get("updated_process_map"):
-                        st.session_state["understanding_json"]["process_map"] = new_data["updated_process_map"]
-
-                    # D. Save Log & Refresh
-                    # Only save to history if actual changes occurred.
-                    changes_text = new_data.get("changes_made", "").lower()
-                    
-                    # List of phrases that mean "Nothing happened"
-                    no_change_phrases = ["none", "no changes", "no changes made", "n/a"]
-                    
-                    is_meaningful_change = (
-                        changes_text and 
-                        changes_text not in no_change_phrases and 
-                        "no changes" not in changes_text
-                    )
-
-                    if is_meaningful_change:
-                        st.session_state["feedback_log"] = new_data
-                        st.session_state["feedback_history"].append(new_data) # Only append real work
-                        print("DEBUG: Change logged.")
-                    else:
-                        print("DEBUG: Skipped logging (Conversation only).")
-                    st.rerun() 
-                    
-                except Exception as e:
-                    st.error(f"Failed: {e}")
+            )
+
+    # --- UPDATE STATE (when the feedback job is done) ---
+    _show_job("feedback", _apply_feedback_result)
 
 
 # STEP 5: FINAL OUTPUT (Updated)
 # ... (keep your existing imports and setup) ...
 
 # --- HELPER TO RENDER MIXED CONTENT ---
-def _render_report_with_image(report_text):
+def _render_report_with_image(report_text, png_bytes=None):
     """
     Splits the markdown report to insert the actual Streamlit image widget
     where the placeholder text exists.
@@ -567,11 +647,11 @@ def _render_report_with_image(report_text):
         # 1. Render text BEFORE the image
         st.markdown(parts[0]) 
         
-        # 2. Render the actual image from disk
-        if os.path.exists("process_map.png"):
-            st.image("process_map.png", caption="Process Flowchart")
+        # 2. Render the actual image (bytes captured when the report was generated)
+        if png_bytes:
+            st.image(png_bytes, caption="Process Flowchart")
         else:
-            st.warning("⚠️ Process Map image file not found on disk.")
+            st.warning("⚠️ Process Map image not available.")
             
         # 3. Render text AFTER the image
         if len(parts) > 1:
@@ -581,6 +661,33 @@ def _render_report_with_image(report_text):
         st.markdown(report_text)
 
 
+def _without_partial_marker(text, marker):
+    """Hides a half-received image marker at the end of streamed text."""
+    for n in range(min(len(marker) - 1, len(text)), 0, -1):
+        if text.endswith(marker[:n]):
+            return text[:-n]
+    return text
+
+def _render_partial_report(progress):
+    """The report so far (progress of the final output job), same layout as the finished one."""
+    marker = "![Process Map](process_map.png)"
+    text = progress.get("text", "")
+    if marker not in text:
+        text = _without_partial_marker(text, marker)
+    _render_report_with_image(text + " ▌", st.session_state.get("final_png_bytes"))
+
+def _on_final_output_done(done):
+    # The assembled report is what gets saved / exported
+    st.session_state["final_output"] = done["text"]
+    st.session_state["final_output_timing"] = {
+        "ttft_seconds": round(done["ttft_seconds"], 2),
+        "total_seconds": round(done["total_seconds"], 2),
+        "cached": done["cached"],
+    }
+    st.session_state["report_is_saved"] = False
+    _clear_analysis_state()
+
+
 # STEP 5: FINAL OUTPUT (Updated)
 if "understanding_json" in st.session_state:
     st.markdown("---")
@@ -588,18 +695,20 @@ if "understanding_json" in st.session_state:
     
     # Generate Button
     if st.button("📄 Generate Final Output"):
-        with st.spinner("Generating Final Output..."):
-            final_output = run_final_output_agent(
-                understanding_json=st.session_state["understanding_json"],
-                product_selection=st.session_state.get("product_result"),
-                feedback=st.session_state.get("feedback_history", []) 
-            )
-            st.session_state["final_output"] = final_output
+        # Keep the diagram with the report: map_result is cleared once it is done,
+        # and the map is shown mid-stream
+        st.session_state["final_png_bytes"] = _extract_png_bytes(st.session_state.get("map_result"))
+        AGENT_JOBS.submit(
+            st.session_state["session_id"], "final_output", acollect_final_output,
+            understanding_json=st.session_state["understanding_json"],
+            product_selection=st.session_state.get("product_result"),
+            feedback=st.session_state.get("feedback_history", []),
+            session_id=st.session_state["session_id"],
+            use_cache=not bypass_llm_cache
+        )
 
-            st.session_state["report_is_saved"] = False
-
-            _clear_analysis_state() 
-            st.rerun()
+    # Shows the report as it is written, then stores it
+    _show_job("final_output", _on_final_output_done, _render_partial_report)
 
 # Display & Download Options
 if "final_output" in st.session_state:
@@ -607,7 +716,13 @@ if "final_output" in st.session_state:
     
     # 1. Render on Screen
     report_text = st.session_state["final_output"]
-    _render_report_with_image(st.session_state["final_output"])
+    _render_report_with_image(st.session_state["final_output"], st.session_state.get("final_png_bytes"))
+    timing = st.session_state.get("final_output_timing")
+    if st.session_state["is_dev"] and timing:
+        st.caption(
+            f"⏱️ First text after {timing['ttft_seconds']}s, complete after {timing['total_seconds']}s"
+            + (" (cached)" if timing["cached"] else "")
+        )
     
     st.markdown("---")
     st.write("### 📥 Download Options")
@@ -626,10 +741,12 @@ if "final_output" in st.session_state:
 
     # Option B: Download as Word Doc (New)
     with col2:
-        # Generate the DOCX file in memory on the fly
-        docx_file = _generate_docx(
-            st.session_state["final_output"], 
-            image_path="process_map.png"
+        # Built when the button is clicked, on Streamlit's download thread
+        # (so values, not st.session_state), and cached per report + image
+        docx_file = partial(
+            report_docx,
+            st.session_state["final_output"],
+            st.session_state.get("final_png_bytes")
         )
         
         st.download_button(
@@ -643,7 +760,7 @@ if "final_output" in st.session_state:
     # Option C: Save in App
     with col3:
         if st.button("💾 Save to App (Sidebar)", type="primary"):
-            _save_report_to_app(report_text, "process_map.png")
+            _save_report_to_app(report_text, st.session_state.get("final_png_bytes"))
             _mark_as_saved() # <--- Manually mark as saved
             st.rerun()
             st.success("Report saved in App sidebar!")
@@ -0,0 +1,42 @@
+# bench_diagram_render_pool.py
+#
+# Batch rendering throughput through the bounded Graphviz worker pool,
+# cold (every map new) and warm (every map cached).
+#
+#   DIAGRAM_RENDER_WORKERS=8 python benchmarks/bench_diagram_render_pool.py
+import os
+import sys
+
+# Add the project root to python path so imports work
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_mapping_agent.tools.diagram_render_service import get_render_service_stats, RENDER_WORKERS
+from process_mapping_agent.tools.generate_process_diagram_tool import render_process_diagrams_batch
+
+MAP_COUNT = 50
+STEPS_PER_MAP = 12
+
+
+def make_process_map(seed: int):
+    return [
+        {
+            "step_name": f"Map {seed} step {i + 1}",
+            "role": ["Employee", "Manager", "Finance"][i % 3],
+            "decision_point": i % 4 == 3,
+        }
+        for i in range(STEPS_PER_MAP)
+    ]
+
+
+if __name__ == "__main__":
+    maps = [make_process_map(seed) for seed in range(MAP_COUNT)]
+    print(f"{MAP_COUNT} maps x {STEPS_PER_MAP} steps, {RENDER_WORKERS} render workers")
+
+    for label in ("cold", "warm"):
+        stats = render_process_diagrams_batch(maps)["stats"]
+        print(f"{label:<5} {stats}")
+        if stats["errors"] == stats["diagrams"]:
+            print("every render failed (is the graphviz `dot` binary installed?)")
+            break
+
+    print(f"pool  {get_render_service_stats()}")
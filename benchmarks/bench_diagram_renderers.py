@@ -0,0 +1,56 @@
+# bench_diagram_renderers.py
+#
+# Per-render latency of the in-process renderer vs. the `dot` subprocess,
+# for typical 5-20 step linear flows. Bypasses the render cache.
+#
+#   python benchmarks/bench_diagram_renderers.py
+import os
+import statistics
+import sys
+import time
+
+# Add the project root to python path so imports work
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_mapping_agent.tools.builtin_diagram_renderer import PIL_AVAILABLE, render_builtin
+from process_mapping_agent.tools.diagram_render_service import render_service
+from process_mapping_agent.tools.generate_process_diagram_tool import build_process_digraph
+
+REPEATS = 20
+STEP_COUNTS = [5, 10, 20]
+
+
+def make_steps(count: int):
+    return [
+        {
+            "step_name": f"Step {i + 1}: reconcile ledger entries",
+            "role": ["Employee", "Manager", "Finance"][i % 3],
+            "decision_point": i % 4 == 3,
+        }
+        for i in range(count)
+    ]
+
+
+def median_ms(func):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+if __name__ == "__main__":
+    formats = ["svg", "png"] if PIL_AVAILABLE else ["svg"]
+    print(f"{'steps':>5} {'fmt':>4} {'builtin ms':>11} {'dot ms':>9} {'speed-up':>9}")
+    for count in STEP_COUNTS:
+        steps = make_steps(count)
+        source = build_process_digraph(steps).source
+        for fmt in formats:
+            builtin_ms = median_ms(lambda: render_builtin(steps, fmt))
+            try:
+                dot_ms = median_ms(lambda: render_service.render(source, fmt))
+            except Exception as e:
+                print(f"{count:>5} {fmt:>4} {builtin_ms:>11.2f}   dot unavailable ({e})")
+                continue
+            print(f"{count:>5} {fmt:>4} {builtin_ms:>11.2f} {dot_ms:>9.2f} {dot_ms / builtin_ms:>8.1f}x")
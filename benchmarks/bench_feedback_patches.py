@@ -0,0 +1,112 @@
+# bench_feedback_patches.py
+#
+# Tokens per feedback turn on a 30-step process map: the old protocol (the
+# whole map sent every turn, the whole updated_process_map returned) vs step
+# operations (process_map_ops) with the map sent only at checkpoints.
+# Answers are serialized through the real output schemas, nulls included,
+# as the model emits them; tokens use the ~4 chars/token estimate.
+#
+#   python benchmarks/bench_feedback_patches.py
+import json
+import os
+import sys
+
+# Add the project root to python path so imports work
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_mapping_agent.schemas.feedback_schema import FeedbackPatchSchema, FeedbackSchema
+from process_mapping_agent.tools.metadata_encoder import estimate_tokens
+from process_mapping_agent.tools.process_map_patch import apply_step_ops, assign_step_ids, compact_map
+
+STEPS = 30
+CHECKPOINT_TURNS = int(os.environ.get("FEEDBACK_CHECKPOINT_TURNS", "5"))
+PRODUCT = {
+    "recommended_tool": "Power Automate",
+    "reason_for_recommendation": "Strong fit for Microsoft ecosystem and simple approval flows.",
+    "top_5_tools": ["Expensify", "Power Automate", "AppSheet", "Rydoo", "SAP Concur"],
+}
+
+# (feedback, ops) - a typical session
+TURNS = [
+    ("Rename step 4 to 'Validate invoice data'",
+     [{"op": "update", "step_id": "s4", "fields": {"step_name": "Validate invoice data"}}]),
+    ("Add a manager approval after step 10",
+     [{"op": "insert", "step_id": "n1", "after_step_id": "s10",
+       "fields": {"step_name": "Manager approval", "role": "Manager", "description": "Approves the batch.",
+                  "decision_point": True, "condition": "Amount > 5000?"}}]),
+    ("Step 17 is redundant, remove it", [{"op": "delete", "step_id": "s17"}]),
+    ("Archiving should happen before the report is sent",
+     [{"op": "move", "step_id": "s29", "after_step_id": "s27"}]),
+    ("Explain step 12 in more detail",
+     [{"op": "update", "step_id": "s12", "fields": {
+         "description": "Finance matches every payment to its invoice line, flags partial payments and "
+                        "posts the differences to the suspense account for review."}}]),
+    ("Use AppSheet instead", []),
+    ("Split step 20 into preparation and upload",
+     [{"op": "update", "step_id": "s20", "fields": {"step_name": "Prepare upload file"}},
+      {"op": "insert", "step_id": "n2", "after_step_id": "s20",
+       "fields": {"step_name": "Upload to the bank portal", "role": "Treasury"}}]),
+    ("Looks good, thanks", []),
+]
+
+
+def make_map(steps):
+    roles = ["Clerk", "Finance", "Manager", "Treasury", "Controller"]
+    return [
+        {
+            "step_number": i + 1,
+            "step_name": f"Step {i + 1}: process the monthly vendor invoices batch",
+            "role": roles[i % len(roles)],
+            "description": "The team copies the values from the source sheet, checks the totals and updates the tracker.",
+            "decision_point": i % 7 == 6,
+            "condition": "Totals match?" if i % 7 == 6 else None,
+        }
+        for i in range(steps)
+    ]
+
+
+def answer(schema, **fields):
+    common = {"user_feedback": fields.pop("feedback"), "agent_response_message": "Done, I've updated the flow.",
+              "changes_made": "Updated as requested."}
+    return schema(**common, **fields).model_dump_json()
+
+
+if __name__ == "__main__":
+    process_map = assign_step_ids(make_map(STEPS))
+    totals = {"old_in": 0, "old_out": 0, "new_in": 0, "new_out": 0}
+    print(f"{STEPS}-step map, checkpoint every {CHECKPOINT_TURNS} turns")
+    print(f"{'turn':<54} {'full map in/out':>16} {'ops in/out':>12}")
+
+    for turn, (feedback, ops) in enumerate(TURNS):
+        updated, applied, rejected = apply_step_ops(process_map, ops)
+        assert not rejected, rejected
+
+        # Before: the whole map in, the whole map out, every turn
+        old_in = estimate_tokens(json.dumps({
+            "mapping_agent_output": {"process_map": process_map, "process_diagram_path": "process_map.png"},
+            "product_agent_output": PRODUCT, "user_feedback": feedback,
+        }))
+        old_out = estimate_tokens(answer(FeedbackSchema, feedback=feedback, updated_process_map=updated))
+
+        # After: the map only at checkpoints, operations out
+        if turn % CHECKPOINT_TURNS == 0:
+            message = {"mode": "checkpoint",
+                       "mapping_agent_output": {"process_map": compact_map(process_map),
+                                                "process_diagram_path": "process_map.png"},
+                       "product_agent_output": PRODUCT, "user_feedback": feedback}
+        else:
+            message = {"mode": "delta", "user_feedback": feedback}
+        new_in = estimate_tokens(json.dumps(message))
+        new_out = estimate_tokens(answer(FeedbackPatchSchema, feedback=feedback, process_map_ops=ops))
+
+        for key, value in [("old_in", old_in), ("old_out", old_out), ("new_in", new_in), ("new_out", new_out)]:
+            totals[key] += value
+        print(f"{feedback[:52]:<54} {old_in:>7}/{old_out:>6}   {new_in:>5}/{new_out:>4}"
+              f"{'  (checkpoint)' if message['mode'] == 'checkpoint' else ''}")
+        process_map = updated
+
+    turns = len(TURNS)
+    print(f"avg output tokens/turn: full map {totals['old_out'] / turns:.0f}   ops {totals['new_out'] / turns:.0f}   "
+          f"({1 - totals['new_out'] / totals['old_out']:.0%} fewer)")
+    print(f"avg new message tokens/turn: full map {totals['old_in'] / turns:.0f}   ops {totals['new_in'] / turns:.0f}")
+    print("(in a delta turn the model still reads the conversation since the last checkpoint)")
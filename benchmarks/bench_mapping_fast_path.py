@@ -0,0 +1,59 @@
+# bench_mapping_fast_path.py
+#
+# Step-3 mapping latency: deterministic direct render vs. the LLM Mapping
+# Agent round-trip. The LLM side only runs when GOOGLE_API_KEY is set.
+#
+#   python benchmarks/bench_mapping_fast_path.py
+import os
+import statistics
+import sys
+import time
+
+# Add the project root to python path so imports work
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_mapping_agent.mapping_agent import render_process_map_directly, validate_process_map
+
+REPEATS = 5
+
+UNDERSTANDING_JSON = {
+    "process_map": [
+        {"step_name": "Employee submits expense report", "description": "Fills Excel template.", "role": "Employee", "decision_point": False},
+        {"step_name": "Manager reviews report", "description": "Checks for receipts.", "role": "Manager", "decision_point": True, "condition": "Total < $500?"},
+        {"step_name": "Finance final approval", "description": "Checks tax compliance.", "role": "Finance", "decision_point": False},
+        {"step_name": "Payment processing", "description": "Manual entry to portal.", "role": "Finance", "decision_point": False}
+    ],
+    "issues": ["Manual entry errors"],
+    "opportunities": ["Automate banking transfer"]
+}
+
+
+def timed(func, *args):
+    timings = []
+    result = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings)
+
+
+if __name__ == "__main__":
+    _, validate_s = timed(validate_process_map, UNDERSTANDING_JSON)
+    print(f"validate process_map            median {validate_s * 1000:>9.2f} ms")
+
+    result, direct_s = timed(render_process_map_directly, UNDERSTANDING_JSON)
+    if result is None:
+        print("direct render                   unavailable (is the graphviz `dot` binary installed?)")
+    else:
+        print(f"direct render (validate + draw) median {direct_s * 1000:>9.2f} ms -> {result}")
+
+    if os.environ.get("GOOGLE_API_KEY"):
+        from agent_runner import run_mapping_agent
+
+        result, llm_s = timed(lambda: run_mapping_agent(UNDERSTANDING_JSON, direct=False))
+        print(f"LLM Mapping Agent               median {llm_s * 1000:>9.2f} ms -> {result!r}")
+        if direct_s:
+            print(f"speed-up                        x{llm_s / direct_s:.0f}")
+    else:
+        print("LLM Mapping Agent               skipped (set GOOGLE_API_KEY to compare)")
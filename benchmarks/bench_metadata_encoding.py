@@ -0,0 +1,42 @@
+# bench_metadata_encoding.py
+#
+# Prompt tokens of the Understanding Agent's metadata: the verbose JSON the
+# tool used to return vs. the compact, budgeted encoding. Tokens are the
+# ~4 chars/token estimate from metadata_encoder.estimate_tokens.
+#
+#   python benchmarks/bench_metadata_encoding.py [token_budget]
+import os
+import sys
+import time
+
+# Add the project root to python path so imports work
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from bench_workbook_profiler import make_workbook
+from process_mapping_agent.tools.join_hints import find_cross_sheet_hints, strip_signatures
+from process_mapping_agent.tools.metadata_encoder import METADATA_TOKEN_BUDGET, encode_files_metadata, encoding_report
+from process_mapping_agent.tools.workbook_profiler import profile_workbook
+
+
+def report(name, file_bytes, budget):
+    # Same shape build_files_metadata produces
+    files_metadata = {"files": [profile_workbook(name, file_bytes)]}
+    files_metadata["cross_sheet_hints"] = find_cross_sheet_hints(files_metadata["files"])
+    strip_signatures(files_metadata["files"])
+    start = time.perf_counter()
+    encode_files_metadata(files_metadata, budget)
+    encode_ms = (time.perf_counter() - start) * 1000
+    r = encoding_report(files_metadata, budget)
+    print(f"{name:<36} json {r['json_tokens']:>8} tok   compact {r['compact_tokens']:>6} tok   "
+          f"saved {r['tokens_saved']:>8} ({r['saved_ratio']:.0%})   encode {encode_ms:>6.1f} ms")
+
+
+if __name__ == "__main__":
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else METADATA_TOKEN_BUDGET
+    print(f"token budget {budget}")
+
+    with open(os.path.join(ROOT, "complex_finance_workbook.xlsx"), "rb") as f:
+        report("complex_finance_workbook.xlsx", f.read(), budget)
+    report("synthetic 5 sheets x 40 cols", make_workbook(5, 200, 40), budget)
+    report("synthetic 12 sheets x 300 cols", make_workbook(12, 50, 300), budget)
@@ -0,0 +1,53 @@
+# bench_product_selector.py
+#
+# Product Selector latency: local rule-based scoring vs. the LLM agent.
+# The LLM side only runs when GOOGLE_API_KEY is set.
+#
+#   python benchmarks/bench_product_selector.py
+import json
+import os
+import statistics
+import sys
+import time
+
+# Add the project root to python path so imports work
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_mapping_agent.tools.product_scoring import select_products
+
+REPEATS = 1000
+
+UNDERSTANDING_JSON = {
+    "process_map": [
+        {"step_name": "Employee submits expense report", "description": "Fills Excel template.", "role": "Employee", "decision_point": False},
+        {"step_name": "Manager reviews report", "description": "Checks for receipts.", "role": "Manager", "decision_point": True, "condition": "Total < $500?"},
+        {"step_name": "Finance final approval", "description": "Checks tax compliance.", "role": "Finance", "decision_point": False},
+        {"step_name": "Payment processing", "description": "Manual entry to portal.", "role": "Finance", "decision_point": False}
+    ],
+    "issues": ["Manual entry errors"],
+    "opportunities": ["Automate banking transfer"]
+}
+
+
+if __name__ == "__main__":
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        selection = select_products(UNDERSTANDING_JSON)
+        timings.append(time.perf_counter() - start)
+    rules_s = statistics.median(timings)
+    print(f"rule-based scoring   median {rules_s * 1e6:>10.1f} us")
+    print(json.dumps(selection["result"], indent=2))
+    print(f"tied: {selection['tied'] or 'no'}")
+
+    if os.environ.get("GOOGLE_API_KEY"):
+        import agent_runner
+
+        agent_runner.PRODUCT_SELECTOR_MODE = "llm"
+        start = time.perf_counter()
+        result = agent_runner.run_product_selector_agent(UNDERSTANDING_JSON)
+        llm_s = time.perf_counter() - start
+        print(f"LLM Product Selector      {llm_s * 1000:>10.1f} ms -> {result!r}")
+        print(f"speed-up             x{llm_s / rules_s:.0f}")
+    else:
+        print("LLM Product Selector skipped (set GOOGLE_API_KEY to compare)")
@@ -0,0 +1,90 @@
+# bench_report_store.py
+#
+# Memory a session holds with 50 saved reports: the old st.session_state
+# list of {content, png_bytes} dicts vs report_store (the sidebar keeps
+# ids/titles only; a report is read from SQLite when it is opened).
+#
+#   python benchmarks/bench_report_store.py
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Add the project root to python path so imports work
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_store import ReportStore
+
+REPORTS = 50
+
+
+def make_report(n, sections=40):
+    """Final-output style markdown of a realistic size (~40 KB)."""
+    lines = [f"# Final Process Report {n}", "", "![Process Map](process_map.png)", ""]
+    for s in range(sections):
+        lines.append(f"## Section {s + 1}: Step analysis")
+        lines.append(f"Report {n}: the team copies values between sheets by hand every month, which is slow. " * 3)
+        for b in range(8):
+            lines.append(f"- **Issue {b + 1}:** manual reconciliation of cost centre {b} against the master list")
+    return "\n".join(lines)
+
+
+def load_png():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, "process_map.png"), "rb") as f:
+        return f.read()
+
+
+def measured(build):
+    """(result, bytes still allocated by it) via tracemalloc."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return result, sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+
+if __name__ == "__main__":
+    png = load_png()
+    # Each report has its own map; every 5th one re-uses the previous
+    # report's image (same process saved again)
+    pngs = [png + str(i if i % 5 else max(i - 1, 0)).encode() for i in range(REPORTS)]
+    reports = [make_report(i) for i in range(REPORTS)]
+
+    # Before: every saved report lives in the session
+    old_list, old_bytes = measured(lambda: [
+        {"id": i + 1, "title": f"Report {i}", "content": reports[i].encode("utf-8").decode("utf-8"),
+         "png_bytes": bytes(bytearray(pngs[i])), "timestamp": "2026-01-01 10:00"}
+        for i in range(REPORTS)
+    ])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ReportStore(os.path.join(tmp, "reports.db"), max_reports=REPORTS, max_bytes=1 << 30)
+        start = time.perf_counter()
+        for i in range(REPORTS):
+            store.save("user-1", f"Report {i}", reports[i], pngs[i])
+        save_ms = (time.perf_counter() - start) * 1000 / REPORTS
+
+        # After: the sidebar (each rerun) holds titles only
+        titles, new_bytes = measured(lambda: store.list_reports("user-1"))
+        start = time.perf_counter()
+        for _ in range(20):
+            store.list_reports("user-1")
+        list_ms = (time.perf_counter() - start) * 1000 / 20
+        start = time.perf_counter()
+        opened = store.load("user-1", titles[0]["id"])
+        open_ms = (time.perf_counter() - start) * 1000
+        assert opened["content"] == reports[-1]
+
+        raw = sum(len(r.encode()) + len(p) for r, p in zip(reports, pngs))
+        db_size = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+        stats = store.stats()
+
+    print(f"{REPORTS} saved reports ({raw / 1024:.0f} KB of text + images)")
+    print(f"  session list (before)   {old_bytes / 1024:>8.0f} KB per session")
+    print(f"  report store (after)    {new_bytes / 1024:>8.1f} KB per session (titles only)")
+    print(f"  sqlite on disk          {db_size / 1024:>8.0f} KB ({stats['codec']}, "
+          f"{stats['images']} distinct images, {stats['images_deduplicated']} deduplicated)")
+    print(f"  save {save_ms:.2f} ms/report   list {list_ms:.2f} ms   open {open_ms:.2f} ms")
@@ -0,0 +1,60 @@
+# bench_workbook_profiler.py
+#
+# Compares the single-pass openpyxl profiler with the old per-sheet
+# pd.read_excel path used by build_files_metadata.
+#
+#   python benchmarks/bench_workbook_profiler.py
+import os
+import sys
+import time
+from io import BytesIO
+
+# Add the project root to python path so imports work
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook
+
+from process_mapping_agent.tools.workbook_profiler import profile_workbook, profile_workbook_pandas
+
+REPEATS = 3
+
+
+def make_workbook(sheet_count, rows, cols):
+    """Synthetic finance-style workbook with many sheets."""
+    wb = Workbook()
+    wb.remove(wb.active)
+    for s in range(sheet_count):
+        ws = wb.create_sheet(f"Sheet_{s:02d}")
+        ws.append([f"Col_{c}" for c in range(cols)])
+        for r in range(rows):
+            ws.append([r * c if c % 2 else f"CC{r % 50}" for c in range(cols)])
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def best_of(func, *args):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(name, file_bytes):
+    old = best_of(profile_workbook_pandas, name, file_bytes)
+    new = best_of(profile_workbook, name, file_bytes, False)
+    full = best_of(profile_workbook, name, file_bytes)
+    print(f"{name:<40} {len(file_bytes) / 1024:>8.0f} KB   pandas {old * 1000:>8.1f} ms   "
+          f"single-pass {new * 1000:>8.1f} ms   x{old / new:.1f}   "
+          f"(+ full column stats {full * 1000:>8.1f} ms)")
+
+
+if __name__ == "__main__":
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, "complex_finance_workbook.xlsx"), "rb") as f:
+        run("complex_finance_workbook.xlsx", f.read())
+
+    for sheets, rows in [(10, 200), (40, 200), (40, 2000)]:
+        run(f"synthetic {sheets} sheets x {rows} rows", make_workbook(sheets, rows, 12))
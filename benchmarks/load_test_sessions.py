@@ -0,0 +1,73 @@
+# load_test_sessions.py
+#
+# Simulates N users uploading different workbooks at the same time and checks
+# that each one gets metadata for ITS OWN files back from the metadata tool
+# (this used to fail: every upload went to FILES["default_session"]).
+#
+#   python benchmarks/load_test_sessions.py [users]
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from types import SimpleNamespace
+
+# Add the project root to python path so imports work
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook
+
+from file_store import FILES
+from process_mapping_agent.tools.file_metadata_tool import build_files_metadata
+
+
+def make_user_workbook(user):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = f"User_{user}_Sheet"
+    ws.append(["Owner", "Amount"])
+    for i in range(50 + user):
+        ws.append([f"user-{user}", i])
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def simulate_user(user):
+    # Same steps as agent_runner.run_understanding_agent, minus the LLM call
+    browser_session_id = uuid.uuid4().hex
+    run_session_id = f"{browser_session_id}-{uuid.uuid4().hex[:8]}"
+    file_name = "monthly_report.xlsx"  # everyone uploads a file with the SAME name
+
+    FILES[run_session_id] = {file_name: make_user_workbook(user)}
+    try:
+        time.sleep(0.01)  # let the other users' uploads land in between
+        tool_context = SimpleNamespace(session=SimpleNamespace(id=run_session_id))
+        metadata = build_files_metadata([file_name], tool_context)
+    finally:
+        FILES.discard(run_session_id)
+
+    files_metadata = metadata["files_metadata"]
+    if isinstance(files_metadata, str):
+        # compact encoding (metadata_encoder)
+        ok = f"### sheet User_{user}_Sheet rows={50 + user} " in files_metadata
+    else:
+        sheet = files_metadata["files"][0]["sheets"][0]
+        ok = sheet["sheet_name"] == f"User_{user}_Sheet" and sheet["row_count"] == 50 + user
+    return user, ok
+
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        results = list(pool.map(simulate_user, range(users)))
+    elapsed = time.perf_counter() - start
+
+    failures = [user for user, ok in results if not ok]
+    print(f"\n{users} concurrent users in {elapsed:.2f}s -> "
+          f"{users - len(failures)} got their own metadata, {len(failures)} mixed up")
+    print(f"File store after run: {FILES.stats()}")
+    sys.exit(1 if failures else 0)
@@ -1,5 +1,6 @@
 import os
 from google import genai
+from google.adk.models.google_llm import Gemini
 
 
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
@@ -9,4 +10,9 @@ if GOOGLE_API_KEY is None:
 
 DEFAULT_MODEL = "gemini-2.5-flash"
 
+# ONE model object shared by every agent. ADK caches the model's HTTP client
+# per event loop, so together with agent_runner's long-lived loop the
+# connection pool is reused across agents and requests.
+DEFAULT_LLM = Gemini(model=DEFAULT_MODEL)
+
 client = genai.Client(api_key=GOOGLE_API_KEY)
\ No newline at end of file
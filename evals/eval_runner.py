@@ -8,6 +8,7 @@ from process_mapping_agent.mapping_agent import process_visualization_agent as m
 from process_mapping_agent.sub_agents.product_selector_agent import product_selector_agent
 from process_mapping_agent.sub_agents.feedback_agent import feedback_agent
 from process_mapping_agent.sub_agents.final_output_agent import final_output_agent
+from process_mapping_agent.tools.process_map_patch import apply_step_ops
 
 def load_eval_cases(folder):
     cases = []
@@ -32,9 +33,10 @@ async def feedback_loop_test(initial_inputs, feedback_sequence):
        }
        # Run feedback agent
        result = await run_agent(feedback_agent, loop_input)
-       # The feedback agent returns updated structure
+       # The feedback agent returns step operations; apply them like the app does
+       updated_map, _, _ = apply_step_ops(current_output["process_map"], result.get("process_map_ops"))
        current_output = {
-           "process_map": result["updated_process_map"],
+           "process_map": updated_map,
            "recommended_tool": result.get("updated_recommended_tool")
                or current_output["recommended_tool"],
            "reason_for_recommendation": result.get("reason_for_update")
@@ -23,8 +23,10 @@ async def full_pipeline(
     excel_out = await run_agent(excel_agent, excel_inputs)
 
     # Step 2 + 3: parallel 
-    mapping_out = await run_agent(mapping_agent, excel_out)
-    product_out = await run_agent(product_agent, excel_out)
+    mapping_out, product_out = await asyncio.gather(
+        run_agent(mapping_agent, excel_out),
+        run_agent(product_agent, excel_out),
+    )
     current_output = {
         "initial_output": mapping_out,
         "product_selector_output": product_out,
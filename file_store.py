@@ -1 +1,233 @@
-FILES = {}
\ No newline at end of file
+import atexit
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Union
+
+# Memory budget for uploaded file bytes held in RAM across ALL sessions.
+MEMORY_BUDGET_MB = int(os.environ.get("FILE_STORE_MEMORY_MB", "256"))
+# Blobs at least this big never stay resident: they go straight to a temp file.
+SPILL_THRESHOLD_MB = int(os.environ.get("FILE_STORE_SPILL_MB", "16"))
+# Sessions not touched for this long are dropped (memory AND spill files).
+SESSION_TTL_SECONDS = int(os.environ.get("FILE_STORE_TTL_SECONDS", "3600"))
+
+
+class _Blob:
+    """One uploaded file: either resident bytes or a spill file on disk."""
+
+    __slots__ = ("data", "path", "size", "mapped", "lock")
+
+    def __init__(self, data: bytes):
+        self.data: Optional[bytes] = data
+        self.path: Optional[str] = None
+        self.size = len(data)
+        self.mapped: Optional[mmap.mmap] = None
+        self.lock = threading.Lock()
+
+    def spill(self, directory: str):
+        fd, path = tempfile.mkstemp(dir=directory, suffix=".blob")
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.data)
+        self.path, self.data = path, None
+
+    def read(self) -> Union[bytes, memoryview]:
+        if self.data is not None:
+            return self.data
+        if self.size == 0:
+            return b""
+        # Memory-mapped once, so only the pages actually read get loaded.
+        # Callers get their own view: no shared seek position between them.
+        with self.lock:
+            if self.mapped is None:
+                if self.path is None:
+                    raise KeyError("file was discarded")
+                with open(self.path, "rb") as f:
+                    self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return memoryview(self.mapped)
+
+    def discard(self):
+        with self.lock:
+            if self.mapped is not None:
+                try:
+                    self.mapped.close()
+                except BufferError:
+                    # A caller still holds a view: the map is unmapped when
+                    # the last view goes away
+                    pass
+                self.mapped = None
+            if self.path:
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+            self.data = self.path = None
+
+
+class _Session:
+    __slots__ = ("blobs", "last_access")
+
+    def __init__(self, blobs: Dict[str, _Blob]):
+        self.blobs = blobs
+        self.last_access = time.monotonic()
+
+
+class SessionFiles(Mapping):
+    """Read-only {file_name: bytes} view of one session's uploads."""
+
+    def __init__(self, store: "FileStore", session_id: str, session: _Session):
+        self._store = store
+        self._session_id = session_id
+        self._session = session
+
+    def __getitem__(self, file_name: str) -> Union[bytes, memoryview]:
+        blob = self._session.blobs[file_name]
+        self._store._touch(self._session_id)
+        return blob.read()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._session.blobs))
+
+    def __len__(self) -> int:
+        return len(self._session.blobs)
+
+
+class FileStore:
+    """
+    Bounded replacement for the old module-level FILES dict.
+
+    - Usage stays dict-like: FILES[session_id] = {name: bytes}, FILES.get(session_id, {})
+    - Resident bytes are kept under a memory budget: when it's exceeded, the
+      least recently used sessions are spilled to temp files (LRU eviction)
+    - Large blobs are spilled straight away; reads of spilled blobs return
+      a read-only memoryview of the blob's one mmap (len(), slicing,
+      hashlib, file.write); the mmap is closed when the session is dropped
+    - Sessions expire after SESSION_TTL_SECONDS without access
+    """
+
+    def __init__(self, memory_budget: int = MEMORY_BUDGET_MB * 1024 * 1024,
+                 spill_threshold: int = SPILL_THRESHOLD_MB * 1024 * 1024,
+                 ttl_seconds: float = SESSION_TTL_SECONDS):
+        self.memory_budget = memory_budget
+        self.spill_threshold = spill_threshold
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._spill_dir: Optional[str] = None
+        self.evictions = 0
+        self.expirations = 0
+
+    # ---- dict-style API ---------------------------------------------------
+
+    def __setitem__(self, session_id: str, files: Dict[str, bytes]):
+        with self._lock:
+            self._drop(session_id)
+            blobs = {name: _Blob(bytes(data)) for name, data in files.items()}
+            for blob in blobs.values():
+                if blob.size >= self.spill_threshold:
+                    blob.spill(self._get_spill_dir())
+            self._sessions[session_id] = _Session(blobs)
+            self._enforce_budget()
+            self.cleanup_expired()
+
+    def __getitem__(self, session_id: str) -> SessionFiles:
+        files = self.get(session_id)
+        if files is None:
+            raise KeyError(session_id)
+        return files
+
+    def __delitem__(self, session_id: str):
+        with self._lock:
+            if session_id not in self._sessions:
+                raise KeyError(session_id)
+            self._drop(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            self.cleanup_expired()
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str, default: Any = None) -> Any:
+        with self._lock:
+            self.cleanup_expired()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return default
+            self._touch(session_id)
+            return SessionFiles(self, session_id, session)
+
+    def discard(self, session_id: str) -> bool:
+        """Removes a session and deletes its spill files. True if it existed."""
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._drop(session_id)
+            return True
+
+    # ---- housekeeping ------------------------------------------------------
+
+    def cleanup_expired(self) -> int:
+        """Drops sessions idle for longer than the TTL. Returns how many."""
+        with self._lock:
+            cutoff = time.monotonic() - self.ttl_seconds
+            expired = [sid for sid, s in self._sessions.items() if s.last_access < cutoff]
+            for session_id in expired:
+                self._drop(session_id)
+            self.expirations += len(expired)
+            return len(expired)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            blobs = [b for s in self._sessions.values() for b in s.blobs.values()]
+            return {
+                "sessions": len(self._sessions),
+                "resident_bytes": sum(b.size for b in blobs if b.data is not None),
+                "spilled_bytes": sum(b.size for b in blobs if b.path is not None),
+                "memory_budget": self.memory_budget,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _touch(self, session_id: str):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_access = time.monotonic()
+                self._sessions.move_to_end(session_id)
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            for blob in session.blobs.values():
+                blob.discard()
+
+    def _enforce_budget(self):
+        resident = sum(
+            b.size for s in self._sessions.values() for b in s.blobs.values() if b.data is not None
+        )
+        # Oldest sessions first; their bytes move to disk instead of being lost
+        for session in self._sessions.values():
+            if resident <= self.memory_budget:
+                break
+            for blob in session.blobs.values():
+                if blob.data is not None:
+                    blob.spill(self._get_spill_dir())
+                    resident -= blob.size
+                    self.evictions += 1
+
+    def _get_spill_dir(self) -> str:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="file_store_")
+            atexit.register(shutil.rmtree, self._spill_dir, True)
+        return self._spill_dir
+
+
+# Shared bucket: session_id -> {file_name: bytes}
+FILES = FileStore()
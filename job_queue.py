@@ -0,0 +1,220 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# Finished jobs (and their results) are kept this long for the UI to pick up.
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# The job the current coroutine runs in (inherited by tasks it starts)
+_current_job: contextvars.ContextVar = contextvars.ContextVar("current_job", default=None)
+
+
+def report_progress(value: Any):
+    """Publishes progress for the job this code runs in; a no-op outside jobs."""
+    job = _current_job.get()
+    if job is not None:
+        job.progress = value
+
+
+def make_dedupe_key(kind: str, *parts: Any) -> str:
+    """Stable key for "the same job": kind + JSON of its inputs."""
+    canonical = json.dumps([kind, parts], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Job:
+    """One submitted unit of work; read through JobQueue.status()."""
+
+    def __init__(self, job_id: str, kind: str, dedupe_key: Optional[str]):
+        self.id = job_id
+        self.kind = kind
+        self.dedupe_key = dedupe_key
+        self.sessions = set()
+        self.status = QUEUED
+        self.progress: Any = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "queued_seconds": round((self.started_at or end) - self.created_at, 3),
+            "run_seconds": round(end - self.started_at, 3) if self.started_at else 0.0,
+        }
+
+
+class JobQueue:
+    """
+    Runs coroutines as background jobs on a long-lived event loop, so a
+    Streamlit rerun (which kills the script thread) no longer kills the call.
+
+    - submit() returns a job id straight away; at most `workers` jobs run at
+      once, the rest wait in the queue
+    - jobs are remembered per session and kind (latest() / status())
+    - an identical job (same dedupe_key) that is still queued or running is
+      shared instead of started twice
+    - cancel() stops a job once no session is waiting for it any more
+    - code inside a job can publish progress with report_progress()
+    """
+
+    def __init__(self, get_loop: Callable[[], asyncio.AbstractEventLoop], workers: int = 8,
+                 ttl: float = JOB_TTL_SECONDS):
+        self._get_loop = get_loop
+        self.workers = workers
+        self.ttl = ttl
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._in_flight: Dict[str, str] = {}
+        self._by_session: Dict[str, "OrderedDict[str, str]"] = {}
+        self.submitted = 0
+        self.deduplicated = 0
+        self.cancelled = 0
+
+    def submit(self, session_id: str, kind: str, func: Callable[..., Any], *args,
+               dedupe_key: Optional[str] = None, **kwargs) -> str:
+        """
+        Queues `func(*args, **kwargs)` (a coroutine function) and returns
+        the job id. The session's previous job of the
+        same kind is cancelled: a new run replaces it.
+        """
+        self._collect_garbage()
+        new = False
+        with self._lock:
+            previous = self._by_session.get(session_id, {}).get(kind)
+            if dedupe_key is not None and dedupe_key in self._in_flight:
+                job = self._jobs[self._in_flight[dedupe_key]]
+                self.deduplicated += 1
+                print(f"Job {job.id} ({kind}) already in flight, sharing it")
+            else:
+                job = Job(uuid.uuid4().hex[:12], kind, dedupe_key)
+                self._jobs[job.id] = job
+                if dedupe_key is not None:
+                    self._in_flight[dedupe_key] = job.id
+                self.submitted += 1
+                new = True
+            job.sessions.add(session_id)
+            self._by_session.setdefault(session_id, OrderedDict())[kind] = job.id
+
+        if previous and previous != job.id:
+            self.cancel(previous, session_id)
+        if new:
+            job.future = asyncio.run_coroutine_threadsafe(self._run(job, func, args, kwargs), self._get_loop())
+        return job.id
+
+    async def _run(self, job: Job, func, args, kwargs):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        _current_job.set(job)
+        try:
+            async with self._slots:
+                job.status = RUNNING
+                job.started_at = time.time()
+                job.result = await func(*args, **kwargs)
+                job.status = DONE
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = FAILED
+            print(f"Job {job.id} ({job.kind}) failed: {job.error}")
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if job.dedupe_key is not None and self._in_flight.get(job.dedupe_key) == job.id:
+                    del self._in_flight[job.dedupe_key]
+
+    def status(self, job_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id) if job_id else None
+        return job.snapshot() if job is not None else None
+
+    def latest(self, session_id: str, kind: str) -> Optional[Dict[str, Any]]:
+        """The session's most recent job of this kind (any status), or None."""
+        return self.status(self._by_session.get(session_id, {}).get(kind))
+
+    def cancel(self, job_id: str, session_id: str) -> bool:
+        """
+        Detaches the session from the job; the job itself is cancelled when
+        no other session shares it. Returns True if it was stopped.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return False
+            job.sessions.discard(session_id)
+            if self._by_session.get(session_id, {}).get(job.kind) == job_id:
+                del self._by_session[session_id][job.kind]
+            if job.sessions:
+                return False
+            if job.dedupe_key is not None and self._in_flight.get(job.dedupe_key) == job.id:
+                del self._in_flight[job.dedupe_key]
+            self.cancelled += 1
+        if job.future is not None:
+            job.future.cancel()
+        if job.status == QUEUED:
+            # Cancelled before the loop started it: _run never gets to say so
+            job.status = CANCELLED
+            job.finished_at = time.time()
+        return True
+
+    def forget(self, session_id: str, kind: str):
+        """Drops the session's pointer to a finished job once its result was consumed."""
+        with self._lock:
+            job_id = self._by_session.get(session_id, {}).get(kind)
+            job = self._jobs.get(job_id)
+            if job is not None and job.status in FINISHED:
+                del self._by_session[session_id][kind]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "workers": self.workers,
+                "jobs": counts,
+                "submitted": self.submitted,
+                "deduplicated": self.deduplicated,
+                "cancelled": self.cancelled,
+                "sessions": len(self._by_session),
+            }
+
+    def _collect_garbage(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.status in FINISHED and job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+            for session_id, jobs in list(self._by_session.items()):
+                for kind, job_id in list(jobs.items()):
+                    if job_id not in self._jobs:
+                        del jobs[kind]
+                if not jobs:
+                    del self._by_session[session_id]
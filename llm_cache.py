@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from cache_store import LRUCache
+
+# How long a cached model answer stays valid.
+LLM_CACHE_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+LLM_CACHE_ENTRIES = int(os.environ.get("LLM_CACHE_ENTRIES", "256"))
+LLM_CACHE_MAX_MB = int(os.environ.get("LLM_CACHE_MAX_MB", "16"))
+# Optional SQLite file so answers survive restarts (and are shared between
+# processes on the same box). Off unless configured.
+LLM_CACHE_DB = os.environ.get("LLM_CACHE_DB")
+# Bounds for that file: past either limit the entries closest to expiry go.
+LLM_CACHE_DB_ENTRIES = int(os.environ.get("LLM_CACHE_DB_ENTRIES", "5000"))
+LLM_CACHE_DB_MAX_MB = int(os.environ.get("LLM_CACHE_DB_MAX_MB", "256"))
+# The table is pruned (expired rows, then the bounds above) every N stores.
+LLM_CACHE_DB_PRUNE_EVERY = int(os.environ.get("LLM_CACHE_DB_PRUNE_EVERY", "50"))
+# "1" turns the cache off for every call (e.g. while iterating on a prompt).
+LLM_CACHE_BYPASS = os.environ.get("LLM_CACHE_BYPASS", "0") == "1"
+
+
+def agent_fingerprint(agent: Any) -> str:
+    """
+    Hash of everything about an agent that changes its answers: name, model,
+    instruction, output schema and tool names. Editing a prompt therefore
+    invalidates that agent's cached answers by itself.
+    """
+    model = getattr(agent, "model", "")
+    schema = getattr(agent, "output_schema", None)
+    parts = {
+        "name": agent.name,
+        "model": getattr(model, "model", model) if not isinstance(model, str) else model,
+        "instruction": agent.instruction if isinstance(agent.instruction, str) else repr(agent.instruction),
+        "schema": schema.model_json_schema() if schema is not None else None,
+        "tools": sorted(getattr(t, "name", getattr(t, "__name__", repr(t))) for t in agent.tools or []),
+    }
+    canonical = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def canonical_input(message: str) -> str:
+    """JSON messages are re-serialized with sorted keys so key order/whitespace don't matter."""
+    text = re.sub(r"```(?:json)?", "", message).strip()
+    try:
+        return json.dumps(json.loads(text), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    except (TypeError, ValueError):
+        return text
+
+
+class LLMResponseCache:
+    """
+    Caches final agent answers keyed on (agent fingerprint, canonical input).
+    Memory LRU in front of an optional SQLite table; entries expire after ttl.
+    The table is pruned on startup and every prune_every stores: expired rows
+    are deleted, then it's cut back to max_db_entries / max_db_bytes.
+    Hits report how much model latency they saved (the original call's time).
+    lookup(), store() and run() are coroutines: SQLite I/O goes through
+    asyncio.to_thread so it never blocks the agent loop.
+    """
+
+    def __init__(self, ttl: float = LLM_CACHE_TTL_SECONDS, max_entries: int = LLM_CACHE_ENTRIES,
+                 max_bytes: int = LLM_CACHE_MAX_MB * 1024 * 1024, db_path: Optional[str] = LLM_CACHE_DB,
+                 max_db_entries: int = LLM_CACHE_DB_ENTRIES, max_db_bytes: int = LLM_CACHE_DB_MAX_MB * 1024 * 1024,
+                 prune_every: int = LLM_CACHE_DB_PRUNE_EVERY):
+        self.ttl = ttl
+        # value: (expires_at, text, latency_seconds)
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes,
+                               sizeof=lambda entry: len(entry[1]))
+        self.db_path = db_path
+        self.max_db_entries = max_db_entries
+        self.max_db_bytes = max_db_bytes
+        self.prune_every = max(1, prune_every)
+        self._lock = threading.Lock()
+        self._fingerprints: Dict[int, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.expired = 0
+        self.seconds_saved = 0.0
+        self.db_pruned = 0
+        if db_path:
+            self._execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, agent TEXT, response TEXT, latency REAL, expires_at REAL)"
+            )
+            self._execute("CREATE INDEX IF NOT EXISTS llm_cache_by_expiry ON llm_cache (expires_at)")
+            self.prune()
+
+    def key_for(self, agent: Any, message: str) -> str:
+        # Agents are module-level singletons; fingerprint each one once
+        fingerprint = self._fingerprints.get(id(agent))
+        if fingerprint is None:
+            fingerprint = self._fingerprints[id(agent)] = agent_fingerprint(agent)
+        return hashlib.sha256(f"{fingerprint}\n{canonical_input(message)}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[tuple]:
+        entry = self.memory.get(key)
+        if entry is None and self.db_path:
+            entry = self._db_get(key)
+            if entry is not None:
+                self.memory.put(key, entry)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            self.memory.pop(key)
+            with self._lock:
+                self.expired += 1
+            return None
+        return entry
+
+    def put(self, key: str, agent_name: str, text: str, latency: float):
+        entry = (time.time() + self.ttl, text, latency)
+        self.memory.put(key, entry)
+        if self.db_path:
+            self._execute(
+                "INSERT OR REPLACE INTO llm_cache (key, agent, response, latency, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, agent_name, text, latency, entry[0])
+            )
+        with self._lock:
+            self.stores += 1
+            due = self.stores % self.prune_every == 0
+        if self.db_path and due:
+            self.prune()
+
+    def prune(self) -> int:
+        """Deletes expired rows, then the rows closest to expiry past the table's bounds. Returns how many."""
+        if not self.db_path:
+            return 0
+        db = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with db:
+                deleted = db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),)).rowcount
+                deleted += db.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache "
+                    "ORDER BY expires_at DESC LIMIT -1 OFFSET ?)", (self.max_db_entries,)
+                ).rowcount
+                # Running total, newest first: everything past the byte budget goes
+                deleted += db.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM ("
+                    "SELECT key, SUM(LENGTH(CAST(response AS BLOB))) OVER "
+                    "(ORDER BY expires_at DESC, key ROWS UNBOUNDED PRECEDING) AS total FROM llm_cache"
+                    ") WHERE total > ?)", (self.max_db_bytes,)
+                ).rowcount
+        finally:
+            db.close()
+        if deleted:
+            with self._lock:
+                self.db_pruned += deleted
+            print(f"LLM cache: pruned {deleted} row(s) from {self.db_path}")
+        return deleted
+
+    async def _get_async(self, key: str) -> Optional[tuple]:
+        if self.db_path and key not in self.memory:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def lookup(self, agent: Any, message: str, use_cache: bool = True,
+               validate: Optional[Callable[[str], bool]] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        (key, cached answer) for (agent, message). The key is None when the
+        cache is bypassed; the answer is None on a miss. Counts hits/misses.
+        """
+        if not use_cache or LLM_CACHE_BYPASS:
+            with self._lock:
+                self.bypassed += 1
+            return None, None
+
+        key = self.key_for(agent, message)
+        entry = await self._get_async(key)
+        if entry is not None and (validate is None or validate(entry[1])):
+            with self._lock:
+                self.hits += 1
+                self.seconds_saved += entry[2]
+            print(f"LLM cache hit for {agent.name} (saved ~{entry[2]:.1f}s)")
+            return key, entry[1]
+
+        with self._lock:
+            self.misses += 1
+        return key, None
+
+    async def store(self, key: Optional[str], agent: Any, text: Any, latency: float,
+                    validate: Optional[Callable[[str], bool]] = None):
+        """Caches a fresh answer from lookup's key; empty or rejected answers are skipped."""
+        if key and isinstance(text, str) and text.strip() and (validate is None or validate(text)):
+            if self.db_path:
+                await asyncio.to_thread(self.put, key, agent.name, text, latency)
+            else:
+                self.put(key, agent.name, text, latency)
+
+    async def run(self, agent: Any, message: str, call: Callable[[], Awaitable[str]],
+                  use_cache: bool = True, validate: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        Returns the cached answer for (agent, message), or awaits call() and
+        caches its result. Empty answers, and answers validate() rejects,
+        are never served from or written to the cache.
+        """
+        key, text = await self.lookup(agent, message, use_cache, validate)
+        if text is not None:
+            return text
+
+        start = time.perf_counter()
+        text = await call()
+        await self.store(key, agent, text, time.perf_counter() - start, validate)
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "bypassed": self.bypassed,
+            "stores": self.stores,
+            "expired": self.expired,
+            "seconds_saved": round(self.seconds_saved, 2),
+            "memory": self.memory.stats(),
+            "sqlite": self.db_path,
+            "sqlite_pruned": self.db_pruned,
+        }
+
+    def clear(self):
+        self.memory.clear()
+        if self.db_path:
+            self._execute("DELETE FROM llm_cache")
+
+    def _db_get(self, key: str) -> Optional[tuple]:
+        row = self._execute("SELECT expires_at, response, latency FROM llm_cache WHERE key = ?", (key,))
+        return tuple(row) if row else None
+
+    def _execute(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        # One short-lived connection per operation: calls come from the
+        # agent loop thread and asyncio.to_thread workers alike
+        db = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with db:  # commits
+                return db.execute(sql, params).fetchone()
+        finally:
+            db.close()
+
+
+LLM_CACHE = LLMResponseCache()
+
+
+def get_llm_cache_stats() -> Dict[str, Any]:
+    return LLM_CACHE.stats()
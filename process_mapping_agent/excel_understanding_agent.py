@@ -1,12 +1,12 @@
 from google.adk import Agent
-from config import DEFAULT_MODEL
+from config import DEFAULT_LLM
 from process_mapping_agent.tools.file_metadata_tool import files_metadata_tool
 from process_mapping_agent.schemas.excel_mapping_schema import UnderstandingAgentOutput
 
 
 excel_understanding_agent = Agent(
     name="excel_understanding_agent",
-    model=DEFAULT_MODEL,
+    model=DEFAULT_LLM,
     instruction="""
 You are the Excel Understanding Agent.
 
@@ -15,28 +15,37 @@ and use the files_metadata_tool tool to extract their structure.
 DO NOT guess the filenames; use the ones available in the current session.
 
 
-After receiving metadata, analyze it and return your JSON response in this schema:
+The tool returns {"encoding": "compact-v1", "files_metadata": "<text>"}: a compact,
+token-budgeted text form of every file's sheets. Its first line explains the format:
 
+aliases: $1=CostCentre, $2=Date          <- columns shared by several sheets (likely join keys)
+hints:                                   <- relationships measured on ALL values (MinHash)
+join key: Raw_Transactions.CostCentre -> CostCentre_Master.CostCentre (100% of values found)
+duplicate: Raw_Transactions.Category = Monthly_Spend.Category (100% same values)
+## file finance.xlsx
+formulas: 1200 cells (Monthly_Spend 1200)    <- formula cells per sheet
+flow: Raw_Transactions -> Monthly_Spend (1200), FX_Rates -> Monthly_Spend (600)
+order: Raw_Transactions > FX_Rates > Monthly_Spend
+### sheet Raw_Transactions rows=500 cols=5
+cols: TransactionID, $2, $1, Description, AmountGBP
+stats:                                   <- column|type|null%|distinct|min|max (whole sheet)
+TransactionID|int|0|494|1|500
+sample:                                  <- first rows, values in column order
+1|2024-01-01|CC412|Overtime|750
 
-{
-  "files_metadata": {
-      "files": [
-          {
-              "file_name": "...",
-              "sheets": [
-                  {
-                      "sheet_name": "...",
-                      "columns": [...],
-                      "row_count": ...,
-                      "sample_rows": [...]
-                  }
-              ]
-          }
-      ]
-  }
-}
+(If "encoding" is missing, "files_metadata" is the older JSON with the same information.)
 
 Once you have the metadata, analyze the sheets, columns, and sample data to infer the business workflow.
+rows= and the stats cover the WHOLE sheet (sample rows are only the first 3 rows):
+use them to tell small lookup/master tables from large transactional "database" sheets,
+spot sparse columns (high null%) and likely keys (distinct close to rows).
+"(+N more)" means columns or sheets were left out to fit the budget; still mention wide sheets.
+Use the hints for the join-key and duplicated-data issues: a "join key" is a lookup relationship
+(missing from the hints = no reliable key), a "duplicate" or "subset" is data kept in two places.
+"flow:" is measured from the workbook's formulas, so it is the real data lineage between sheets:
+when present, order the process_map along it (sources first, per "order:") instead of guessing
+from sheet names. "formulas: none" means the sheets hold only typed/pasted values (manual steps);
+"[Book.xlsx]Sheet" sources are links to other workbooks, "cyclic:" sheets feed each other.
 
 You MUST:
 
@@ -1,24 +1,22 @@
 # from google.adk import Tool, Context
+import json
 import os
+import re
+from typing import Any, Dict, List, Optional
 from graphviz import Digraph
-from google.adk.models.google_llm import Gemini
+from pydantic import TypeAdapter, ValidationError
 from google.adk.agents import LlmAgent
 from google.adk.tools import FunctionTool
-from google.genai import types
+from config import DEFAULT_LLM
 from process_mapping_agent.tools.generate_process_diagram_tool import generate_process_diagram_tool
+from process_mapping_agent.schemas.feedback_schema import ProcessStep
 
 generate_process_map_tool = FunctionTool(func=generate_process_diagram_tool)
 
-retry_config = types.HttpRetryOptions(
-    attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
-print("Retries configured")
-
+# Shared model (one client / connection pool for every agent). Retries are
+# agent_runner's LLM_RETRY_POLICY, like for the other agents.
 process_visualization_agent = LlmAgent(
-    model=Gemini(model="gemini-2.5-flash", retry_options=retry_config),
+    model=DEFAULT_LLM,
     name="process_visualization_agent",
     description="Generates a process map PNG from the understanding JSON.",
     instruction="""
@@ -36,15 +34,68 @@ YOUR TASK
 
 OUTPUT RULES
 ------------
-- **Success:** If the tool works, your final answer should be the file path it returns (e.g., "process_map.png").
+- **Success:** If the tool works, your final answer should be the diagram reference it returns (e.g., "process_map_1a2b3c4d5e6f7a8b.png").
 - **Failure:** If the string is invalid or the tool fails, please output a text error message explaining what went wrong. 
 
 CRITICAL FINAL STEP:
-3. After the tool runs, you MUST respond with the file path returned by the tool.
+3. After the tool runs, you MUST respond with the diagram reference returned by the tool.
    - Do NOT just stop after calling the tool.
-   - Your final output must be the file path string (e.g. "process_map.png").
+   - Your final output must be the reference string exactly as returned (e.g. "process_map_1a2b3c4d5e6f7a8b.png").
 
 Do not strictly return only the filename if there is an error; we need to know why it failed.
 """,
     tools=[generate_process_map_tool],
-)
\ No newline at end of file
+)
+
+
+# ----------------------------------------------------------------------------
+# Direct mode (no LLM)
+# ----------------------------------------------------------------------------
+# All the agent above does is parse JSON, pull out "process_map" and call the
+# diagram tool. When the input is already a valid process map we do exactly
+# that locally and skip the Gemini round-trip (and its retries).
+
+_process_map_adapter = TypeAdapter(List[ProcessStep])
+
+
+def validate_process_map(understanding_json: Any) -> Optional[List[Dict[str, Any]]]:
+    """
+    Returns the validated, non-empty process_map as a list of dicts,
+    or None if the input doesn't hold one (then the LLM path is needed).
+    """
+    if isinstance(understanding_json, str):
+        text = re.sub(r"```(?:json)?", "", understanding_json).strip()
+        try:
+            understanding_json = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+
+    if isinstance(understanding_json, dict):
+        steps = understanding_json.get("process_map")
+    else:
+        steps = understanding_json
+
+    if not isinstance(steps, list) or not steps:
+        return None
+
+    try:
+        return [step.model_dump() for step in _process_map_adapter.validate_python(steps)]
+    except ValidationError:
+        return None
+
+
+def render_process_map_directly(understanding_json: Any) -> Optional[str]:
+    """
+    Deterministic fast path for the Mapping Agent.
+    Returns the diagram tool's result, or None when the caller should fall
+    back to the LLM (input didn't validate, or rendering failed).
+    """
+    steps = validate_process_map(understanding_json)
+    if steps is None:
+        return None
+
+    result = generate_process_diagram_tool(steps)
+    if result.startswith("Error"):
+        print(f"Direct mapping failed ({result}), falling back to the Mapping Agent.")
+        return None
+    return result
@@ -1,7 +1,10 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel, Field
 
 class ProcessStep(BaseModel):
+    # Stable identity for feedback patches ("s1", "s2", ...), assigned by the app
+    step_id: Optional[str] = Field(default=None, description="Stable id of the step")
+
     # We already fixed this one
     step_number: Optional[int] = Field(default=None, description="The sequential number of the step")
     
@@ -41,4 +44,44 @@ class FeedbackSchema(BaseModel):
     updated_recommended_tool: Optional[str] = None
     updated_reason_for_tool: Optional[str] = None
     updated_process_diagram_path: Optional[str] = None
-    reason_for_update: Optional[str] = None
\ No newline at end of file
+    reason_for_update: Optional[str] = None
+
+
+# --- Patch protocol: the Feedback Agent returns step operations, not the whole map ---
+
+class StepFields(BaseModel):
+    # null = leave unchanged
+    step_name: Optional[str] = None
+    role: Optional[str] = None
+    description: Optional[str] = None
+    decision_point: Optional[bool] = None
+    condition: Optional[str] = Field(default=None, description='"" removes the condition')
+
+class StepOperation(BaseModel):
+    op: Literal["insert", "update", "delete", "move"]
+    step_id: Optional[str] = Field(
+        default=None,
+        description="update/delete/move: the step's id. insert: a new id such as 'n1' (so later operations can refer to it)"
+    )
+    after_step_id: Optional[str] = Field(
+        default=None,
+        description="insert/move: the step it goes after; null puts it first"
+    )
+    fields: Optional[StepFields] = Field(
+        default=None,
+        description="insert: the new step; update: only the fields that change"
+    )
+
+class FeedbackPatchSchema(BaseModel):
+    user_feedback: str
+    agent_response_message: str = Field(
+        description="A natural language response to the user. E.g., 'Great idea, I have removed that step.' or 'I cannot do that because...'"
+    )
+    changes_made: str
+    process_map_ops: List[StepOperation] = Field(
+        default_factory=list,
+        description="Step operations, applied in order. Empty when the process map doesn't change."
+    )
+    updated_recommended_tool: Optional[str] = None
+    updated_reason_for_tool: Optional[str] = None
+    reason_for_update: Optional[str] = None
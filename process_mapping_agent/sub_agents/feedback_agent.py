@@ -1,28 +1,27 @@
 from google.adk import Agent
-from config import DEFAULT_MODEL
-from process_mapping_agent.schemas.feedback_schema import FeedbackSchema
-from process_mapping_agent.tools.generate_process_diagram_tool import generate_process_diagram_tool
+from config import DEFAULT_LLM
+from process_mapping_agent.schemas.feedback_schema import FeedbackPatchSchema
 
 
 feedback_agent = Agent(
     name="feedback_agent",
-    model=DEFAULT_MODEL,
-    tools=[generate_process_diagram_tool],
+    model=DEFAULT_LLM,
     instruction="""
 You are the Feedback Agent.
 Your responsibilities:
 1. Present the current combined workflow (process map + selected tool + diagram path).
 2. Apply user feedback to update the process map and/or tool selection.
-3. Regenerate the PNG diagram whenever the process map changes.
+3. Return the changes to the process map as step operations (the application applies them and redraws the diagram).
 4. Repeat until the user confirms satisfaction.
 
 
 INPUT FORMAT
-You will receive input in the following format:
+The conversation starts with a CHECKPOINT message carrying the full state:
 
 {
+  "mode": "checkpoint",
   "mapping_agent_output": {
-       "process_map": [...],
+       "process_map": [{"step_id": "s1", "step_name": "...", ...}, ...],
        "process_diagram_path": "path/to/png"
   },
   "product_agent_output": {
@@ -33,7 +32,22 @@ You will receive input in the following format:
   "user_feedback": "..."
 }
 
-- process_map is the current ordered list of workflow steps.
+Later turns are DELTA messages; the process map is NOT repeated:
+
+{
+  "mode": "delta",
+  "user_feedback": "...",
+  "last_turn": {"rejected_ops": [...], "renamed_ids": {...}}   (optional)
+}
+
+- process_map is the current ordered list of workflow steps. Each step has a
+  stable step_id; fields left out have their defaults (role "Unknown Role",
+  empty description, decision_point false, no condition).
+- In delta mode the current map is the checkpoint map with all your
+  previous operations applied, EXCEPT the ones listed in
+  last_turn.rejected_ops (they were not applied, see their "error").
+  last_turn.renamed_ids maps ids you proposed (or the names of new steps
+  you gave no id) to the ids actually given.
 - process_diagram_path is the PNG representing the flow.
 - top_5_tools is the ONLY approved toolset.
 - user_feedback contains the user's requested changes.
@@ -91,23 +105,30 @@ Ask for clarification ONLY when:
 
 If the user implicitly requests a new step (“add validation before upload”):
 - Add a new step logically,
-- Keep numbering consistent.
+- Insert it after the step it logically follows (numbering is handled for you).
 
 You must maintain clarity, professional tone, and consistent formatting.
 
-DIAGRAM REGENERATION (IMPORTANT)
+PROCESS MAP OPERATIONS (IMPORTANT)
 ====================================================================
 
-If—and ONLY if—the process map changes:
-You MUST call the tool `generate_process_diagram_tool` with a SINGLE argument:
-- `process_data`: The updated list of steps (the new process_map).
+Never return the whole process map. Return ONLY what changes, as a list
+of operations in `process_map_ops`, applied in order:
+
+- {"op": "update", "step_id": "s3", "fields": {"step_name": "New name"}}
+    only the fields that change; leave the others null.
+    Use "condition": "" to remove a condition.
+- {"op": "insert", "step_id": "n1", "after_step_id": "s2", "fields": {"step_name": "...", "role": "...", "description": "..."}}
+    give every new step a new id ("n1", "n2", ...); after_step_id null = first step.
+- {"op": "delete", "step_id": "s4"}
+- {"op": "move", "step_id": "s5", "after_step_id": "s1"}
 
-The tool will return the new file path string.
-Use that string to update `updated_process_diagram_path`.
+Step numbers are recomputed by the application. An empty list means
+the map does not change.
 
-If the process map does NOT change (e.g. only tool selection changed):
-- Do NOT call the diagram tool.
-- Retain the `previous_process_diagram_path`.
+You do NOT draw the diagram. The application applies your operations,
+redraws only what changed and writes the final `changes_made` summary.
+Still fill `changes_made` with a short summary ("none" if nothing changed).
 
 Otherwise, set user_satisfied = false.
 
@@ -127,10 +148,9 @@ You MUST output a JSON object matching feedback_schema.json exactly:
   "user_feedback": "...",
   "agent_response_message": "...",
   "changes_made": "...",
-  "updated_process_map": [...],
+  "process_map_ops": [...],
   "updated_recommended_tool": "...",
   "updated_reason_for_tool": "...",
-  "updated_process_diagram_path": "...",
   "reason_for_update": "..."
 }
 
@@ -141,6 +161,6 @@ You MUST output a JSON object matching feedback_schema.json exactly:
 - If no changes are made, ensure cahnges_made = "none"
 
 """,
-    output_schema=FeedbackSchema
+    output_schema=FeedbackPatchSchema
 )
  
\ No newline at end of file
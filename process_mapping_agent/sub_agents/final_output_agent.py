@@ -1,10 +1,10 @@
 from google.adk import Agent
-from config import DEFAULT_MODEL
+from config import DEFAULT_LLM
 from process_mapping_agent.schemas.final_output_schema import FinalOutputSchema
 
 final_output_agent = Agent(
     name="final_output_agent",
-    model=DEFAULT_MODEL,
+    model=DEFAULT_LLM,
     # No output_schema (Standard Text Mode)
     instruction="""
 You are the Final Output Agent.
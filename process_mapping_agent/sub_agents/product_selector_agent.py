@@ -1,10 +1,10 @@
 from google.adk import Agent
-from config import DEFAULT_MODEL
+from config import DEFAULT_LLM
 from process_mapping_agent.schemas.product_selector_schema import ProductSelectorSchema
 
 product_selector_agent = Agent(
     name="product_selector_agent",
-    model=DEFAULT_MODEL,
+    model=DEFAULT_LLM,
     instruction="""
 You are the Product Selector Agent.  
 Your job is to analyse the process characteristics extracted from Excel files and recommend the best tools for implementing the workflow.
@@ -63,6 +63,17 @@ You may ONLY choose from these tools:
 - "Asana"
 - "Trello"
 
+-----------------------------------------------------
+RULE-BASED RANKING (WHEN PROVIDED)
+-----------------------------------------------------
+If the JSON also contains "rule_based_ranking", the scoring above has
+already been done locally:
+- Keep "top_5_tools" exactly as given.
+- Choose "recommended_tool" ONLY from "candidates" (they are tied or
+  already decided; pick the one that fits the process best).
+- Write "reason_for_recommendation" for that tool in 1-3 sentences,
+  grounded in the process_map, issues and opportunities.
+
 -----------------------------------------------------
 OUTPUT FORMAT
 -----------------------------------------------------
@@ -0,0 +1,206 @@
+import functools
+import io
+import os
+from typing import Any, Dict, List
+from xml.sax.saxutils import escape
+
+# Pillow is only needed for PNG output; SVG works without it.
+try:
+    from PIL import Image, ImageDraw, ImageFont
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# Linear flows longer than this go to Graphviz (it packs long chains better).
+BUILTIN_MAX_STEPS = int(os.environ.get("DIAGRAM_BUILTIN_MAX_STEPS", "40"))
+
+# Geometry, in pixels. Roughly what `dot` produces for the same graph.
+MARGIN = 16
+NODE_GAP = 36
+BOX_HEIGHT = 46
+DIAMOND_HEIGHT = 72
+PADDING_X = 18
+TITLE_SIZE = 14
+ROLE_SIZE = 10
+# Average glyph width as a fraction of the font size (sans-serif).
+CHAR_WIDTH = 0.6
+ARROW_SIZE = 7
+
+BOX_FILL = "lightblue"
+DECISION_FILL = "orange"
+ROLE_COLOR = "gray"
+
+
+def _text_width(text: str, size: int) -> float:
+    return len(text) * size * CHAR_WIDTH
+
+
+def _step_fields(i: int, step: Any) -> Dict[str, Any]:
+    # Same defaults as build_process_digraph
+    if isinstance(step, str):
+        return {"name": step, "role": "Unknown", "decision": False}
+    return {
+        "name": str(step.get("step_name", f"Step {i+1}")),
+        "role": str(step.get("role", "Unknown Role")),
+        "decision": bool(step.get("decision_point", False)),
+    }
+
+
+def layout_node(i: int, step: Any) -> Dict[str, Any]:
+    """Size of one node (position is filled in by layout_process_map)."""
+    fields = _step_fields(i, step)
+    text_w = max(_text_width(fields["name"], TITLE_SIZE), _text_width(fields["role"], ROLE_SIZE))
+    if fields["decision"]:
+        # The diamond has to be wider than its text to keep the corners clear
+        width, height = text_w * 1.5 + 2 * PADDING_X, DIAMOND_HEIGHT
+    else:
+        width, height = text_w + 2 * PADDING_X, BOX_HEIGHT
+    return {
+        "id": str(i),
+        "label": fields["name"],
+        "role": fields["role"],
+        "shape": "diamond" if fields["decision"] else "box",
+        "fill": DECISION_FILL if fields["decision"] else BOX_FILL,
+        "w": round(width, 1),
+        "h": height,
+    }
+
+
+def layout_process_map(steps: List[Any]) -> Dict[str, Any]:
+    """
+    Top-to-bottom layout of a linear flow: one centred column of nodes,
+    each joined to the next. Returns a plain-dict diagram model
+    {"width", "height", "nodes": [...], "edges": [...]}.
+    """
+    nodes = [layout_node(i, step) for i, step in enumerate(steps)]
+    return place_nodes(nodes)
+
+
+def place_nodes(nodes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Positions already-sized nodes in a column and draws the edges between them."""
+    width = max((n["w"] for n in nodes), default=0) + 2 * MARGIN
+    y = MARGIN
+    for node in nodes:
+        node["x"] = round((width - node["w"]) / 2, 1)
+        node["y"] = y
+        y += node["h"] + NODE_GAP
+
+    edges = []
+    for upper, lower in zip(nodes, nodes[1:]):
+        cx = width / 2
+        edges.append({
+            "from": upper["id"],
+            "to": lower["id"],
+            "x1": cx, "y1": upper["y"] + upper["h"],
+            "x2": cx, "y2": lower["y"],
+        })
+
+    height = y - NODE_GAP + MARGIN if nodes else 2 * MARGIN
+    return {"width": round(width), "height": round(height), "nodes": nodes, "edges": edges}
+
+
+def _diamond_points(node: Dict[str, Any]) -> List[tuple]:
+    x, y, w, h = node["x"], node["y"], node["w"], node["h"]
+    return [(x + w / 2, y), (x + w, y + h / 2), (x + w / 2, y + h), (x, y + h / 2)]
+
+
+def svg_from_layout(model: Dict[str, Any]) -> bytes:
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{model["width"]}" height="{model["height"]}" '
+        f'viewBox="0 0 {model["width"]} {model["height"]}" font-family="Helvetica,Arial,sans-serif">',
+        '<defs><marker id="arrow" markerWidth="10" markerHeight="10" refX="9" refY="5" orient="auto">'
+        '<path d="M0,0 L10,5 L0,10 z" fill="black"/></marker></defs>',
+        '<rect width="100%" height="100%" fill="white"/>',
+    ]
+
+    for node in model["nodes"]:
+        if node["shape"] == "diamond":
+            points = " ".join(f"{px:.1f},{py:.1f}" for px, py in _diamond_points(node))
+            parts.append(f'<polygon points="{points}" fill="{node["fill"]}" stroke="black"/>')
+        else:
+            parts.append(
+                f'<rect x="{node["x"]}" y="{node["y"]}" width="{node["w"]}" height="{node["h"]}" '
+                f'fill="{node["fill"]}" stroke="black"/>'
+            )
+        cx = node["x"] + node["w"] / 2
+        cy = node["y"] + node["h"] / 2
+        parts.append(
+            f'<text x="{cx:.1f}" y="{cy - 2:.1f}" font-size="{TITLE_SIZE}" text-anchor="middle">'
+            f'{escape(node["label"])}</text>'
+        )
+        parts.append(
+            f'<text x="{cx:.1f}" y="{cy + ROLE_SIZE + 2:.1f}" font-size="{ROLE_SIZE}" text-anchor="middle" '
+            f'fill="{ROLE_COLOR}">{escape(node["role"])}</text>'
+        )
+
+    for edge in model["edges"]:
+        parts.append(
+            f'<line x1="{edge["x1"]:.1f}" y1="{edge["y1"]:.1f}" x2="{edge["x2"]:.1f}" y2="{edge["y2"]:.1f}" '
+            f'stroke="black" marker-end="url(#arrow)"/>'
+        )
+
+    parts.append("</svg>")
+    return "\n".join(parts).encode("utf-8")
+
+
+@functools.lru_cache(maxsize=None)
+def _load_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 only has the fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def png_from_layout(model: Dict[str, Any]) -> bytes:
+    if not PIL_AVAILABLE:
+        raise RuntimeError("PNG output from the built-in renderer needs Pillow.")
+
+    image = Image.new("RGB", (model["width"], model["height"]), "white")
+    draw = ImageDraw.Draw(image)
+    title_font = _load_font(TITLE_SIZE)
+    role_font = _load_font(ROLE_SIZE)
+
+    for node in model["nodes"]:
+        if node["shape"] == "diamond":
+            draw.polygon(_diamond_points(node), fill=node["fill"], outline="black")
+        else:
+            draw.rectangle(
+                [node["x"], node["y"], node["x"] + node["w"], node["y"] + node["h"]],
+                fill=node["fill"], outline="black"
+            )
+        cx = node["x"] + node["w"] / 2
+        cy = node["y"] + node["h"] / 2
+        draw.text((cx, cy - 7), node["label"], fill="black", font=title_font, anchor="mm")
+        draw.text((cx, cy + 9), node["role"], fill=ROLE_COLOR, font=role_font, anchor="mm")
+
+    for edge in model["edges"]:
+        x2, y2 = edge["x2"], edge["y2"]
+        draw.line([(edge["x1"], edge["y1"]), (x2, y2 - ARROW_SIZE)], fill="black", width=1)
+        draw.polygon([(x2, y2), (x2 - ARROW_SIZE / 2, y2 - ARROW_SIZE), (x2 + ARROW_SIZE / 2, y2 - ARROW_SIZE)],
+                     fill="black")
+
+    out = io.BytesIO()
+    # Flat colours compress fine at a low level; the default level doubles the render time
+    image.save(out, format="PNG", compress_level=1)
+    return out.getvalue()
+
+
+def can_render_builtin(steps: List[Any], fmt: str) -> bool:
+    """The built-in renderer only does what the tool draws: short linear flows."""
+    if fmt == "png" and not PIL_AVAILABLE:
+        return False
+    return fmt in ("png", "svg") and 0 < len(steps) <= BUILTIN_MAX_STEPS
+
+
+def render_from_layout(model: Dict[str, Any], fmt: str = "png") -> bytes:
+    if fmt == "svg":
+        return svg_from_layout(model)
+    if fmt == "png":
+        return png_from_layout(model)
+    raise ValueError(f"Built-in renderer does not support format '{fmt}'.")
+
+
+def render_builtin(steps: List[Any], fmt: str = "png") -> bytes:
+    """In-process render (no `dot` subprocess)."""
+    return render_from_layout(layout_process_map(steps), fmt)
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from cache_store import DiskCache, LRUCache
+
+# Memory tier for rendered diagrams, keyed on WHAT is drawn (not on bytes).
+CACHE_MAX_ENTRIES = int(os.environ.get("DIAGRAM_CACHE_ENTRIES", "256"))
+CACHE_MAX_MB = int(os.environ.get("DIAGRAM_CACHE_MAX_MB", "64"))
+
+# Optional on-disk tier, off unless configured.
+CACHE_DIR = os.environ.get("DIAGRAM_CACHE_DIR")
+CACHE_DIR_MAX_MB = int(os.environ.get("DIAGRAM_CACHE_DIR_MAX_MB", "256"))
+
+
+def normalize_steps(steps: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Only the fields that change the picture, with the same defaults the
+    renderer applies. A description or tool change leaves the key untouched.
+    """
+    normalized = []
+    for i, step in enumerate(steps):
+        if isinstance(step, str):
+            normalized.append({"name": step, "role": "Unknown", "decision": False})
+        else:
+            normalized.append({
+                "name": str(step.get("step_name", f"Step {i+1}")),
+                "role": str(step.get("role", "Unknown Role")),
+                "decision": bool(step.get("decision_point", False)),
+            })
+    return normalized
+
+
+def diagram_cache_key(steps: List[Any], fmt: str, options: Dict[str, Any]) -> str:
+    canonical = json.dumps(
+        {"steps": normalize_steps(steps), "fmt": fmt, "options": options},
+        sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class DiagramCache:
+    """
+    Memoizes diagram renders: identical maps (same normalized steps, render
+    options and format) come back from memory or disk without rendering again.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_MB * 1024 * 1024,
+                 cache_dir: Optional[str] = CACHE_DIR, max_disk_bytes: int = CACHE_DIR_MAX_MB * 1024 * 1024):
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes)
+        self.disk = DiskCache(cache_dir, max_disk_bytes) if cache_dir else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+        self.render_seconds = 0.0
+        self.last_render_seconds = 0.0
+
+    def get_or_render(self, key: str, render: Callable[[], bytes]) -> bytes:
+        data = self.get(key)
+        if data is not None:
+            return data
+
+        start = time.perf_counter()
+        data = render()
+        self.put(key, data, render_seconds=time.perf_counter() - start)
+        return data
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached render from memory or disk (counted as a hit or a miss), or None."""
+        data = self.memory.get(key)
+        if data is None and self.disk is not None:
+            data = self.disk.get_bytes(key)
+            if data is not None:
+                self.memory.put(key, data)
+
+        with self._lock:
+            if data is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return data
+
+    def put(self, key: str, data: bytes, render_seconds: Optional[float] = None):
+        """Stores a render in both tiers; render_seconds feeds the render timings."""
+        if render_seconds is not None:
+            with self._lock:
+                self.renders += 1
+                self.render_seconds += render_seconds
+                self.last_render_seconds = render_seconds
+
+        self.memory.put(key, data)
+        if self.disk is not None:
+            self.disk.put_bytes(key, data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "renders": self.renders,
+            "avg_render_ms": round(1000 * self.render_seconds / self.renders, 2) if self.renders else 0.0,
+            "last_render_ms": round(1000 * self.last_render_seconds, 2),
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
+
+
+diagram_cache = DiagramCache()
+
+
+def get_diagram_cache_stats() -> Dict[str, Any]:
+    return diagram_cache.stats()
@@ -0,0 +1,117 @@
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+# `dot` processes allowed to run at once (each one is a fork-exec).
+RENDER_WORKERS = int(os.environ.get("DIAGRAM_RENDER_WORKERS", "4"))
+# Renders allowed to wait for a worker before new ones are pushed back.
+RENDER_QUEUE_SIZE = int(os.environ.get("DIAGRAM_RENDER_QUEUE", "32"))
+# A single `dot` run taking longer than this is killed.
+RENDER_TIMEOUT_SECONDS = float(os.environ.get("DIAGRAM_RENDER_TIMEOUT", "20"))
+# How long an interactive caller waits for a queue slot before giving up.
+QUEUE_WAIT_SECONDS = float(os.environ.get("DIAGRAM_RENDER_QUEUE_WAIT", "5"))
+
+DOT_BINARY = os.environ.get("GRAPHVIZ_DOT", "dot")
+
+
+class RenderQueueFull(RuntimeError):
+    """Backpressure: too many renders already queued."""
+
+
+class DiagramRenderService:
+    """
+    Bounded pool of Graphviz workers.
+
+    Renders used to fork `dot` straight from whichever Streamlit script
+    thread asked, with no limit under concurrent users. Here at most
+    `workers` dot processes run at once, at most `queue_size` more wait,
+    and every run has a timeout after which the process is killed.
+    """
+
+    def __init__(self, workers: int = RENDER_WORKERS, queue_size: int = RENDER_QUEUE_SIZE,
+                 timeout: float = RENDER_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="diagram-render")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+
+    def submit(self, source: str, fmt: str = "png", wait: Optional[float] = QUEUE_WAIT_SECONDS) -> Future:
+        """
+        Queues one DOT source for rendering. Blocks up to `wait` seconds for
+        a queue slot (None = as long as it takes) and raises RenderQueueFull after.
+        """
+        if not self._slots.acquire(timeout=wait):
+            with self._lock:
+                self.rejected += 1
+            raise RenderQueueFull("Diagram renderer is busy, please retry in a moment.")
+
+        with self._lock:
+            self._pending += 1
+        future = self._pool.submit(self._run_dot, source, fmt)
+        future.add_done_callback(self._release)
+        return future
+
+    def render(self, source: str, fmt: str = "png") -> bytes:
+        """Renders and waits for the bytes (used by the diagram tool)."""
+        return self.submit(source, fmt).result()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self._pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+    def _run_dot(self, source: str, fmt: str) -> bytes:
+        start = time.perf_counter()
+        try:
+            # subprocess.run kills the child when the timeout expires
+            completed = subprocess.run(
+                [DOT_BINARY, f"-T{fmt}"],
+                input=source.encode("utf-8"),
+                capture_output=True,
+                timeout=self.timeout,
+                check=True,
+            )
+        except subprocess.TimeoutExpired:
+            with self._lock:
+                self.timeouts += 1
+            raise TimeoutError(f"Graphviz render timed out after {self.timeout}s")
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"dot failed: {e.stderr.decode('utf-8', 'replace').strip()}")
+        except FileNotFoundError:
+            raise RuntimeError(
+                f"failed to execute '{DOT_BINARY}', make sure the Graphviz executables are on your PATH"
+            )
+        finally:
+            with self._lock:
+                self.busy_seconds += time.perf_counter() - start
+        return completed.stdout
+
+    def _release(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+            if not future.cancelled() and future.exception() is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        self._slots.release()
+
+
+render_service = DiagramRenderService()
+
+
+def get_render_service_stats() -> Dict[str, Any]:
+    return render_service.stats()
@@ -0,0 +1,41 @@
+import hashlib
+import os
+import re
+from typing import Optional, Tuple
+
+from cache_store import LRUCache
+
+# Rendered diagrams live in memory (not in a shared process_map.png in the
+# CWD), keyed by a hash of their content. Bounded so old renders fall out.
+STORE_MAX_MB = int(os.environ.get("DIAGRAM_STORE_MAX_MB", "64"))
+STORE_MAX_ENTRIES = int(os.environ.get("DIAGRAM_STORE_ENTRIES", "256"))
+
+DIAGRAMS = LRUCache(max_entries=STORE_MAX_ENTRIES, max_bytes=STORE_MAX_MB * 1024 * 1024)
+
+# References look like file names so the agents' "diagram path" fields and
+# prompts keep working: process_map_<16 hex chars>.png
+_REF_PATTERN = re.compile(r"process_map_([0-9a-f]{16})\.(png|svg)")
+
+
+def put_diagram(data: bytes, fmt: str = "png") -> str:
+    """Stores rendered bytes and returns their reference string."""
+    key = hashlib.sha256(data).hexdigest()[:16]
+    ref = f"process_map_{key}.{fmt}"
+    DIAGRAMS.put(ref, data)
+    return ref
+
+
+def parse_diagram_ref(text: str) -> Optional[Tuple[str, str]]:
+    """Finds a diagram reference anywhere in text (LLMs like to wrap it in prose)."""
+    if not isinstance(text, str):
+        return None
+    match = _REF_PATTERN.search(text)
+    return (match.group(0), match.group(2)) if match else None
+
+
+def get_diagram(ref: str) -> Optional[bytes]:
+    """Bytes for a reference returned by the diagram tool, or None if unknown/evicted."""
+    parsed = parse_diagram_ref(ref)
+    if parsed is None:
+        return None
+    return DIAGRAMS.get(parsed[0])
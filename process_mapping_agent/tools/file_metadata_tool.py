@@ -1,12 +1,16 @@
+import os
 from typing import List, Dict, Any
 from google.adk.tools import FunctionTool, ToolContext
-import pandas as pd
-from openpyxl import load_workbook
-from io import BytesIO
+from process_mapping_agent.tools.join_hints import find_cross_sheet_hints, strip_signatures
+from process_mapping_agent.tools.metadata_cache import cached_profile_workbooks
+from process_mapping_agent.tools.metadata_encoder import ENCODING_NAME, encode_files_metadata, estimate_tokens
 
 # Import the shared bucket
 from file_store import FILES
 
+# "compact": token-budgeted text (metadata_encoder), "json": the full JSON as before
+METADATA_ENCODING = os.environ.get("METADATA_ENCODING", "compact").lower()
+
 def build_files_metadata(files: List[str], tool_context: ToolContext) -> Dict[str, Any]:
     """
     Extracts metadata from Excel files stored in the global FILE_STORAGE.
@@ -16,8 +20,9 @@ def build_files_metadata(files: List[str], tool_context: ToolContext) -> Dict[st
 
     # 1. Identify the Session
     # We need the session_id to find the right user's files in our bucket
+    # (agent_runner stores each run's uploads under that run's ADK session id)
     try:
-        session_id = tool_context.session.session_id
+        session_id = tool_context.session.id
     except AttributeError:
         # Fallback for local testing if context is mocked or missing
         print("Warning: No session_id found in context. Defaulting to 'default_session'")
@@ -38,6 +43,7 @@ def build_files_metadata(files: List[str], tool_context: ToolContext) -> Dict[st
 
     # 3. Process the files
     result = {"files": []}
+    to_profile = []
     
     for filename in files:
         # Check if we have the bytes for this specific file
@@ -51,54 +57,30 @@ def build_files_metadata(files: List[str], tool_context: ToolContext) -> Dict[st
             
         file_bytes = stored_files[filename]
         print(f"Processing '{filename}' ({len(file_bytes)} bytes)...")
-        
-        file_info = {"file_name": filename, "sheets": []}
-        
-        # Use BytesIO to work with the bytes (Standard Pandas Logic)
-        excel_buffer = BytesIO(file_bytes)
-        
-        try:
-            # Try openpyxl first (faster for just sheet names)
-            wb = load_workbook(excel_buffer, read_only=True, data_only=True)
-            sheet_names = wb.sheetnames
-            wb.close()
-        except Exception:
-            # Fallback to pandas
-            excel_buffer.seek(0)
-            try:
-                xl = pd.ExcelFile(excel_buffer)
-                sheet_names = xl.sheet_names
-            except Exception as e:
-                file_info["error"] = f"Could not read Excel file: {str(e)}"
-                result["files"].append(file_info)
-                continue
-        
-        # Process each sheet
-        for sheet_name in sheet_names:
-            excel_buffer.seek(0)
-            try:
-                # Read just a few rows to get structure
-                df = pd.read_excel(excel_buffer, sheet_name=sheet_name, nrows=5)
-                
-                # Convert timestamps to strings to avoid JSON serialization errors
-                sample_data = df.head(3).astype(object).where(pd.notnull(df), None)
-                
-                sheet_info = {
-                    "sheet_name": sheet_name,
-                    "columns": list(map(str, df.columns)),
-                    "column_count": len(df.columns),
-                    "sample_rows": sample_data.to_dict("records") if len(df) > 0 else []
-                }
-                file_info["sheets"].append(sheet_info)
-            except Exception as e:
-                file_info["sheets"].append({
-                    "sheet_name": sheet_name,
-                    "error": f"Could not read sheet: {str(e)}"
-                })
-        
-        result["files"].append(file_info)
-    
-    return {"files_metadata": result}
+
+        # Keep a slot so the output order matches the requested order
+        result["files"].append(None)
+        to_profile.append((len(result["files"]) - 1, filename, file_bytes))
+
+    # Each workbook is opened once and streamed (see workbook_profiler);
+    # several workbooks are profiled in parallel worker processes, and
+    # workbooks we've already seen (same bytes) come from the cache.
+    profiled = cached_profile_workbooks([(name, data) for _, name, data in to_profile])
+    for (slot, _, _), file_info in zip(to_profile, profiled):
+        result["files"][slot] = file_info
+
+    # 4. Likely join keys / duplicated columns across every sheet and file,
+    #    from the MinHash signatures the profiler kept (LSH, no all-pairs)
+    result["cross_sheet_hints"] = find_cross_sheet_hints(result["files"])
+    strip_signatures(result["files"])
+
+    if METADATA_ENCODING == "json":
+        return {"files_metadata": result}
+
+    # 5. Compact, budgeted text instead of verbose JSON (see metadata_encoder)
+    encoded = encode_files_metadata(result)
+    print(f"Encoded metadata: ~{estimate_tokens(encoded)} tokens ({ENCODING_NAME})")
+    return {"encoding": ENCODING_NAME, "files_metadata": encoded}
 
 # Create the tool definition
 files_metadata_tool = FunctionTool(
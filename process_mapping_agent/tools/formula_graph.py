@@ -0,0 +1,275 @@
+import html
+import os
+import posixpath
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+# Formula lineage between sheets is on by default; "0" skips the pass.
+FORMULA_GRAPH = os.environ.get("FORMULA_GRAPH", "1") == "1"
+# Strongest sheet -> sheet edges kept per workbook.
+MAX_GRAPH_EDGES = int(os.environ.get("FORMULA_GRAPH_MAX_EDGES", "40"))
+
+# Sheet XML is scanned in chunks of this size, cut at row boundaries.
+CHUNK_BYTES = 1 << 20
+
+# <f ...>text</f> or <f .../> (some writers use a namespace prefix, e.g. <x:f>).
+# The text is XML-escaped, so it never contains "<".
+_FORMULA = re.compile(rb"<(?:\w+:)?f\b([^>]*?)(?:/>|>([^<]*)</(?:\w+:)?f>)")
+_ROW_END = re.compile(rb"</(?:\w+:)?row>")
+_SHARED_INDEX = re.compile(rb'\bsi="(\d+)"')
+_STRING_LITERAL = re.compile(r'"(?:[^"]|"")*"')
+# 'Quoted Sheet'!A1, Sheet!A1, [1]Sheet!A1, Jan:Mar!A1 (3D). On the raw
+# UTF-8 bytes: non-ASCII sheet names are matched byte by byte.
+_SHEET_REF = re.compile(rb"(?:'((?:[^']|'')+)'|(?<![\w.#\]\x80-\xff])((?:\[\d+\])?[\w.\x80-\xff]+(?::[\w.\x80-\xff]+)?))!")
+# Bare identifiers: defined names and table names (Table1[Column])
+_NAME = re.compile(rb"(?<![\w.!#\\])([A-Za-z_\\][\w.\\]*)(?![\w(!])")
+_EXTERNAL_INDEX = re.compile(r"^\[(\d+)\](.*)$")
+_TABLE_NAME = re.compile(rb'\bdisplayName="([^"]+)"')
+
+_NO_SOURCES = frozenset()
+_NO_DIGITS_STR = str.maketrans("", "", "0123456789")
+# Distinct formula shapes remembered per workbook.
+MEMO_ENTRIES = 50000
+
+
+def build_formula_graph(wb) -> Dict[str, Any]:
+    """
+    Sheet-level data lineage of a workbook opened with
+    load_workbook(read_only=True): which sheets' formulas read which sheets
+    (or external workbooks), from the formulas' cell references, defined
+    names and table names.
+
+    Cell values aren't needed, so instead of materialising every cell
+    through openpyxl the sheet XML is streamed and only the <f> elements
+    are looked at. Returns
+    {"formula_cells", "sheets": {sheet: formula cells}, "edges": [{"from", "to", "cells"}],
+     "external_workbooks", "order", "cyclic"}.
+    """
+    sheet_names = list(wb.sheetnames)
+    by_name = {name.casefold(): name for name in sheet_names}
+    external = _external_workbooks(wb)
+    names = _defined_name_sheets(wb, by_name)
+    # openpyxl keeps the zip open for read-only workbooks
+    archive = wb._archive
+    names.update(_table_sheets(archive, wb, by_name))
+
+    formula_cells: Counter = Counter()
+    edges: Counter = Counter()
+    resolver = _Resolver(sheet_names, by_name, external, names)
+    for sheet_name in sheet_names:
+        ws = wb[sheet_name]
+        path = getattr(ws, "_worksheet_path", None)
+        if path is None:
+            continue  # chartsheets
+        shared: Dict[bytes, frozenset] = {}
+        # Hot loop: one counter bump per formula cell, expanded to edges per sheet
+        cells_by_sources: Counter = Counter()
+
+        for formulas in _formula_chunks(archive, path):
+            for attributes, text in formulas:
+                if not attributes:
+                    # Plain formula, by far the most common kind
+                    sources = resolver.sources(text) if text else _NO_SOURCES
+                elif text:
+                    sources = resolver.sources(text)
+                    if b'"shared"' in attributes:
+                        index = _SHARED_INDEX.search(attributes)
+                        if index:
+                            shared[index.group(1)] = sources
+                elif b'"dataTable"' in attributes:
+                    continue
+                else:
+                    # A shared formula's other cells only carry its index; at
+                    # sheet level they read the same sheets as the master cell
+                    index = _SHARED_INDEX.search(attributes)
+                    sources = shared.get(index.group(1), _NO_SOURCES) if index else _NO_SOURCES
+                cells_by_sources[sources] += 1
+
+        for sources, cells in cells_by_sources.items():
+            formula_cells[sheet_name] += cells
+            for source in sources:
+                if source != sheet_name:
+                    edges[(source, sheet_name)] += cells
+
+    order, cyclic = _flow_order(sheet_names, edges)
+    return {
+        "formula_cells": sum(formula_cells.values()),
+        "sheets": {name: formula_cells[name] for name in sheet_names if formula_cells[name]},
+        "edges": [
+            {"from": source, "to": target, "cells": cells}
+            for (source, target), cells in sorted(edges.items(), key=lambda e: (-e[1], e[0]))[:MAX_GRAPH_EDGES]
+        ],
+        "external_workbooks": sorted(set(external.values())),
+        "order": order,
+        "cyclic": cyclic,
+    }
+
+
+class _Resolver:
+    """Formula text -> the sheets it reads."""
+
+    def __init__(self, sheet_names: List[str], by_name: Dict[str, str],
+                 external: Dict[int, str], names: Dict[str, Set[str]]):
+        self.sheet_names = sheet_names
+        self.by_name = by_name
+        self.external = external
+        self.names = names
+        # Prefix token -> sheets
+        self.tokens: Dict[Tuple[bytes, bytes], frozenset] = {}
+        self.combined: Dict[frozenset, frozenset] = {}
+        # Filled-down formulas differ only in their row/column numbers
+        # (Raw!A2, Raw!A3, ...), so results are memoised on the formula with
+        # its digits removed. Only safe when no two sheet/defined/table names
+        # differ just by digits (Sheet1 vs Sheet2); otherwise every formula is parsed.
+        known = [name.translate(_NO_DIGITS_STR) for name in list(by_name) + list(names)]
+        self.shapes: Optional[Dict[bytes, frozenset]] = {} if len(set(known)) == len(known) else None
+
+    def sources(self, raw: bytes) -> frozenset:
+        if b"!" not in raw and not self.names:
+            return _NO_SOURCES
+        # "[" = external workbook index ([1], [2]) or a table reference
+        if self.shapes is None or b"[" in raw:
+            return self._parse(raw)
+        shape = raw.translate(None, b"0123456789")
+        found = self.shapes.get(shape)
+        if found is None:
+            found = self._parse(raw)
+            if len(self.shapes) < MEMO_ENTRIES:
+                self.shapes[shape] = found
+        return found
+
+    def _parse(self, raw: bytes) -> frozenset:
+        if b"&" in raw or b'"' in raw:
+            # Entities and string literals ("Total!" isn't a reference):
+            # the slow path on the decoded text
+            text = html.unescape(raw.decode("utf-8", "replace"))
+            raw = _STRING_LITERAL.sub('""', text).encode("utf-8")
+
+        found = _NO_SOURCES
+        for token in _SHEET_REF.findall(raw):
+            sheets = self.tokens.get(token)
+            if sheets is None:
+                quoted, plain = token
+                reference = quoted.decode("utf-8", "replace").replace("''", "'") if quoted else plain.decode()
+                sheets = self.tokens[token] = frozenset(self._sheets(reference))
+            found = found | sheets if found else sheets
+        if self.names:
+            for name in _NAME.findall(_SHEET_REF.sub(b"", raw)):
+                found = found | self.names.get(name.decode().casefold(), _NO_SOURCES)
+        # Intern equal sets so the per-sheet counter sees few distinct keys
+        return self.combined.setdefault(found, found)
+
+    def _sheets(self, reference: str) -> List[str]:
+        external = _EXTERNAL_INDEX.match(reference)
+        if external:
+            book = self.external.get(int(external.group(1)), f"external[{external.group(1)}]")
+            return [f"[{book}]{sheet}" for sheet in external.group(2).split(":") if sheet]
+
+        first, _, last = reference.partition(":")
+        first, last = self.by_name.get(first.casefold()), self.by_name.get((last or first).casefold())
+        if first is None or last is None:
+            return []  # #REF! leftovers, or not a sheet after all
+        # 3D reference: every sheet between the two, in workbook order
+        i, j = sorted((self.sheet_names.index(first), self.sheet_names.index(last)))
+        return self.sheet_names[i:j + 1]
+
+
+def _formula_chunks(archive, path: str) -> Iterator[List[Tuple[bytes, bytes]]]:
+    """
+    Lists of (attributes, text) for the <f> elements of a sheet part, one
+    list per row-aligned chunk (text is b"" for the empty cells of a shared formula).
+    """
+    with archive.open(path) as f:
+        tail = b""
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            buffer = tail + chunk
+            if chunk:
+                last_row = None
+                for last_row in _ROW_END.finditer(buffer, max(0, len(buffer) - len(chunk) - 16)):
+                    pass
+                if last_row is None:
+                    tail = buffer
+                    continue
+                buffer, tail = buffer[:last_row.end()], buffer[last_row.end():]
+            yield _FORMULA.findall(buffer)
+            if not chunk:
+                return
+
+
+def _external_workbooks(wb) -> Dict[int, str]:
+    """[n] prefix -> external file name (formulas store external refs as [n]Sheet!A1)."""
+    books = {}
+    for i, link in enumerate(getattr(wb, "_external_links", []) or [], start=1):
+        target = getattr(getattr(link, "file_link", None), "Target", None) or f"external[{i}]"
+        books[i] = os.path.basename(target.replace("\\", "/")) or target
+    return books
+
+
+def _defined_name_sheets(wb, by_name: Dict[str, str]) -> Dict[str, Set[str]]:
+    names = defaultdict(set)
+    scopes = [wb.defined_names] + [getattr(wb[s], "defined_names", None) or {} for s in wb.sheetnames]
+    for scope in scopes:
+        for name, definition in scope.items():
+            try:
+                destinations = list(definition.destinations)
+            except Exception:
+                continue  # constants / formulas, not ranges
+            for sheet, _ in destinations:
+                if sheet.casefold() in by_name:
+                    names[name.casefold()].add(by_name[sheet.casefold()])
+    return names
+
+
+def _table_sheets(archive, wb, by_name: Dict[str, str]) -> Dict[str, Set[str]]:
+    """Excel table name -> its sheet (read-only worksheets don't load tables)."""
+    tables = {}
+    for sheet_name in wb.sheetnames:
+        path = getattr(wb[sheet_name], "_worksheet_path", None)
+        if path is None:
+            continue
+        folder, _, part = path.rpartition("/")
+        try:
+            rels = archive.read(f"{folder}/_rels/{part}.rels")
+        except KeyError:
+            continue
+        for target in re.findall(rb'Target="([^"]*tables/[^"]+)"', rels):
+            target = target.decode()
+            # Absolute ("/xl/tables/table1.xml") or relative to the sheet part
+            table_path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(f"{folder}/{target}")
+            try:
+                match = _TABLE_NAME.search(archive.read(table_path)[:2048])
+            except KeyError:
+                continue
+            if match:
+                tables[html.unescape(match.group(1).decode()).casefold()] = {sheet_name}
+    return tables
+
+
+def _flow_order(sheet_names: List[str], edges: Counter) -> Tuple[List[str], List[str]]:
+    """
+    Topological order of the sheets in the graph (data sources first, ties in
+    workbook order), and the sheets left over because they sit on a cycle.
+    """
+    nodes = list(dict.fromkeys([s for s, _ in edges] + [t for _, t in edges]))
+    position = {name: i for i, name in enumerate(sheet_names)}
+    nodes.sort(key=lambda n: (n not in position, position.get(n, 0), n))
+    incoming = {n: 0 for n in nodes}
+    outgoing = defaultdict(list)
+    for source, target in edges:
+        incoming[target] += 1
+        outgoing[source].append(target)
+
+    order = []
+    ready = [n for n in nodes if not incoming[n]]
+    while ready:
+        node = ready.pop(0)
+        order.append(node)
+        for target in outgoing[node]:
+            incoming[target] -= 1
+            if not incoming[target]:
+                ready.append(target)
+        ready.sort(key=nodes.index)
+    done = set(order)
+    return order, [n for n in nodes if n not in done]
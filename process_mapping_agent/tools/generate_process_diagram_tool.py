@@ -1,32 +1,53 @@
-from graphviz import Digraph
 import os
-from typing import List, Dict, Any
+import threading
+import time
+from graphviz import Digraph
+from typing import List, Dict, Any, Tuple
 
-# NOTE: We use 'list' in the signature to satisfy the API Schema requirements.
-# The internal code still handles Dicts safely.
-def generate_process_diagram_tool(process_data: List[Dict[str, Any]]) -> str:
-    """
-    Generates a Graphviz PNG from the process_map list.
-    Returns the absolute file path.
-    """
-    # 1. Normalize Data
-    steps = []
-    
+from cache_store import LRUCache
+from process_mapping_agent.tools.builtin_diagram_renderer import (
+    can_render_builtin, layout_node, layout_process_map, place_nodes, render_from_layout
+)
+from process_mapping_agent.tools.diagram_cache import diagram_cache, diagram_cache_key
+from process_mapping_agent.tools.diagram_render_service import render_service
+from process_mapping_agent.tools.diagram_store import put_diagram
+from process_mapping_agent.tools.process_map_diff import diff_process_maps
+
+# Everything besides the steps that changes the output. Part of the render
+# cache key (together with the renderer used): change the styling below or
+# in builtin_diagram_renderer -> bump "style".
+RENDER_OPTIONS = {"rankdir": "TB", "style": 1}
+
+# "auto": in-process renderer for short linear flows, Graphviz for the rest.
+# "builtin" / "graphviz" force one of them.
+DIAGRAM_RENDERER = os.environ.get("DIAGRAM_RENDERER", "auto").lower()
+
+# Built-in diagram models (node sizes/positions) of recent renders, so a
+# feedback edit can patch the previous model instead of laying out again.
+LAYOUTS = LRUCache(max_entries=int(os.environ.get("DIAGRAM_LAYOUT_ENTRIES", "64")))
+_layout_counts = {"full_layouts": 0, "patched_layouts": 0}
+# Renders run in asyncio.to_thread workers and the batch path at once
+_layout_counts_lock = threading.Lock()
+
+
+def _normalize_steps(process_data: Any) -> List[Any]:
     # Even though type hint says list, Python allows Dicts to pass at runtime.
     if isinstance(process_data, dict):
         steps = process_data.get("process_map", [])
         if not steps and "workbooks" in process_data:
-             return "Error: Received old 'workbooks' format. Expected 'process_map' list."
-             
-    elif isinstance(process_data, list):
-        steps = process_data
-    
-    if not steps:
-        return "Error: No process steps found to visualize."
+            raise ValueError("Received old 'workbooks' format. Expected 'process_map' list.")
+        return steps
+
+    if isinstance(process_data, list):
+        return process_data
+
+    return []
 
+
+def build_process_digraph(steps: List[Any]) -> Digraph:
     # 2. Initialize Graphviz
-    dot = Digraph(comment="Process Flow", format="png")
-    dot.attr(rankdir="TB") 
+    dot = Digraph(comment="Process Flow")
+    dot.attr(rankdir=RENDER_OPTIONS["rankdir"])
     dot.attr('node', shape='box', style='filled', fillcolor='lightblue')
 
     # 3. Create Nodes
@@ -40,7 +61,7 @@ def generate_process_diagram_tool(process_data: List[Dict[str, Any]]) -> str:
             step_name = step.get("step_name", f"Step {i+1}")
             role = step.get("role", "Unknown Role")
             is_decision = step.get("decision_point", False)
-        
+
         # Styling
         if is_decision:
             shape = "diamond"
@@ -48,7 +69,7 @@ def generate_process_diagram_tool(process_data: List[Dict[str, Any]]) -> str:
         else:
             shape = "box"
             color = "lightblue"
-            
+
         label = f"<{step_name}<BR/><FONT POINT-SIZE='10' COLOR='gray'>{role}</FONT>>"
         dot.node(str(i), label=label, shape=shape, fillcolor=color)
 
@@ -56,10 +77,179 @@ def generate_process_diagram_tool(process_data: List[Dict[str, Any]]) -> str:
     for i in range(len(steps) - 1):
         dot.edge(str(i), str(i+1))
 
-    # 5. Render
-    output_path = "process_map"
+    return dot
+
+
+def choose_renderer(steps: List[Any], fmt: str) -> str:
+    if DIAGRAM_RENDERER == "graphviz":
+        return "graphviz"
+    if DIAGRAM_RENDERER == "builtin" or can_render_builtin(steps, fmt):
+        return "builtin"
+    return "graphviz"
+
+
+def _layout_key(steps: List[Any]) -> str:
+    return diagram_cache_key(steps, "layout", {**RENDER_OPTIONS, "renderer": "builtin"})
+
+
+def _full_layout(steps: List[Any]) -> Dict[str, Any]:
+    model = layout_process_map(steps)
+    LAYOUTS.put(_layout_key(steps), model)
+    with _layout_counts_lock:
+        _layout_counts["full_layouts"] += 1
+    return model
+
+
+def _render_uncached(steps: List[Any], fmt: str, renderer: str) -> bytes:
+    if renderer == "builtin":
+        return render_from_layout(_full_layout(steps), fmt)
+    return render_service.render(build_process_digraph(steps).source, fmt)
+
+
+def render_process_diagram(process_data: Any, fmt: str = "png") -> bytes:
+    """
+    Renders the process map to PNG/SVG bytes entirely in memory, so nothing
+    is written to the working directory.
+    Unchanged maps come from the render cache; short linear flows are drawn
+    in-process, the rest go through the bounded Graphviz worker pool.
+    Raises ValueError when there is nothing to draw.
+    """
+    # 1. Normalize Data
+    steps = _normalize_steps(process_data)
+    if not steps:
+        raise ValueError("No process steps found to visualize.")
+
+    renderer = choose_renderer(steps, fmt)
+    key = diagram_cache_key(steps, fmt, {**RENDER_OPTIONS, "renderer": renderer})
+    return diagram_cache.get_or_render(key, lambda: _render_uncached(steps, fmt, renderer))
+
+
+def render_process_diagram_update(previous_data: Any, process_data: Any,
+                                  fmt: str = "png") -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Renders an edited process map, reusing the previous render where it can.
+    Returns (bytes, diff) with diff from diff_process_maps.
+
+    When the edit isn't structural (same steps in the same order) and the
+    previous diagram model is still cached, only the changed nodes are
+    re-measured and the column re-placed; otherwise a full layout.
+    Graphviz-rendered maps are simply rendered again (through the cache).
+    """
+    previous_steps = _normalize_steps(previous_data)
+    steps = _normalize_steps(process_data)
+    if not steps:
+        raise ValueError("No process steps found to visualize.")
+
+    diff = diff_process_maps(previous_steps, steps)
+    renderer = choose_renderer(steps, fmt)
+    if renderer != "builtin":
+        return render_process_diagram(steps, fmt), diff
+
+    def _render_patched() -> bytes:
+        previous_model = LAYOUTS.get(_layout_key(previous_steps)) if previous_steps else None
+        if previous_model is None or diff["structural"]:
+            return render_from_layout(_full_layout(steps), fmt)
+
+        # Copies: the cached model belongs to the previous render
+        nodes = [dict(node) for node in previous_model["nodes"]]
+        for j in diff["redraw_nodes"]:
+            nodes[j] = layout_node(j, steps[j])
+        model = place_nodes(nodes)
+        LAYOUTS.put(_layout_key(steps), model)
+        with _layout_counts_lock:
+            _layout_counts["patched_layouts"] += 1
+        return render_from_layout(model, fmt)
+
+    key = diagram_cache_key(steps, fmt, {**RENDER_OPTIONS, "renderer": renderer})
+    return diagram_cache.get_or_render(key, _render_patched), diff
+
+
+def get_layout_stats() -> Dict[str, Any]:
+    with _layout_counts_lock:
+        counts = dict(_layout_counts)
+    return {**counts, "cached_models": LAYOUTS.stats()}
+
+
+def render_process_diagrams_batch(process_maps: List[Any], fmt: str = "png") -> Dict[str, Any]:
+    """
+    Renders many process maps in one call (e.g. an eval sweep).
+    Cached maps are served straight away; the rest are queued on the worker
+    pool together, waiting for queue space instead of being rejected.
+    Maps the built-in renderer can draw are rendered inline.
+    Returns {"results": [bytes | Exception, ...] (input order), "stats": {...}}.
+    """
+    start = time.perf_counter()
+    results: List[Any] = [None] * len(process_maps)
+    futures = {}
+    cached = 0
+    rendered = 0
+
+    for i, process_data in enumerate(process_maps):
+        try:
+            steps = _normalize_steps(process_data) if not isinstance(process_data, str) else []
+            if not steps:
+                raise ValueError("No process steps found to visualize.")
+        except ValueError as e:
+            results[i] = e
+            continue
+
+        renderer = choose_renderer(steps, fmt)
+        key = diagram_cache_key(steps, fmt, {**RENDER_OPTIONS, "renderer": renderer})
+        data = diagram_cache.get(key)
+        if data is not None:
+            results[i] = data
+            cached += 1
+            continue
+
+        if renderer == "builtin":
+            try:
+                render_start = time.perf_counter()
+                results[i] = render_from_layout(_full_layout(steps), fmt)
+                diagram_cache.put(key, results[i], render_seconds=time.perf_counter() - render_start)
+            except Exception as e:
+                results[i] = e
+            rendered += 1
+            continue
+
+        source = build_process_digraph(steps).source
+        futures[i] = (key, render_service.submit(source, fmt, wait=None), time.perf_counter())
+
+    for i, (key, future, submitted) in futures.items():
+        try:
+            results[i] = future.result()
+            # Submit to result, so this includes the wait in the pool queue
+            diagram_cache.put(key, results[i], render_seconds=time.perf_counter() - submitted)
+        except Exception as e:
+            results[i] = e
+
+    elapsed = time.perf_counter() - start
+    errors = sum(isinstance(r, Exception) for r in results)
+    return {
+        "results": results,
+        "stats": {
+            "diagrams": len(process_maps),
+            "rendered": rendered + len(futures),
+            "cached": cached,
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "diagrams_per_second": round(len(process_maps) / elapsed, 1) if elapsed else None,
+        }
+    }
+
+
+# NOTE: We use 'list' in the signature to satisfy the API Schema requirements.
+# The internal code still handles Dicts safely.
+def generate_process_diagram_tool(process_data: List[Dict[str, Any]]) -> str:
+    """
+    Generates a PNG flowchart from the process_map list.
+    Returns the diagram reference (e.g. "process_map_1a2b3c4d5e6f7a8b.png").
+    """
     try:
-        full_path = dot.render(output_path, cleanup=True)
-        return full_path
+        png_bytes = render_process_diagram(process_data, fmt="png")
+    except ValueError as e:
+        return f"Error: {str(e)}"
     except Exception as e:
-        return f"Error rendering Graphviz: {str(e)}"
\ No newline at end of file
+        return f"Error rendering Graphviz: {str(e)}"
+
+    # 5. Keep the bytes in the in-memory diagram store (keyed by content hash)
+    return put_diagram(png_bytes, "png")
@@ -0,0 +1,150 @@
+import os
+from collections import defaultdict
+from itertools import combinations
+from typing import Any, Dict, List
+
+from process_mapping_agent.tools.column_stats import MINHASH_BINS, minhash_jaccard
+
+# LSH banding over the MinHash signature: 16 bands of 4 bins. Two columns
+# become candidates when one band matches exactly, which happens with
+# probability 1 - (1 - J^4)^16: ~50% at J=0.5, >95% at J=0.7.
+LSH_BANDS = 16
+LSH_ROWS = MINHASH_BINS // LSH_BANDS
+
+# Columns with fewer distinct values than this (flags, currencies) overlap by
+# accident too often to say anything.
+MIN_DISTINCT = int(os.environ.get("JOIN_HINTS_MIN_DISTINCT", "3"))
+# distinct / non-null at or above this -> the column's values are unique (a key)
+UNIQUE_RATIO = 0.95
+DUPLICATE_JACCARD = 0.9
+# Containment is derived from the Jaccard estimate, which is coarse when a
+# small column sits inside a large one (J of a few %), hence the loose bar.
+CONTAINMENT_THRESHOLD = 0.7
+# Per hint kind, strongest first.
+MAX_HINTS = int(os.environ.get("JOIN_HINTS_MAX", "15"))
+
+
+class _Column:
+    __slots__ = ("ref", "sheet_key", "name", "signature", "distinct", "non_null", "dtype")
+
+    def __init__(self, ref, sheet_key, name, signature, distinct, non_null, dtype):
+        self.ref = ref
+        self.sheet_key = sheet_key
+        self.name = name
+        self.signature = signature
+        self.distinct = distinct
+        self.non_null = non_null
+        self.dtype = dtype
+
+    @property
+    def unique(self) -> bool:
+        return self.non_null > 0 and self.distinct / self.non_null >= UNIQUE_RATIO
+
+
+def _collect_columns(files: List[Dict[str, Any]]) -> List[_Column]:
+    several_files = len(files) > 1
+    columns = []
+    for f_index, file_info in enumerate(files):
+        for sheet in file_info.get("sheets", []):
+            signatures = sheet.get("_signatures") or {}
+            stats = sheet.get("column_stats") or {}
+            row_count = sheet.get("row_count") or 0
+            prefix = f"{file_info.get('file_name')}:" if several_files else ""
+            for name, signature in signatures.items():
+                s = stats.get(name) or {}
+                distinct = s.get("distinct_estimate") or 0
+                if distinct < MIN_DISTINCT:
+                    continue
+                columns.append(_Column(
+                    ref=f"{prefix}{sheet.get('sheet_name')}.{name}",
+                    sheet_key=(f_index, sheet.get("sheet_name")),
+                    name=" ".join(str(name).split()).casefold(),
+                    signature=signature,
+                    distinct=distinct,
+                    non_null=round(row_count * (1 - s.get("null_ratio", 0.0))),
+                    dtype=s.get("dtype"),
+                ))
+    return columns
+
+
+def candidate_pairs(columns: List[_Column]) -> set:
+    """
+    Column pairs (from different sheets) worth comparing: those sharing an
+    LSH bucket, plus same-named columns (catches a small lookup column
+    contained in a much larger one, whose Jaccard is too low for LSH).
+    No all-pairs comparison.
+    """
+    buckets = defaultdict(list)
+    by_name = defaultdict(list)
+    for i, column in enumerate(columns):
+        signature = column.signature
+        for band in range(LSH_BANDS):
+            rows = tuple(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])
+            if all(v is None for v in rows):
+                continue
+            buckets[(band, rows)].append(i)
+        by_name[column.name].append(i)
+
+    pairs = set()
+    for group in list(buckets.values()) + list(by_name.values()):
+        for i, j in combinations(group, 2):
+            if columns[i].sheet_key != columns[j].sheet_key:
+                pairs.add((min(i, j), max(i, j)))
+    return pairs
+
+
+def _containment(jaccard: float, a: _Column, b: _Column) -> float:
+    """Estimated share of a's distinct values that also occur in b."""
+    if jaccard <= 0 or not a.distinct:
+        return 0.0
+    intersection = jaccard * (a.distinct + b.distinct) / (1 + jaccard)
+    return min(intersection / a.distinct, 1.0)
+
+
+def find_cross_sheet_hints(files: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Likely relationships between columns of different sheets/files, from the
+    MinHash signatures the profiler attaches ("_signatures"):
+
+    - join_keys: a column whose values are (nearly) all found in a unique
+      column elsewhere -> foreign key -> key
+    - duplicate_columns: two columns holding (nearly) the same set of values
+    - containment: one column's values are a subset of another's, neither a key
+    """
+    columns = _collect_columns(files)
+    hints = {"join_keys": [], "duplicate_columns": [], "containment": []}
+
+    for i, j in candidate_pairs(columns):
+        a, b = columns[i], columns[j]
+        jaccard = minhash_jaccard(a.signature, b.signature)
+        # Make a the smaller side
+        if a.distinct > b.distinct:
+            a, b = b, a
+        contained = _containment(jaccard, a, b)
+
+        if b.unique and contained >= CONTAINMENT_THRESHOLD:
+            hints["join_keys"].append({
+                "from": a.ref, "to": b.ref,
+                "containment": round(contained, 2), "jaccard": round(jaccard, 2),
+            })
+        elif jaccard >= DUPLICATE_JACCARD:
+            hints["duplicate_columns"].append({
+                "columns": [a.ref, b.ref], "jaccard": round(jaccard, 2),
+            })
+        elif contained >= CONTAINMENT_THRESHOLD:
+            hints["containment"].append({
+                "subset": a.ref, "superset": b.ref,
+                "containment": round(contained, 2), "jaccard": round(jaccard, 2),
+            })
+
+    hints["join_keys"].sort(key=lambda h: (-h["containment"], -h["jaccard"], h["from"]))
+    hints["duplicate_columns"].sort(key=lambda h: (-h["jaccard"], h["columns"]))
+    hints["containment"].sort(key=lambda h: (-h["containment"], h["subset"]))
+    return {kind: found[:MAX_HINTS] for kind, found in hints.items()}
+
+
+def strip_signatures(files: List[Dict[str, Any]]):
+    """Removes the profiler's internal signatures before metadata leaves the tool."""
+    for file_info in files:
+        for sheet in file_info.get("sheets", []):
+            sheet.pop("_signatures", None)
@@ -0,0 +1,105 @@
+import copy
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Tuple
+
+from cache_store import DiskCache, LRUCache
+from process_mapping_agent.tools.formula_graph import FORMULA_GRAPH
+from process_mapping_agent.tools.workbook_profiler import PROFILER_VERSION, profile_workbooks
+
+# In-memory tier: parsed metadata is small, so a few dozen workbooks is plenty.
+MEMORY_ENTRIES = int(os.environ.get("METADATA_CACHE_ENTRIES", "32"))
+
+# Optional on-disk tier (directory of compressed JSON), off unless configured.
+CACHE_DIR = os.environ.get("METADATA_CACHE_DIR")
+CACHE_MAX_MB = int(os.environ.get("METADATA_CACHE_MAX_MB", "256"))
+
+
+class MetadataCache:
+    """
+    Content-addressed cache in front of the workbook profiler.
+
+    Keys are a hash of the file bytes plus the profiler version and options,
+    so re-uploading the same workbook (under any name) skips parsing, and
+    bumping PROFILER_VERSION invalidates everything.
+    """
+
+    def __init__(self, memory_entries: int = MEMORY_ENTRIES, cache_dir: str = CACHE_DIR,
+                 max_disk_bytes: int = CACHE_MAX_MB * 1024 * 1024):
+        self.memory = LRUCache(max_entries=memory_entries)
+        self.disk = DiskCache(cache_dir, max_disk_bytes) if cache_dir else None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(file_bytes: bytes, collect_stats: bool = True) -> str:
+        digest = hashlib.sha256(f"profiler-v{PROFILER_VERSION}:stats={collect_stats}:formulas={FORMULA_GRAPH}:".encode())
+        digest.update(file_bytes)
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        file_info = self.memory.get(key)
+        if file_info is None and self.disk is not None:
+            file_info = self.disk.get_json(key)
+            if file_info is not None:
+                self.memory.put(key, file_info)  # promote to the memory tier
+
+        if file_info is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return copy.deepcopy(file_info)
+
+    def put(self, key: str, file_info: Dict[str, Any]):
+        # Round-trip through JSON so both tiers hold exactly the same thing
+        file_info = json.loads(json.dumps(file_info, default=str))
+        self.memory.put(key, file_info)
+        if self.disk is not None:
+            self.disk.put_json(key, file_info)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
+
+
+metadata_cache = MetadataCache()
+
+
+def cached_profile_workbooks(named_files: List[Tuple[str, bytes]], collect_stats: bool = True) -> List[Dict[str, Any]]:
+    """
+    Drop-in for profile_workbooks(): cached files are served from the cache,
+    only the misses are parsed (still in parallel). Order is preserved.
+    """
+    results: List[Any] = [None] * len(named_files)
+    misses = []
+
+    for i, (name, data) in enumerate(named_files):
+        key = MetadataCache.key_for(data, collect_stats)
+        file_info = metadata_cache.get(key)
+        if file_info is not None:
+            print(f"Metadata cache hit for '{name}'")
+            # Same bytes may have been uploaded under a different name
+            file_info["file_name"] = name
+            results[i] = file_info
+        else:
+            misses.append((i, key, name, data))
+
+    profiled = profile_workbooks([(name, data) for _, _, name, data in misses], collect_stats)
+    for (i, key, _, _), file_info in zip(misses, profiled):
+        # Don't cache failures: a crashed worker may succeed next time
+        if "error" not in file_info:
+            metadata_cache.put(key, file_info)
+        results[i] = file_info
+
+    return results
+
+
+def get_metadata_cache_stats() -> Dict[str, Any]:
+    return metadata_cache.stats()
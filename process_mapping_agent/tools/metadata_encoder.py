@@ -0,0 +1,303 @@
+import json
+import math
+import os
+from collections import Counter
+from typing import Any, Dict, List
+
+# Approximate prompt budget for the encoded metadata (whole tool response).
+METADATA_TOKEN_BUDGET = int(os.environ.get("METADATA_TOKEN_BUDGET", "4000"))
+# Longest cell value kept in sample rows / min / max (longer ones get "…").
+MAX_CELL_CHARS = int(os.environ.get("METADATA_MAX_CELL_CHARS", "24"))
+
+# Column names shorter than this aren't worth an alias.
+ALIAS_MIN_LENGTH = 4
+
+_DTYPE_CODES = {
+    "integer": "int", "float": "num", "string": "str", "datetime": "date",
+    "boolean": "bool", "mixed": "mix", "empty": "-",
+}
+
+ENCODING_NAME = "compact-v1"
+
+# Explains the format to the model; kept short, it is part of every response.
+FORMAT_NOTE = (
+    "Format: '## file' then '### sheet <name> rows=<n> cols=<n>'. "
+    "'cols:' lists columns in order; '$k' aliases are defined in 'aliases:' "
+    "(columns shared by several sheets -> likely join keys). "
+    "'stats:' rows are column|type|null%|distinct|min|max over the whole sheet. "
+    "'sample:' rows are the first data rows, values in column order, '…' = truncated, "
+    "'~' = empty. '(+N more)' means columns/sheets were left out to fit the budget. "
+    "'hints:' are estimated relationships between columns of different sheets/files. "
+    "'flow:' is formula lineage: 'A -> B (n)' = n formula cells in sheet B read sheet A; "
+    "'order:' lists those sheets sources first."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English/JSON)."""
+    return math.ceil(len(text) / 4)
+
+
+def _cell(value: Any) -> str:
+    if value is None or value == "":
+        return "~"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    text = str(value)
+    if text.endswith("T00:00:00"):
+        text = text[:-9]  # dates without a time part
+    text = " ".join(text.split()).replace("|", "/")
+    if len(text) > MAX_CELL_CHARS:
+        text = text[:MAX_CELL_CHARS - 1] + "…"
+    return text
+
+
+def build_aliases(files: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Columns appearing in 2+ sheets get a short "$k" alias (most shared first)."""
+    counts = Counter()
+    for file_info in files:
+        for sheet in file_info.get("sheets", []):
+            # dict.fromkeys, not a set: ties keep first-seen order in every process
+            counts.update(list(dict.fromkeys(str(c) for c in sheet.get("columns", []))))
+    shared = [c for c, n in counts.most_common() if n > 1 and len(c) >= ALIAS_MIN_LENGTH]
+    return {column: f"${i + 1}" for i, column in enumerate(shared)}
+
+
+def _rank_columns(sheet: Dict[str, Any], aliases: Dict[str, str]) -> List[int]:
+    """Column positions, most useful first: shared (join keys), then populated, then left to right."""
+    stats = sheet.get("column_stats") or {}
+    columns = [str(c) for c in sheet.get("columns", [])]
+
+    def key(i):
+        null_ratio = (stats.get(columns[i]) or {}).get("null_ratio", 0.0)
+        return (columns[i] not in aliases, null_ratio, i)
+
+    return sorted(range(len(columns)), key=key)
+
+
+def _sheet_priority(sheet: Dict[str, Any], aliases: Dict[str, str]) -> float:
+    shared = sum(1 for c in sheet.get("columns", []) if str(c) in aliases)
+    rows = sheet.get("row_count") or len(sheet.get("sample_rows", []))
+    return 2 * shared + math.log10(rows + 1) + min(len(sheet.get("columns", [])), 20) / 10
+
+
+class _SheetBlock:
+    """The encodable parts of one sheet, from cheapest to richest."""
+
+    def __init__(self, file_index: int, sheet: Dict[str, Any], aliases: Dict[str, str]):
+        self.file_index = file_index
+        self.sheet = sheet
+        self.aliases = aliases
+        self.columns = [str(c) for c in sheet.get("columns", [])]
+        self.ranked = _rank_columns(sheet, aliases)
+        self.keep = len(self.columns)   # how many ranked columns are shown
+        self.with_stats = False
+        self.with_sample = False
+        self.dropped = False
+        self.chars = 0   # rendered size, kept up to date by encode_files_metadata
+
+    def _kept(self) -> List[int]:
+        return sorted(self.ranked[:self.keep])
+
+    def _name(self, column: str) -> str:
+        return self.aliases.get(column, column)
+
+    def used_aliases(self) -> List[str]:
+        """Aliases of the columns shown (what the "aliases:" legend has to define)."""
+        if self.sheet.get("error"):
+            return []
+        return [self.aliases[self.columns[i]] for i in self._kept() if self.columns[i] in self.aliases]
+
+    def render(self) -> str:
+        sheet = self.sheet
+        rows = sheet.get("row_count", len(sheet.get("sample_rows", [])))
+        lines = [f"### sheet {sheet.get('sheet_name')} rows={rows} cols={len(self.columns)}"]
+        if sheet.get("error"):
+            lines.append(f"error: {sheet['error']}")
+            return "\n".join(lines)
+
+        kept = self._kept()
+        omitted = len(self.columns) - len(kept)
+        names = ", ".join(self._name(self.columns[i]) for i in kept)
+        lines.append(f"cols: {names}" + (f" (+{omitted} more)" if omitted else ""))
+
+        stats = sheet.get("column_stats") or {}
+        if self.with_stats and stats:
+            lines.append("stats:")
+            for i in kept:
+                s = stats.get(self.columns[i])
+                if not s:
+                    continue
+                lines.append("|".join([
+                    self._name(self.columns[i]),
+                    _DTYPE_CODES.get(s.get("dtype"), str(s.get("dtype"))),
+                    f"{round(100 * s.get('null_ratio', 0))}",
+                    str(s.get("distinct_estimate", "")),
+                    _cell(s.get("min")) if "min" in s else "",
+                    _cell(s.get("max")) if "max" in s else "",
+                ]))
+
+        if self.with_sample and sheet.get("sample_rows"):
+            lines.append("sample:")
+            for row in sheet["sample_rows"]:
+                lines.append("|".join(_cell(row.get(self.columns[i])) for i in kept))
+        return "\n".join(lines)
+
+
+def render_hints(hints: Dict[str, List[Dict[str, Any]]]) -> List[str]:
+    lines = []
+    for h in hints.get("join_keys", []):
+        lines.append(f"join key: {h['from']} -> {h['to']} ({round(100 * h['containment'])}% of values found)")
+    for h in hints.get("duplicate_columns", []):
+        lines.append(f"duplicate: {h['columns'][0]} = {h['columns'][1]} ({round(100 * h['jaccard'])}% same values)")
+    for h in hints.get("containment", []):
+        lines.append(f"subset: {h['subset']} within {h['superset']} ({round(100 * h['containment'])}%)")
+    return ["hints:"] + lines if lines else []
+
+
+def render_formula_graph(graph: Dict[str, Any]) -> List[str]:
+    if not graph:
+        return []
+    if graph.get("error"):
+        return [f"formulas: {graph['error']}"]
+    if not graph.get("formula_cells"):
+        return ["formulas: none"]
+    per_sheet = ", ".join(f"{sheet} {cells}" for sheet, cells in graph.get("sheets", {}).items())
+    lines = [f"formulas: {graph['formula_cells']} cells ({per_sheet})"]
+    edges = graph.get("edges", [])
+    if edges:
+        lines.append("flow: " + ", ".join(f"{e['from']} -> {e['to']} ({e['cells']})" for e in edges))
+        lines.append("order: " + " > ".join(graph.get("order", [])))
+    if graph.get("cyclic"):
+        lines.append("cyclic: " + ", ".join(graph["cyclic"]))
+    return lines
+
+
+def encode_files_metadata(files_metadata: Dict[str, Any], token_budget: int = METADATA_TOKEN_BUDGET) -> str:
+    """
+    Compact text form of build_files_metadata's {"files": [...]} for the
+    Understanding Agent. Fits token_budget (estimate_tokens) by ranking:
+
+    1. every sheet's header and column list (widest sheets lose their least
+       useful columns first; whole sheets are dropped only as a last resort)
+    2. per-column stats, by sheet priority (shared columns, size)
+    3. sample rows, in the same order
+
+    The format note, cross-sheet hints, file headers and formula lineage are
+    always included, as is the list of left-out sheets. A budget below what
+    those alone take is clamped to that size.
+    """
+    files = files_metadata.get("files", [])
+    aliases = build_aliases(files)
+
+    blocks: List[_SheetBlock] = []
+    for f_index, file_info in enumerate(files):
+        for sheet in file_info.get("sheets", []):
+            blocks.append(_SheetBlock(f_index, sheet, aliases))
+    by_priority = sorted(blocks, key=lambda b: -_sheet_priority(b.sheet, aliases))
+    hint_lines = render_hints(files_metadata.get("cross_sheet_hints") or {})
+
+    # Parts that are always there, rendered once
+    file_lines: List[List[str]] = []
+    for file_info in files:
+        lines = [f"## file {file_info.get('file_name')}"]
+        if file_info.get("error"):
+            lines.append(f"error: {file_info['error']}")
+        lines.extend(render_formula_graph(file_info.get("formula_graph")))
+        file_lines.append(lines)
+
+    def skipped_line(f_index: int) -> List[str]:
+        skipped = [str(b.sheet.get("sheet_name")) for b in blocks if b.file_index == f_index and b.dropped]
+        return [f"(+{len(skipped)} more sheets: {', '.join(skipped)})"] if skipped else []
+
+    def legend_line() -> List[str]:
+        legend = [f"{alias}={column}" for column, alias in aliases.items() if alias_uses[alias]]
+        return ["aliases: " + ", ".join(legend)] if legend else []
+
+    def size(lines: List[str]) -> int:
+        return sum(len(line) + 1 for line in lines)  # each line plus its "\n"
+
+    # Running size of the document in characters: every check is O(1)
+    # instead of a render of the whole thing
+    fixed_chars = size([FORMAT_NOTE] + hint_lines) + sum(size(lines) for lines in file_lines)
+    alias_uses: Counter = Counter()
+    for block in blocks:
+        block.chars = len(block.render()) + 1
+        alias_uses.update(block.used_aliases())
+    state = {
+        "blocks": sum(b.chars for b in blocks),
+        "legend": size(legend_line()),
+        "skipped": [0] * len(files),
+    }
+
+    def tokens() -> int:
+        chars = fixed_chars + state["blocks"] + state["legend"] + sum(state["skipped"]) - 1
+        return math.ceil(max(chars, 0) / 4)
+
+    def change(block: _SheetBlock, **attributes):
+        """Sets block attributes and updates the running size by that block only."""
+        aliases_before = block.used_aliases() if not block.dropped else []
+        state["blocks"] -= block.chars if not block.dropped else 0
+        for name, value in attributes.items():
+            setattr(block, name, value)
+        if block.dropped:
+            block.chars = 0
+            state["skipped"][block.file_index] = size(skipped_line(block.file_index))
+        else:
+            block.chars = len(block.render()) + 1
+            state["blocks"] += block.chars
+        aliases_after = block.used_aliases() if not block.dropped else []
+        if aliases_before != aliases_after:
+            alias_uses.subtract(aliases_before)
+            alias_uses.update(aliases_after)
+            state["legend"] = size(legend_line())
+
+    # The smallest possible output: no sheets, every one listed as left out
+    floor_chars = fixed_chars - 1
+    for f_index in range(len(files)):
+        names = [str(b.sheet.get("sheet_name")) for b in blocks if b.file_index == f_index]
+        if names:
+            floor_chars += size([f"(+{len(names)} more sheets: {', '.join(names)})"])
+    budget = max(token_budget, math.ceil(max(floor_chars, 0) / 4))
+
+    # 1. Headers + columns; trim the widest sheets until it fits
+    while tokens() > budget:
+        widest = max((b for b in blocks if not b.dropped), key=lambda b: b.keep, default=None)
+        if widest is None:
+            break
+        if widest.keep > 8:
+            change(widest, keep=max(8, widest.keep * 3 // 4))
+        else:
+            # Column lists are as short as they go: drop the lowest-priority sheet
+            change(next(b for b in reversed(by_priority) if not b.dropped), dropped=True)
+
+    # 2./3. Spend what's left on stats, then samples
+    for attribute in ("with_stats", "with_sample"):
+        for block in by_priority:
+            if block.dropped:
+                continue
+            change(block, **{attribute: True})
+            if tokens() > budget:
+                change(block, **{attribute: False})
+
+    parts = [FORMAT_NOTE] + legend_line() + hint_lines
+    for f_index in range(len(files)):
+        parts.extend(file_lines[f_index])
+        parts.extend(b.render() for b in blocks if b.file_index == f_index and not b.dropped)
+        parts.extend(skipped_line(f_index))
+    return "\n".join(parts)
+
+
+def encoding_report(files_metadata: Dict[str, Any], token_budget: int = METADATA_TOKEN_BUDGET) -> Dict[str, Any]:
+    """Tokens of the JSON the tool used to return vs the compact encoding."""
+    verbose = json.dumps({"files_metadata": files_metadata})
+    compact = encode_files_metadata(files_metadata, token_budget)
+    before, after = estimate_tokens(verbose), estimate_tokens(compact)
+    return {
+        "json_tokens": before,
+        "compact_tokens": after,
+        "tokens_saved": before - after,
+        "saved_ratio": round(1 - after / before, 3) if before else 0.0,
+    }
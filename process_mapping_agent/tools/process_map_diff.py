@@ -0,0 +1,193 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+# Fields compared between matched steps. step_number is left out on purpose:
+# inserting one step renumbers everything after it.
+COMPARED_FIELDS = ["step_name", "role", "description", "decision_point", "condition"]
+# The subset that changes the picture (see build_process_digraph).
+DRAWN_FIELDS = {"step_name", "role", "decision_point"}
+
+_DEFAULTS = {"role": "Unknown Role", "description": "", "decision_point": False, "condition": None}
+
+
+def _as_dict(step: Any) -> Dict[str, Any]:
+    if isinstance(step, str):
+        return {"step_name": step}
+    if hasattr(step, "model_dump"):
+        return step.model_dump()
+    return dict(step)
+
+
+def _field(step: Dict[str, Any], i: int, name: str) -> Any:
+    if name == "step_name":
+        return str(step.get("step_name", f"Step {i+1}"))
+    value = step.get(name, _DEFAULTS[name])
+    return _DEFAULTS[name] if value is None and name != "condition" else value
+
+
+def _name_key(step: Dict[str, Any], i: int) -> str:
+    return " ".join(_field(step, i, "step_name").split()).casefold()
+
+
+def match_steps(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Dict[int, int]:
+    """
+    Pairs old step positions with new ones by stable identity:
+    1. step_id, when both sides carry one
+    2. the step name (case/whitespace-insensitive), in order for duplicates
+    3. what's left: same position between matched steps -> an edited step
+    Returns {old_index: new_index}; unpaired steps were removed / added.
+    """
+    matched: Dict[int, int] = {}
+    used_new = set()
+
+    def pair(key_func):
+        waiting: Dict[Any, List[int]] = {}
+        for j, step in enumerate(new):
+            key = key_func(step, j)
+            if j not in used_new and key is not None:
+                waiting.setdefault(key, []).append(j)
+        for i, step in enumerate(old):
+            key = key_func(step, i)
+            if i in matched or key is None or not waiting.get(key):
+                continue
+            j = waiting[key].pop(0)
+            matched[i] = j
+            used_new.add(j)
+
+    pair(lambda step, i: step.get("step_id"))
+    pair(_name_key)
+    # Whatever is left is paired by position inside the gaps between matched
+    # steps, when both sides have the same number of steps there. So a renamed
+    # step next to an inserted one isn't mistaken for the insertion.
+    anchors = sorted(matched.items()) + [(len(old), len(new))]
+    last_i, last_j = -1, -1
+    for i_anchor, j_anchor in anchors:
+        if j_anchor < last_j:
+            continue  # a moved step, not a usable anchor
+        gap_old = [i for i in range(last_i + 1, i_anchor) if i not in matched]
+        gap_new = [j for j in range(last_j + 1, j_anchor) if j not in used_new]
+        if len(gap_old) == len(gap_new):
+            for i, j in zip(gap_old, gap_new):
+                matched[i] = j
+                used_new.add(j)
+        last_i, last_j = i_anchor, j_anchor
+    return matched
+
+
+def _stable_order(matched: Dict[int, int]) -> set:
+    """Old indices that kept their relative order (longest increasing run of new indices)."""
+    pairs = sorted(matched.items())
+    tails: List[int] = []
+    tail_pairs: List[int] = []
+    previous: Dict[int, Optional[int]] = {}
+    for k, (_, j) in enumerate(pairs):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tails[mid] < j:
+                lo = mid + 1
+            else:
+                hi = mid
+        previous[k] = tail_pairs[lo - 1] if lo else None
+        if lo == len(tails):
+            tails.append(j)
+            tail_pairs.append(k)
+        else:
+            tails[lo] = j
+            tail_pairs[lo] = k
+
+    keep = set()
+    k = tail_pairs[-1] if tail_pairs else None
+    while k is not None:
+        keep.add(pairs[k][0])
+        k = previous[k]
+    return keep
+
+
+def diff_process_maps(previous: List[Any], updated: List[Any]) -> Dict[str, Any]:
+    """
+    Structured difference between two process_map step lists.
+    Positions are 0-based indices into the respective list.
+
+    "structural" is True when steps were added, removed or reordered (the
+    edges change); otherwise only "redraw_nodes" need drawing again.
+    """
+    old = [_as_dict(s) for s in previous or []]
+    new = [_as_dict(s) for s in updated or []]
+    matched = match_steps(old, new)
+    in_order = _stable_order(matched)
+
+    added = [
+        {"index": j, "step_name": _field(new[j], j, "step_name")}
+        for j in range(len(new)) if j not in matched.values()
+    ]
+    removed = [
+        {"index": i, "step_name": _field(old[i], i, "step_name")}
+        for i in range(len(old)) if i not in matched
+    ]
+
+    moved, modified, redraw_nodes = [], [], []
+    for i, j in sorted(matched.items(), key=lambda pair: pair[1]):
+        if i not in in_order:
+            moved.append({"step_name": _field(new[j], j, "step_name"), "from": i, "to": j})
+
+        changes = {}
+        for name in COMPARED_FIELDS:
+            before, after = _field(old[i], i, name), _field(new[j], j, name)
+            if before != after:
+                changes[name] = [before, after]
+        if changes:
+            modified.append({"index": j, "step_name": _field(new[j], j, "step_name"), "changes": changes})
+            if DRAWN_FIELDS & changes.keys():
+                redraw_nodes.append(j)
+
+    # Edges of a linear flow join consecutive steps; compare them by identity
+    old_to_new = dict(matched)
+    old_edges = {(old_to_new.get(i), old_to_new.get(i + 1)) for i in range(len(old) - 1)}
+    new_edges = {(j, j + 1) for j in range(len(new) - 1)}
+    edges_added = sorted(e for e in new_edges if e not in old_edges)
+    edges_removed = sorted(
+        (i, i + 1) for i in range(len(old) - 1)
+        if (old_to_new.get(i), old_to_new.get(i + 1)) not in new_edges
+    )
+
+    structural = bool(added or removed or moved)
+    return {
+        "added": added,
+        "removed": removed,
+        "moved": moved,
+        "modified": modified,
+        "edges_added": [list(e) for e in edges_added],
+        "edges_removed": [list(e) for e in edges_removed],
+        "redraw_nodes": redraw_nodes,
+        "structural": structural,
+        "has_changes": structural or bool(modified),
+    }
+
+
+def _describe_change(name: str, change: Tuple[Any, Any]) -> str:
+    before, after = change
+    if name == "decision_point":
+        return "now a decision point" if after else "no longer a decision point"
+    if name == "description":
+        return "description updated"
+    if name == "condition":
+        return f"condition set to '{after}'" if after else "condition removed"
+    return f"{name.replace('step_', '')} '{before}' -> '{after}'"
+
+
+def summarize_changes(diff: Dict[str, Any]) -> str:
+    """One-line, human-readable version of diff_process_maps (replaces the LLM's changes_made)."""
+    if not diff.get("has_changes"):
+        return "none"
+
+    parts = []
+    for step in diff["added"]:
+        parts.append(f"Added step {step['index'] + 1} '{step['step_name']}'")
+    for step in diff["removed"]:
+        parts.append(f"Removed step '{step['step_name']}'")
+    for step in diff["moved"]:
+        parts.append(f"Moved '{step['step_name']}' from step {step['from'] + 1} to {step['to'] + 1}")
+    for step in diff["modified"]:
+        details = ", ".join(_describe_change(name, change) for name, change in step["changes"].items())
+        parts.append(f"Step {step['index'] + 1}: {details}")
+    return "; ".join(parts)
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from process_mapping_agent.schemas.feedback_schema import ProcessStep
+
+# Editable step fields (step_id / step_number are managed here).
+STEP_FIELDS = ["step_name", "role", "description", "decision_point", "condition"]
+OPS = {"insert", "update", "delete", "move"}
+
+_ID_NUMBER = re.compile(r"^s(\d+)$")
+
+
+def _as_dict(step: Any) -> Dict[str, Any]:
+    if isinstance(step, str):
+        return {"step_name": step}
+    if hasattr(step, "model_dump"):
+        return step.model_dump()
+    return dict(step)
+
+
+class _IdAllocator:
+    """Hands out "s<n>" ids that no step of the map uses yet."""
+
+    def __init__(self, steps: List[Dict[str, Any]]):
+        self.used = {step["step_id"] for step in steps if step.get("step_id")}
+        numbers = [int(m.group(1)) for m in map(_ID_NUMBER.match, self.used) if m]
+        self.next = max(numbers, default=0) + 1
+
+    def take(self, wanted: Optional[str] = None) -> str:
+        if wanted and wanted not in self.used:
+            step_id = wanted
+        else:
+            while f"s{self.next}" in self.used:
+                self.next += 1
+            step_id = f"s{self.next}"
+        self.used.add(step_id)
+        return step_id
+
+
+def assign_step_ids(process_map: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Copy of the map where every step has a stable step_id ("s1", "s2", ...)
+    and step_number matches its position. Existing ids are kept, so the
+    same map always gets the same ids.
+    """
+    steps = [_as_dict(step) for step in process_map or []]
+    ids = _IdAllocator([])
+    seen = set()
+    # Existing (unique) ids first, so a new step never takes one of them
+    for step in steps:
+        step_id = step.get("step_id")
+        if step_id and step_id not in seen:
+            seen.add(step_id)
+            ids.take(step_id)
+        else:
+            step["step_id"] = None
+    for i, step in enumerate(steps):
+        if not step["step_id"]:
+            step["step_id"] = ids.take()
+        step["step_number"] = i + 1
+    return steps
+
+
+def map_fingerprint(process_map: List[Any], recommended_tool: Optional[str] = None) -> str:
+    """Hash of the map (ids, order, fields) plus the tool: "is this the state the agent last saw?"."""
+    steps = [
+        {name: step.get(name) for name in ["step_id"] + STEP_FIELDS}
+        for step in map(_as_dict, process_map or [])
+    ]
+    canonical = json.dumps([steps, recommended_tool], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def compact_map(process_map: List[Any]) -> List[Dict[str, Any]]:
+    """The map as sent to the Feedback Agent: ids instead of numbers, default-valued fields left out."""
+    compact = []
+    for step in map(_as_dict, process_map or []):
+        entry = {"step_id": step.get("step_id"), "step_name": step.get("step_name")}
+        if step.get("role") not in (None, "Unknown Role"):
+            entry["role"] = step["role"]
+        if step.get("description"):
+            entry["description"] = step["description"]
+        if step.get("decision_point"):
+            entry["decision_point"] = True
+        if step.get("condition"):
+            entry["condition"] = step["condition"]
+        compact.append(entry)
+    return compact
+
+
+def _validated(step: Dict[str, Any]) -> Dict[str, Any]:
+    """One step through the ProcessStep schema (types, defaults); raises ValueError."""
+    try:
+        return ProcessStep(**step).model_dump()
+    except ValidationError as e:
+        raise ValueError(f"invalid step: {e.errors()[0].get('msg', e)}")
+
+
+def _changed_fields(fields: Any) -> Dict[str, Any]:
+    """The fields an op sets; null means "unchanged", "" clears the condition."""
+    fields = _as_dict(fields) if fields else {}
+    changed = {name: fields[name] for name in STEP_FIELDS if fields.get(name) is not None}
+    if changed.get("condition") == "":
+        changed["condition"] = None
+    return changed
+
+
+def apply_step_ops(process_map: List[Any], ops: List[Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Applies the Feedback Agent's step operations to a map, in order:
+      {"op": "insert", "step_id"?, "after_step_id", "fields"}  (after null -> first)
+      {"op": "update", "step_id", "fields"}                    (only changed fields)
+      {"op": "delete", "step_id"}
+      {"op": "move",   "step_id", "after_step_id"}
+    Every touched step is validated against ProcessStep. An op that can't be
+    applied (unknown id, invalid fields) is skipped and reported, the rest
+    still apply. Returns (new_map, applied, rejected); rejected ops carry an
+    "error", inserts that didn't get the id they asked for a "requested_step_id".
+    """
+    steps = assign_step_ids(process_map)
+    # New steps keep the id the agent gave them ("n1") when it's free, so
+    # later ops can refer to them
+    ids = _IdAllocator(steps)
+    applied, rejected = [], []
+
+    def position(step_id: Optional[str]) -> int:
+        for i, step in enumerate(steps):
+            if step["step_id"] == step_id:
+                return i
+        raise ValueError(f"unknown step_id '{step_id}'")
+
+    def insert_at(after_step_id: Optional[str]) -> int:
+        return position(after_step_id) + 1 if after_step_id else 0
+
+    for raw in ops or []:
+        op = _as_dict(raw)
+        kind = op.get("op")
+        try:
+            if kind not in OPS:
+                raise ValueError(f"unknown op '{kind}'")
+            if kind == "insert":
+                fields = _changed_fields(op.get("fields"))
+                if not fields.get("step_name"):
+                    raise ValueError("insert needs fields.step_name")
+                index = insert_at(op.get("after_step_id"))
+                step = _validated(fields)
+                step["step_id"] = ids.take(op.get("step_id"))
+                entry = {**op, "step_id": step["step_id"]}
+                if op.get("step_id") != step["step_id"]:
+                    # Taken or missing: the agent has to learn the real id
+                    entry["requested_step_id"] = op.get("step_id")
+                steps.insert(index, step)
+                applied.append(entry)
+            elif kind == "update":
+                i = position(op.get("step_id"))
+                fields = _changed_fields(op.get("fields"))
+                if not fields:
+                    raise ValueError("update without fields")
+                step = _validated({**steps[i], **fields})
+                step["step_id"] = steps[i]["step_id"]
+                steps[i] = step
+                applied.append(op)
+            elif kind == "delete":
+                del steps[position(op.get("step_id"))]
+                applied.append(op)
+            else:  # move
+                i = position(op.get("step_id"))
+                after = op.get("after_step_id")
+                if after and position(after) == i:
+                    raise ValueError("a step can't move after itself")
+                insert_at(after)  # check the target before taking the step out
+                step = steps.pop(i)
+                steps.insert(insert_at(after), step)
+                applied.append(op)
+        except ValueError as e:
+            rejected.append({**op, "error": str(e)})
+
+    for i, step in enumerate(steps):
+        step["step_number"] = i + 1
+    return steps, applied, rejected
@@ -0,0 +1,214 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from process_mapping_agent.schemas.product_selector_schema import ProductSelectorSchema
+
+# The closed list from the Product Selector prompt. Order doubles as the
+# tie-break priority when two tools end up with exactly the same score.
+ALLOWED_TOOLS = [
+    "Power Automate",
+    "AppSheet",
+    "JIRA",
+    "ServiceNow",
+    "Airtable",
+    "Google Sheets",
+    "Notion",
+    "Confluence",
+    "Asana",
+    "Trello",
+]
+
+# Keyword signals, matched as whole words/phrases (case-insensitive) against
+# step names, descriptions, conditions, roles, issues and opportunities.
+KEYWORDS = {
+    "automation": ["manual", "manually", "automate", "automated", "automation", "re-key", "rekey",
+                   "copy", "copies", "paste", "retype", "data entry", "email", "emails", "reminder",
+                   "reminders", "notification", "notify", "repetitive", "chase"],
+    "approval": ["approve", "approves", "approval", "approvals", "approved", "sign-off", "sign off",
+                 "signoff", "authorise", "authorize", "authorisation", "authorization", "review", "reviews"],
+    "tabular": ["excel", "spreadsheet", "spreadsheets", "workbook", "sheet", "sheets", "table",
+                "tables", "csv", "tracker", "log", "register", "list"],
+    # Not "excel": every process here comes from an Excel upload, so it says
+    # nothing about the environment (it is a "tabular" signal instead)
+    "microsoft": ["microsoft", "outlook", "teams", "sharepoint", "office 365", "o365",
+                  "onedrive", "dynamics"],
+    "google": ["google", "gmail", "google sheets", "google drive", "drive", "workspace", "g suite"],
+    "ticketing": ["ticket", "tickets", "incident", "incidents", "escalate", "escalation", "service desk",
+                  "helpdesk", "sla", "request", "requests"],
+    "tasks": ["task", "tasks", "assign", "assigned", "deadline", "deadlines", "due date", "kanban",
+              "backlog", "sprint"],
+    "documentation": ["document", "documentation", "policy", "procedure", "guideline", "wiki",
+                      "knowledge", "sop", "handbook"],
+}
+
+# One compiled alternation per feature (longest phrases first).
+_KEYWORD_PATTERNS = {
+    name: re.compile(
+        r"(?<!\w)(" + "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True)) + r")(?!\w)"
+    )
+    for name, words in KEYWORDS.items()
+}
+
+# feature -> {tool: weight}. The first six rows are the prompt's rules.
+RULES = {
+    "automation": {"Power Automate": 3.0, "AppSheet": 2.0},
+    "approval": {"Power Automate": 3.0, "JIRA": 2.0},
+    "tabular": {"AppSheet": 2.0, "Airtable": 2.0, "Google Sheets": 1.0},
+    "multi_department": {"JIRA": 3.0, "ServiceNow": 2.0},
+    "microsoft": {"Power Automate": 2.0},
+    "google": {"AppSheet": 2.0, "Google Sheets": 1.0},
+    "simple": {"Notion": 3.0, "Confluence": 2.0},
+    "ticketing": {"ServiceNow": 2.0, "JIRA": 1.0},
+    "tasks": {"Asana": 1.5, "Trello": 1.5},
+    "documentation": {"Confluence": 1.5, "Notion": 1.0},
+}
+
+FEATURE_LABELS = {
+    "automation": "manual work that can be automated",
+    "approval": "approval steps",
+    "tabular": "tabular/spreadsheet data",
+    "multi_department": "several departments or roles",
+    "microsoft": "a Microsoft environment",
+    "google": "a Google environment",
+    "simple": "a short, simple process",
+    "ticketing": "request/ticket handling",
+    "tasks": "task assignment and tracking",
+    "documentation": "documentation needs",
+}
+
+# Distinct roles at which a process counts as cross-department.
+MULTI_DEPARTMENT_ROLES = 3
+# Steps at or below which a process without decisions counts as "simple".
+SIMPLE_MAX_STEPS = 2
+
+_UNKNOWN_ROLES = {"", "unknown", "unknown role", "n/a", "none"}
+
+
+def _parse(understanding_json: Any) -> Optional[Dict[str, Any]]:
+    if isinstance(understanding_json, str):
+        text = re.sub(r"```(?:json)?", "", understanding_json).strip()
+        try:
+            understanding_json = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+    return understanding_json if isinstance(understanding_json, dict) else None
+
+
+def _keyword_hits(text: str, pattern: "re.Pattern") -> List[str]:
+    # Distinct matches, in order of first appearance
+    return list(dict.fromkeys(pattern.findall(text)))
+
+
+def extract_features(understanding_json: Dict[str, Any]) -> Dict[str, Any]:
+    """Counts and keyword signals from process_map, issues and opportunities."""
+    steps = [s for s in understanding_json.get("process_map") or [] if isinstance(s, dict)]
+    issues = [str(i) for i in understanding_json.get("issues") or []]
+    opportunities = [str(o) for o in understanding_json.get("opportunities") or []]
+
+    roles = {
+        str(s.get("role") or "").strip().casefold() for s in steps
+    } - _UNKNOWN_ROLES
+    decision_points = sum(1 for s in steps if s.get("decision_point"))
+
+    text = " ".join(
+        [" ".join(str(s.get(k) or "") for k in ("step_name", "description", "condition", "role")) for s in steps]
+        + issues + opportunities
+    ).casefold()
+    keywords = {name: _keyword_hits(text, pattern) for name, pattern in _KEYWORD_PATTERNS.items()}
+
+    flags = {name: bool(hits) for name, hits in keywords.items()}
+    # Decision points in a business flow are nearly always approve/reject gates
+    flags["approval"] = flags["approval"] or decision_points > 0
+    flags["multi_department"] = len(roles) >= MULTI_DEPARTMENT_ROLES
+    flags["simple"] = len(steps) <= SIMPLE_MAX_STEPS and decision_points == 0
+
+    return {
+        "step_count": len(steps),
+        "decision_points": decision_points,
+        "distinct_roles": len(roles),
+        "keywords": {name: hits for name, hits in keywords.items() if hits},
+        "flags": flags,
+    }
+
+
+def score_tools(features: Dict[str, Any]) -> List[Tuple[str, float, List[str]]]:
+    """[(tool, score, [features that scored it]), ...], best first."""
+    scores = {tool: 0.0 for tool in ALLOWED_TOOLS}
+    because = {tool: [] for tool in ALLOWED_TOOLS}
+    for feature, active in features["flags"].items():
+        if not active:
+            continue
+        for tool, weight in RULES.get(feature, {}).items():
+            scores[tool] += weight
+            because[tool].append(feature)
+
+    # Repeated signals (many manual steps, many approvals) strengthen the rule
+    scores["Power Automate"] += 0.25 * min(len(features["keywords"].get("automation", [])), 4)
+    scores["Power Automate"] += 0.25 * min(features["decision_points"], 4)
+    scores["JIRA"] += 0.25 * max(min(features["distinct_roles"] - MULTI_DEPARTMENT_ROLES + 1, 4), 0)
+
+    # No tool clearly fits -> the prompt's fallback (Microsoft unless Google)
+    if not any(scores.values()):
+        fallback = "AppSheet" if features["flags"]["google"] else "Power Automate"
+        scores[fallback] = 1.0
+        because[fallback].append("fallback")
+
+    priority = {tool: i for i, tool in enumerate(ALLOWED_TOOLS)}
+    ranked = sorted(ALLOWED_TOOLS, key=lambda tool: (-scores[tool], priority[tool]))
+    return [(tool, round(scores[tool], 2), because[tool]) for tool in ranked]
+
+
+def _reason(tool: str, because: List[str], features: Dict[str, Any]) -> str:
+    if because == ["fallback"]:
+        return f"No tool clearly fits this process, so {tool} is the default general-purpose choice."
+    signals = ", ".join(FEATURE_LABELS[f] for f in because if f in FEATURE_LABELS)
+    return (
+        f"{tool} scored highest for a {features['step_count']}-step process with "
+        f"{features['decision_points']} decision point(s) and {features['distinct_roles']} distinct role(s). "
+        f"Signals: {signals}."
+    )
+
+
+def select_products(understanding_json: Any) -> Optional[Dict[str, Any]]:
+    """
+    Rule-based Product Selector. Returns
+    {"result": ProductSelectorSchema dict, "ranking": [...], "tied": [tools], "features": {...}},
+    or None when the input can't be read (the caller falls back to the LLM).
+    "tied" lists the tools sharing the top score when there's more than one.
+    """
+    data = _parse(understanding_json)
+    if data is None:
+        return None
+
+    if not data.get("process_map"):
+        # The prompt's validation rule for missing input
+        result = {
+            "top_5_tools": [],
+            "recommended_tool": "null",
+            "reason_for_recommendation": "No process_map was provided, so no tool can be recommended.",
+        }
+        return {"result": result, "ranking": [], "tied": [], "features": None}
+
+    features = extract_features(data)
+    ranking = score_tools(features)
+    best_tool, best_score, best_because = ranking[0]
+    tied = [tool for tool, score, _ in ranking if score == best_score]
+
+    try:
+        result = ProductSelectorSchema(
+            top_5_tools=[tool for tool, _, _ in ranking[:5]],
+            recommended_tool=best_tool,
+            reason_for_recommendation=_reason(best_tool, best_because, features),
+        ).model_dump()
+    except ValidationError:
+        return None
+
+    return {
+        "result": result,
+        "ranking": [{"tool": tool, "score": score, "because": because} for tool, score, because in ranking],
+        "tied": tied if len(tied) > 1 else [],
+        "features": features,
+    }
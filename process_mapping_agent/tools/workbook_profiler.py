@@ -0,0 +1,352 @@
+import datetime
+import io
+import mmap
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from process_mapping_agent.tools.column_stats import ColumnStats
+from process_mapping_agent.tools.formula_graph import FORMULA_GRAPH, build_formula_graph
+
+# Bump whenever the shape or content of the profile changes: it is part of
+# the metadata cache key, so old cached profiles stop matching.
+PROFILER_VERSION = 4
+
+# Column kinds that can act as join keys; only these get a MinHash signature.
+SIGNATURE_DTYPES = {"integer", "string", "datetime", "mixed"}
+
+# The metadata only ever looked at the first few rows of each sheet
+# (pd.read_excel(..., nrows=5)) and kept 3 of them as samples.
+PREVIEW_ROWS = 5
+SAMPLE_ROWS = 3
+
+# Parsing is CPU-bound XML work that holds the GIL, so several uploads are
+# profiled in separate processes. app.py caps uploads at 3 files.
+MAX_PROFILE_WORKERS = int(os.environ.get("PROFILE_WORKERS", min(3, os.cpu_count() or 1)))
+# A workbook still being profiled after this long (hung or pathological
+# file) becomes an error entry, and its worker is killed.
+PROFILE_TIMEOUT_SECONDS = float(os.environ.get("PROFILE_TIMEOUT_SECONDS", "120"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def profile_workbooks(named_files: List[Tuple[str, bytes]], collect_stats: bool = True) -> List[Dict[str, Any]]:
+    """
+    Profiles several workbooks in parallel and returns their metadata entries
+    in the SAME order as named_files.
+
+    Bytes are handed to the workers through temp files that the workers mmap,
+    so the (potentially huge) payload is never pickled through the pool pipe.
+    A file that can't be parsed, crashes its worker or takes longer than
+    PROFILE_TIMEOUT_SECONDS becomes a per-file {"file_name": ..., "error": ...}
+    entry instead of failing the batch.
+    """
+    if len(named_files) <= 1 or MAX_PROFILE_WORKERS <= 1:
+        return [_profile_safely(name, data, collect_stats) for name, data in named_files]
+
+    with tempfile.TemporaryDirectory(prefix="workbook_profile_") as tmp_dir:
+        futures = []
+        for i, (name, data) in enumerate(named_files):
+            # Same extension as the upload (.xls isn't .xlsx)
+            path = os.path.join(tmp_dir, f"{i}{os.path.splitext(name)[1].lower() or '.xlsx'}")
+            with open(path, "wb") as f:
+                f.write(data)
+            futures.append(_get_pool().submit(_profile_path, name, path, collect_stats))
+
+        results = []
+        timed_out = False
+        for (name, _), future in zip(named_files, futures):
+            try:
+                results.append(future.result(timeout=PROFILE_TIMEOUT_SECONDS))
+            except FutureTimeoutError:
+                timed_out = True
+                results.append({"file_name": name, "error": f"Profiling timed out after {PROFILE_TIMEOUT_SECONDS:.0f}s"})
+            except BrokenProcessPool as e:
+                _reset_pool()
+                results.append({"file_name": name, "error": f"Profiler worker crashed: {str(e)}"})
+            except Exception as e:
+                results.append({"file_name": name, "error": f"Could not read Excel file: {str(e)}"})
+        if timed_out:
+            # Every other file is collected by now; the stuck worker would
+            # otherwise hold its slot (and the temp file) forever
+            _kill_pool()
+        return results
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the Streamlit/ADK parent process is multi-threaded
+        _pool = ProcessPoolExecutor(
+            max_workers=MAX_PROFILE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def _reset_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _kill_pool():
+    # shutdown() can't stop a running task, so terminate the workers first
+    if _pool is not None:
+        for process in list((_pool._processes or {}).values()):
+            process.terminate()
+    _reset_pool()
+
+
+def _profile_path(file_name: str, path: str, collect_stats: bool) -> Dict[str, Any]:
+    """Worker entry point: maps the temp file read-only and profiles it."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return {"file_name": file_name, "error": "Could not read Excel file: file is empty"}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, _MappedFile(mapped) as source:
+            return profile_workbook(file_name, source, collect_stats)
+
+
+class _MappedFile(io.RawIOBase):
+    """Seekable file over a buffer (an mmap or a view of one), without copying it."""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self._pos = offset
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        # Let go of the buffer so the mmap behind it can be closed
+        self._view.release()
+        super().close()
+
+
+def _profile_safely(file_name: str, data: bytes, collect_stats: bool) -> Dict[str, Any]:
+    try:
+        return profile_workbook(file_name, data, collect_stats)
+    except Exception as e:
+        return {"file_name": file_name, "error": f"Could not read Excel file: {str(e)}"}
+
+
+def profile_workbook(file_name: str, file_bytes: Union[bytes, BinaryIO], collect_stats: bool = True) -> Dict[str, Any]:
+    """
+    Builds the metadata entry for one workbook in a single pass.
+
+    The workbook is opened ONCE in read-only mode and each sheet is streamed
+    row by row, instead of re-parsing the whole zip container for every sheet.
+    With collect_stats the whole sheet is streamed to get the real row_count
+    and per-column statistics (constant memory per column).
+    file_bytes may be raw bytes or a seekable binary file (e.g. an mmap).
+    With FORMULA_GRAPH the sheet-to-sheet formula lineage is added as
+    "formula_graph" (see formula_graph.build_formula_graph).
+    Returns {"file_name": ..., "sheets": [...]} (or an "error" key).
+    """
+    try:
+        wb = load_workbook(_as_file(file_bytes), read_only=True, data_only=True)
+    except Exception:
+        # openpyxl only understands the xlsx family (.xls etc. go via pandas)
+        return profile_workbook_pandas(file_name, file_bytes)
+
+    file_info = {"file_name": file_name, "sheets": []}
+    try:
+        for sheet_name in wb.sheetnames:
+            try:
+                file_info["sheets"].append(_profile_sheet(wb[sheet_name], collect_stats))
+            except Exception as e:
+                file_info["sheets"].append({
+                    "sheet_name": sheet_name,
+                    "error": f"Could not read sheet: {str(e)}"
+                })
+        if FORMULA_GRAPH:
+            # data_only=True gives cached values, not formulas; the formulas
+            # are read straight from the sheet XML of the same open workbook
+            try:
+                file_info["formula_graph"] = build_formula_graph(wb)
+            except Exception as e:
+                file_info["formula_graph"] = {"error": f"Could not read formulas: {str(e)}"}
+    finally:
+        wb.close()
+
+    return file_info
+
+
+def _profile_sheet(ws, collect_stats: bool = True) -> Dict[str, Any]:
+    header = None
+    preview = []
+    row_count = 0
+    width = 0
+    stats: List[ColumnStats] = []
+
+    for row in ws.iter_rows(values_only=True):
+        row = _trim_row(row)
+        # Skip fully blank rows so a blank first row doesn't turn every
+        # column into 'Unnamed: n' (pd.read_excel keeps them)
+        if not row:
+            continue
+        if header is None:
+            header = row
+            width = len(row)
+            continue
+
+        row_count += 1
+        width = max(width, len(row))
+        if len(preview) < PREVIEW_ROWS:
+            preview.append(row)
+        elif not collect_stats:
+            break
+
+        if collect_stats:
+            while len(stats) < len(row):
+                stats.append(ColumnStats())
+            for column, value in zip(stats, row):
+                column.add(value)
+
+    columns = _column_names(header or (), width)
+
+    sample_rows = [
+        {col: _json_value(row[i] if i < len(row) else None) for i, col in enumerate(columns)}
+        for row in preview[:SAMPLE_ROWS]
+    ]
+
+    sheet_info = {
+        "sheet_name": ws.title,
+        "columns": columns,
+        "column_count": len(columns),
+        "sample_rows": sample_rows
+    }
+
+    if collect_stats:
+        # Columns that never had a value below the header still get an entry
+        stats += [ColumnStats() for _ in range(len(columns) - len(stats))]
+        sheet_info["row_count"] = row_count
+        sheet_info["column_stats"] = {
+            col: {k: _json_value(v) for k, v in column.to_dict(row_count).items()}
+            for col, column in zip(columns, stats)
+        }
+        # Consumed (and stripped) by join_hints; too noisy for the prompt
+        sheet_info["_signatures"] = {
+            col: column.minhash.signature()
+            for col, column in zip(columns, stats)
+            if column.non_null and column.dtype in SIGNATURE_DTYPES
+        }
+
+    return sheet_info
+
+
+def _as_file(source: Union[bytes, BinaryIO]) -> BinaryIO:
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    # e.g. a spilled upload from file_store
+    if isinstance(source, (memoryview, mmap.mmap)):
+        return _MappedFile(source)
+    source.seek(0)
+    return source
+
+
+def _trim_row(row: Sequence[Any]) -> tuple:
+    """Drops trailing empty cells (read-only sheets pad rows to the sheet width)."""
+    end = len(row)
+    while end and (row[end - 1] is None or row[end - 1] == ""):
+        end -= 1
+    return tuple(row[:end])
+
+
+def _column_names(header: Sequence[Any], width: int) -> List[str]:
+    """Same column naming pandas uses: 'Unnamed: i' for blanks, 'name.1' for repeats."""
+    names = []
+    seen = set()
+    for i in range(width):
+        value = header[i] if i < len(header) else None
+        name = f"Unnamed: {i}" if value is None or value == "" else str(value)
+
+        base, suffix = name, 1
+        while name in seen:
+            name = f"{base}.{suffix}"
+            suffix += 1
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _json_value(value: Any) -> Optional[Any]:
+    """Keeps sample values JSON serializable (dates become ISO strings)."""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return str(value)
+    return value
+
+
+# ----------------------------------------------------------------------------
+# Legacy pandas path
+# Used for formats openpyxl can't open (.xls) and as the benchmark baseline.
+# ----------------------------------------------------------------------------
+
+def profile_workbook_pandas(file_name: str, file_bytes: Union[bytes, BinaryIO]) -> Dict[str, Any]:
+    """Per-sheet pd.read_excel profiling (re-parses the file once per sheet)."""
+    file_info = {"file_name": file_name, "sheets": []}
+    excel_buffer = _as_file(file_bytes)
+
+    try:
+        xl = pd.ExcelFile(excel_buffer)
+        sheet_names = xl.sheet_names
+    except Exception as e:
+        file_info["error"] = f"Could not read Excel file: {str(e)}"
+        return file_info
+
+    for sheet_name in sheet_names:
+        excel_buffer.seek(0)
+        try:
+            # Read just a few rows to get structure
+            df = pd.read_excel(excel_buffer, sheet_name=sheet_name, nrows=PREVIEW_ROWS)
+
+            # Convert timestamps to strings to avoid JSON serialization errors
+            sample_data = df.head(SAMPLE_ROWS).astype(object).where(pd.notnull(df), None)
+
+            file_info["sheets"].append({
+                "sheet_name": sheet_name,
+                "columns": list(map(str, df.columns)),
+                "column_count": len(df.columns),
+                "sample_rows": [
+                    {k: _json_value(v) for k, v in row.items()}
+                    for row in sample_data.to_dict("records")
+                ] if len(df) > 0 else []
+            })
+        except Exception as e:
+            file_info["sheets"].append({
+                "sheet_name": sheet_name,
+                "error": f"Could not read sheet: {str(e)}"
+            })
+
+    return file_info
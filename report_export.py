@@ -0,0 +1,99 @@
+import hashlib
+import os
+import threading
+import time
+from io import BytesIO
+from typing import Any, Dict, Optional
+
+from docx import Document
+from docx.shared import Inches
+
+from cache_store import LRUCache
+
+# Built .docx files kept in memory, keyed on the report text + image bytes.
+DOCX_CACHE_ENTRIES = int(os.environ.get("DOCX_CACHE_ENTRIES", "16"))
+DOCX_CACHE_MAX_MB = int(os.environ.get("DOCX_CACHE_MAX_MB", "32"))
+
+
+def build_docx(report_text: str, image_bytes: Optional[bytes] = None) -> bytes:
+    """Converts Markdown to Docx (the process map is embedded from raw bytes)."""
+    doc = Document()
+    doc.add_heading('Final Process Report', 0)
+    lines = report_text.split('\n')
+
+    for line in lines:
+        line = line.strip()
+        if line.startswith('# '): doc.add_heading(line[2:], level=1)
+        elif line.startswith('## '): doc.add_heading(line[3:], level=2)
+        elif line.startswith('### '): doc.add_heading(line[4:], level=3)
+        elif "![Process Map]" in line:
+            doc.add_heading('Process Flowchart', level=2)
+            try:
+                if image_bytes:
+                    doc.add_picture(BytesIO(image_bytes), width=Inches(6))
+                else:
+                    doc.add_paragraph("[Image Missing]")
+            except Exception as e:
+                doc.add_paragraph(f"[Error rendering image: {e}]")
+        elif line.startswith('* ') or line.startswith('- '):
+            doc.add_paragraph(line[2:].replace('**', ''), style='List Bullet')
+        elif line:
+            doc.add_paragraph(line.replace('**', ''))
+
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def docx_cache_key(report_text: str, image_bytes: Optional[bytes] = None) -> str:
+    digest = hashlib.sha256(report_text.encode("utf-8"))
+    digest.update(b"\0image:")
+    digest.update(image_bytes or b"")
+    return digest.hexdigest()
+
+
+class DocxExportCache:
+    """
+    Memoizes build_docx: the same report (text + image) is only turned into
+    a Word document once, however many reruns, dialogs or downloads ask for it.
+    """
+
+    def __init__(self, max_entries: int = DOCX_CACHE_ENTRIES, max_bytes: int = DOCX_CACHE_MAX_MB * 1024 * 1024):
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes)
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.build_seconds = 0.0
+
+    def get_or_build(self, report_text: str, image_bytes: Optional[bytes] = None) -> bytes:
+        key = docx_cache_key(report_text, image_bytes)
+        data = self.memory.get(key)
+        if data is not None:
+            return data
+
+        start = time.perf_counter()
+        data = build_docx(report_text, image_bytes)
+        elapsed = time.perf_counter() - start
+        self.memory.put(key, data)
+        with self._lock:
+            self.builds += 1
+            self.build_seconds += elapsed
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "builds": self.builds,
+            "avg_build_ms": round(1000 * self.build_seconds / self.builds, 1) if self.builds else 0.0,
+            "memory": self.memory.stats(),
+        }
+
+
+docx_cache = DocxExportCache()
+
+
+def report_docx(report_text: str, image_bytes: Optional[bytes] = None) -> bytes:
+    """The .docx bytes for a report, from the cache when it was built before."""
+    return docx_cache.get_or_build(report_text, image_bytes)
+
+
+def get_docx_cache_stats() -> Dict[str, Any]:
+    return docx_cache.stats()
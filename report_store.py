@@ -0,0 +1,237 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+# zstd compresses report text better and faster; zlib (stdlib) otherwise.
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Saved reports live in this SQLite file, so they survive restarts. Keep it
+# on a mounted volume in containers (the Docker image uses /data).
+REPORT_STORE_DB = os.environ.get("REPORT_STORE_DB", os.path.join("data", "saved_reports.db"))
+# Per-user quota: past either limit the user's oldest reports are evicted.
+REPORT_QUOTA_COUNT = int(os.environ.get("REPORT_QUOTA_COUNT", "50"))
+REPORT_QUOTA_MB = int(os.environ.get("REPORT_QUOTA_MB", "50"))
+
+# First byte of a stored blob says how it was compressed, so switching
+# codecs never breaks reports saved earlier.
+_ZLIB = b"z"
+_ZSTD = b"s"
+
+
+def compress_text(text: str) -> bytes:
+    data = text.encode("utf-8")
+    if ZSTD_AVAILABLE:
+        return _ZSTD + zstandard.ZstdCompressor(level=9).compress(data)
+    return _ZLIB + zlib.compress(data, 9)
+
+
+def decompress_text(blob: bytes) -> str:
+    codec, data = blob[:1], blob[1:]
+    if codec == _ZSTD:
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("This report was saved with zstd compression; install 'zstandard' to read it.")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        data = zlib.decompress(data)
+    return data.decode("utf-8")
+
+
+class ReportStore:
+    """
+    Saved final reports in SQLite, per user.
+
+    - report text is stored compressed; process map PNGs (already
+      compressed) are stored once per distinct image (sha256), however
+      many reports use them
+    - list_reports() only reads ids/titles, load() reads one report on demand
+    - each user keeps at most max_reports / max_bytes: saving past the quota
+      evicts that user's oldest reports (and images nobody uses any more)
+    """
+
+    def __init__(self, db_path: str = REPORT_STORE_DB, max_reports: int = REPORT_QUOTA_COUNT,
+                 max_bytes: int = REPORT_QUOTA_MB * 1024 * 1024):
+        self.db_path = db_path
+        self.max_reports = max_reports
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.saves = 0
+        self.loads = 0
+        self.evictions = 0
+        self.images_deduplicated = 0
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        db = self._connect()
+        try:
+            with db:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS images ("
+                    "hash TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL)"
+                )
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS reports ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, title TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, content BLOB NOT NULL, content_size INTEGER NOT NULL, "
+                    "image_hash TEXT REFERENCES images(hash))"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS reports_by_user ON reports (user_id, created_at)")
+        finally:
+            db.close()
+
+    def save(self, user_id: str, title: str, content: str, png_bytes: Optional[bytes] = None) -> int:
+        """Stores a report and returns its id; then enforces the user's quota."""
+        blob = compress_text(content)
+        image_hash = hashlib.sha256(png_bytes).hexdigest() if png_bytes else None
+        db = self._connect()
+        try:
+            with db:  # one transaction: the report never points at a missing image
+                if image_hash:
+                    inserted = db.execute(
+                        "INSERT OR IGNORE INTO images (hash, data, size) VALUES (?, ?, ?)",
+                        (image_hash, png_bytes, len(png_bytes))
+                    ).rowcount
+                    if not inserted:
+                        self.images_deduplicated += 1
+                report_id = db.execute(
+                    "INSERT INTO reports (user_id, title, created_at, content, content_size, image_hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, title, time.time(), blob, len(blob), image_hash)
+                ).lastrowid
+                self._enforce_quota(db, user_id, keep=report_id)
+        finally:
+            db.close()
+        with self._lock:
+            self.saves += 1
+        return report_id
+
+    def list_reports(self, user_id: str) -> List[Dict[str, Any]]:
+        """The user's reports, newest first: id, title and created_at only."""
+        db = self._connect()
+        try:
+            rows = db.execute(
+                "SELECT id, title, created_at FROM reports WHERE user_id = ? ORDER BY created_at DESC, id DESC",
+                (user_id,)
+            ).fetchall()
+        finally:
+            db.close()
+        return [{"id": row[0], "title": row[1], "created_at": row[2]} for row in rows]
+
+    def load(self, user_id: str, report_id: int) -> Optional[Dict[str, Any]]:
+        """One full report ({id, title, created_at, content, png_bytes}), or None."""
+        db = self._connect()
+        try:
+            row = db.execute(
+                "SELECT r.id, r.title, r.created_at, r.content, i.data FROM reports r "
+                "LEFT JOIN images i ON i.hash = r.image_hash WHERE r.id = ? AND r.user_id = ?",
+                (report_id, user_id)
+            ).fetchone()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        with self._lock:
+            self.loads += 1
+        return {
+            "id": row[0],
+            "title": row[1],
+            "created_at": row[2],
+            "content": decompress_text(row[3]),
+            "png_bytes": bytes(row[4]) if row[4] is not None else None,
+        }
+
+    def delete(self, user_id: str, report_id: int) -> bool:
+        db = self._connect()
+        try:
+            with db:
+                deleted = db.execute(
+                    "DELETE FROM reports WHERE id = ? AND user_id = ?", (report_id, user_id)
+                ).rowcount
+                self._drop_unused_images(db)
+        finally:
+            db.close()
+        return bool(deleted)
+
+    def usage(self, user_id: str) -> Dict[str, int]:
+        db = self._connect()
+        try:
+            return self._usage(db, user_id)
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        db = self._connect()
+        try:
+            reports, users, content_bytes = db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT user_id), COALESCE(SUM(content_size), 0) FROM reports"
+            ).fetchone()
+            images, image_bytes = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images").fetchone()
+        finally:
+            db.close()
+        return {
+            "reports": reports,
+            "users": users,
+            "content_bytes": content_bytes,
+            "images": images,
+            "image_bytes": image_bytes,
+            "codec": "zstd" if ZSTD_AVAILABLE else "zlib",
+            "saves": self.saves,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "images_deduplicated": self.images_deduplicated,
+            "sqlite": self.db_path,
+        }
+
+    def _usage(self, db, user_id: str) -> Dict[str, int]:
+        # An image shared by several of the user's reports counts once
+        reports, content_bytes = db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(content_size), 0) FROM reports WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        (image_bytes,) = db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM images WHERE hash IN "
+            "(SELECT image_hash FROM reports WHERE user_id = ?)", (user_id,)
+        ).fetchone()
+        return {"reports": reports, "bytes": content_bytes + image_bytes}
+
+    def _enforce_quota(self, db, user_id: str, keep: int):
+        evicted = 0
+        while True:
+            usage = self._usage(db, user_id)
+            if usage["reports"] <= self.max_reports and usage["bytes"] <= self.max_bytes:
+                break
+            # Oldest first; the report just saved always stays
+            oldest = db.execute(
+                "SELECT id FROM reports WHERE user_id = ? AND id != ? ORDER BY created_at, id LIMIT 1",
+                (user_id, keep)
+            ).fetchone()
+            if oldest is None:
+                break
+            db.execute("DELETE FROM reports WHERE id = ?", oldest)
+            evicted += 1
+        if evicted:
+            self._drop_unused_images(db)
+            with self._lock:
+                self.evictions += evicted
+            print(f"Report store: evicted {evicted} old report(s) of user {user_id[:8]} (quota)")
+
+    def _drop_unused_images(self, db):
+        db.execute("DELETE FROM images WHERE hash NOT IN (SELECT image_hash FROM reports WHERE image_hash IS NOT NULL)")
+
+    def _connect(self):
+        # Short-lived connections, like the LLM cache: every Streamlit
+        # session runs in its own thread
+        return sqlite3.connect(self.db_path, timeout=10)
+
+
+REPORT_STORE = ReportStore()
+
+
+def get_report_store_stats() -> Dict[str, Any]:
+    return REPORT_STORE.stats()
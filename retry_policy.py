@@ -0,0 +1,244 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Any, Dict
+
+import httpx
+from google.api_core import exceptions as api_exceptions
+from google.genai import errors as genai_errors
+from pydantic import ValidationError
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the model while the endpoint is marked degraded."""
+
+
+class StreamInterruptedError(RuntimeError):
+    """A streamed answer failed after part of it was shown; starting over would repeat it."""
+
+
+# ----------------------------------------------------------------------------
+# Error classification
+# ----------------------------------------------------------------------------
+
+# Retrying these can't help: the same request fails the same way again.
+NON_RETRYABLE_ERRORS = (
+    json.JSONDecodeError,     # the model answered, just not with valid JSON
+    ValidationError,          # schema mismatch
+    CircuitOpenError,
+    StreamInterruptedError,
+    api_exceptions.PermissionDenied,
+    api_exceptions.Unauthenticated,
+    api_exceptions.InvalidArgument,
+    api_exceptions.NotFound,
+)
+
+# The model endpoint is overloaded / unreachable: worth retrying, and these
+# are what trips the circuit breaker.
+TRANSIENT_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    api_exceptions.ResourceExhausted,
+    genai_errors.ServerError,
+    httpx.TransportError,
+    asyncio.TimeoutError,
+    TimeoutError,
+    ConnectionError,
+)
+
+RETRYABLE_CLIENT_STATUS = (408, 429)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, NON_RETRYABLE_ERRORS):
+        return False
+    if isinstance(exc, genai_errors.ClientError):
+        # 4xx: only timeouts and rate limits go away on their own
+        return exc.code in RETRYABLE_CLIENT_STATUS
+    if "PermissionDenied" in str(exc) or "Unauthenticated" in str(exc):
+        return False
+    # Anything else (e.g. the agent called a tool but produced no final text)
+    # is usually model flakiness, so it keeps being retried as before.
+    return True
+
+
+def is_endpoint_failure(exc: BaseException) -> bool:
+    if isinstance(exc, genai_errors.ClientError):
+        return exc.code in RETRYABLE_CLIENT_STATUS
+    return isinstance(exc, TRANSIENT_ERRORS)
+
+
+# ----------------------------------------------------------------------------
+# Circuit breaker
+# ----------------------------------------------------------------------------
+
+class CircuitBreaker:
+    """
+    closed -> (failure_threshold endpoint failures in a row) -> open
+    open   -> (reset_timeout seconds) -> half-open: ONE trial call goes through
+    half-open -> success closes it again, failure re-opens it
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half-open"
+            if self.state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def record_response(self):
+        """The endpoint answered, but the call still failed (bad JSON, schema...): not an outage."""
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Call finished without telling us anything about the endpoint."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+# Every agent talks to the same model endpoint, so they share one breaker.
+MODEL_ENDPOINT_BREAKER = CircuitBreaker()
+
+
+# ----------------------------------------------------------------------------
+# Retry policy
+# ----------------------------------------------------------------------------
+
+_METRICS = {
+    "calls": 0,
+    "attempts": 0,
+    "retries": 0,
+    "retry_wait_seconds": 0.0,
+    "succeeded": 0,
+    "non_retryable_failures": 0,
+    "exhausted": 0,
+    "deadline_exceeded": 0,
+    "circuit_open_rejections": 0,
+}
+_metrics_lock = threading.Lock()
+
+
+def _count(name: str, amount=1):
+    with _metrics_lock:
+        _METRICS[name] += amount
+
+
+def get_retry_metrics() -> Dict[str, Any]:
+    with _metrics_lock:
+        metrics = dict(_METRICS)
+    metrics["retry_wait_seconds"] = round(metrics["retry_wait_seconds"], 3)
+    metrics["circuit_state"] = MODEL_ENDPOINT_BREAKER.state
+    return metrics
+
+
+class RetryPolicy:
+    """
+    Async retries for model calls:
+    - exponential backoff with full jitter: sleep ~ U(0, min(max_delay, base_delay * 2^attempt))
+    - only retryable errors are retried (see is_retryable)
+    - a deadline for the whole call, retries and waits included
+    - a shared circuit breaker that fails fast while the endpoint is degraded
+    Waiting uses asyncio.sleep, so it never blocks the Streamlit script thread.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 2.0, max_delay: float = 30.0,
+                 deadline: float = 180.0, breaker: CircuitBreaker = MODEL_ENDPOINT_BREAKER):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.breaker = breaker
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def run(self, func, *args, **kwargs):
+        """`func(*args, **kwargs)` must return a coroutine; it is re-created per attempt."""
+        _count("calls")
+        give_up_at = time.monotonic() + self.deadline
+
+        for attempt in range(self.max_attempts):
+            if not self.breaker.allow():
+                _count("circuit_open_rejections")
+                raise CircuitOpenError("Model endpoint is degraded (circuit open); try again shortly.")
+
+            remaining = give_up_at - time.monotonic()
+            _count("attempts")
+            try:
+                result = await asyncio.wait_for(func(*args, **kwargs), timeout=remaining)
+            except asyncio.CancelledError:
+                # Cancelled (stream closed, job cancelled): says nothing about
+                # the endpoint, but a half-open trial must not stay "in flight"
+                self.breaker.release()
+                raise
+            except Exception as e:
+                error_name = type(e).__name__
+                print(f"⚠️ [Attempt {attempt+1}/{self.max_attempts}] Hit error: {error_name} - {e}")
+
+                if isinstance(e, asyncio.TimeoutError) and time.monotonic() >= give_up_at:
+                    # Our own deadline ran out (e.g. a long streamed report):
+                    # slow isn't down, so the shared breaker doesn't count it
+                    self.breaker.release()
+                    _count("deadline_exceeded")
+                    print(f"❌ Deadline of {self.deadline}s reached, giving up.")
+                    raise
+                if is_endpoint_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    # Breaks the run of endpoint failures
+                    self.breaker.record_response()
+
+                if not is_retryable(e):
+                    _count("non_retryable_failures")
+                    raise
+
+                if attempt + 1 == self.max_attempts:
+                    _count("exhausted")
+                    print(f"❌ All {self.max_attempts} attempts failed.")
+                    raise
+
+                wait = self.backoff(attempt)
+                if time.monotonic() + wait >= give_up_at:
+                    _count("deadline_exceeded")
+                    print(f"❌ Deadline of {self.deadline}s reached, giving up.")
+                    raise
+
+                _count("retries")
+                _count("retry_wait_seconds", wait)
+                await asyncio.sleep(wait)
+            else:
+                self.breaker.record_success()
+                _count("succeeded")
+                return result
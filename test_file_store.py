@@ -0,0 +1,61 @@
+import hashlib
+import io
+
+import pandas as pd
+
+from file_store import FileStore
+from process_mapping_agent.tools.workbook_profiler import profile_workbook
+
+
+def _spilling_store():
+    # Everything spills: reads go through the blob's mmap
+    return FileStore(memory_budget=0, spill_threshold=1)
+
+
+def test_spilled_reads_share_one_mmap():
+    store = _spilling_store()
+    store["s"] = {"a.bin": b"hello world"}
+    blob = store._sessions["s"].blobs["a.bin"]
+
+    first = store["s"]["a.bin"]
+    second = store["s"]["a.bin"]
+    assert isinstance(first, memoryview)
+    assert bytes(first) == bytes(second) == b"hello world"
+    assert first.obj is second.obj is blob.mapped
+    assert hashlib.sha256(first).hexdigest() == hashlib.sha256(b"hello world").hexdigest()
+
+
+def test_discard_closes_the_mmap():
+    store = _spilling_store()
+    store["s"] = {"a.bin": b"hello world"}
+    blob = store._sessions["s"].blobs["a.bin"]
+    view = store["s"]["a.bin"]
+    mapped = blob.mapped
+    view.release()
+
+    assert store.discard("s")
+    assert mapped.closed
+    assert blob.mapped is None and blob.path is None
+
+
+def test_discard_with_a_live_view_doesnt_fail():
+    store = _spilling_store()
+    store["s"] = {"a.bin": b"hello world"}
+    view = store["s"]["a.bin"]
+
+    assert store.discard("s")
+    # The view keeps the pages mapped until it's released
+    assert bytes(view) == b"hello world"
+    view.release()
+
+
+def test_profiles_a_spilled_workbook():
+    buffer = io.BytesIO()
+    pd.DataFrame({"id": [1, 2, 3], "name": ["a", "b", "c"]}).to_excel(buffer, index=False, sheet_name="Data")
+    store = _spilling_store()
+    store["s"] = {"book.xlsx": buffer.getvalue()}
+
+    profile = profile_workbook("book.xlsx", store["s"]["book.xlsx"])
+    assert "error" not in profile
+    assert profile["sheets"][0]["sheet_name"] == "Data"
+    store.discard("s")
@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from job_queue import CANCELLED, DONE, FAILED, RUNNING, JobQueue, make_dedupe_key, report_progress
+
+
+@pytest.fixture
+def loop():
+    # Same setup as agent_runner: one long-lived loop in a daemon thread
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+
+    async def _cancel_all():
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(_cancel_all(), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    loop.close()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def _blocking_job(release: threading.Event, calls: list):
+    async def job(value):
+        calls.append(value)
+        report_progress("started")
+        await asyncio.to_thread(release.wait, 5)
+        return value * 2
+    return job
+
+
+def test_identical_jobs_are_shared(loop):
+    jobs = JobQueue(lambda: loop)
+    release, calls = threading.Event(), []
+    job = _blocking_job(release, calls)
+    key = make_dedupe_key("analysis", {"a": 1, "b": 2})
+
+    first = jobs.submit("alice", "analysis", job, 21, dedupe_key=key)
+    second = jobs.submit("bob", "analysis", job, 21, dedupe_key=make_dedupe_key("analysis", {"b": 2, "a": 1}))
+    assert first == second
+    _wait_for(lambda: jobs.status(first)["status"] == RUNNING)
+    assert jobs.status(first)["progress"] == "started"
+
+    release.set()
+    _wait_for(lambda: jobs.status(first)["status"] == DONE)
+    assert jobs.latest("alice", "analysis")["result"] == jobs.latest("bob", "analysis")["result"] == 42
+    assert calls == [21]
+    assert jobs.stats()["deduplicated"] == 1
+
+
+def test_finished_job_isnt_shared_again(loop):
+    jobs = JobQueue(lambda: loop)
+    release, calls = threading.Event(), []
+    release.set()
+    job = _blocking_job(release, calls)
+
+    first = jobs.submit("alice", "analysis", job, 1, dedupe_key="k")
+    _wait_for(lambda: jobs.status(first)["status"] == DONE)
+    second = jobs.submit("bob", "analysis", job, 1, dedupe_key="k")
+    assert second != first
+    _wait_for(lambda: jobs.status(second)["status"] == DONE)
+    assert calls == [1, 1]
+
+
+def test_cancel_waits_for_the_last_session(loop):
+    jobs = JobQueue(lambda: loop)
+    release, calls = threading.Event(), []
+    job_id = jobs.submit("alice", "analysis", _blocking_job(release, calls), 1, dedupe_key="k")
+    jobs.submit("bob", "analysis", _blocking_job(release, calls), 1, dedupe_key="k")
+    _wait_for(lambda: jobs.status(job_id)["status"] == RUNNING)
+
+    assert jobs.cancel(job_id, "alice") is False
+    assert jobs.status(job_id)["status"] == RUNNING
+    assert jobs.latest("alice", "analysis") is None
+    assert jobs.cancel(job_id, "bob") is True
+    _wait_for(lambda: jobs.status(job_id)["status"] == CANCELLED)
+    assert jobs.stats()["cancelled"] == 1
+    release.set()
+
+
+def test_new_submit_replaces_the_sessions_previous_job(loop):
+    jobs = JobQueue(lambda: loop)
+    release, calls = threading.Event(), []
+    first = jobs.submit("alice", "analysis", _blocking_job(release, calls), 1)
+    _wait_for(lambda: jobs.status(first)["status"] == RUNNING)
+
+    second = jobs.submit("alice", "analysis", _blocking_job(release, calls), 2)
+    _wait_for(lambda: jobs.status(first)["status"] == CANCELLED)
+    assert jobs.latest("alice", "analysis")["id"] == second
+    release.set()
+    _wait_for(lambda: jobs.status(second)["status"] == DONE)
+
+
+def test_queued_jobs_wait_for_a_worker(loop):
+    jobs = JobQueue(lambda: loop, workers=1)
+    release, calls = threading.Event(), []
+    first = jobs.submit("alice", "analysis", _blocking_job(release, calls), 1)
+    second = jobs.submit("bob", "analysis", _blocking_job(release, calls), 2)
+    _wait_for(lambda: jobs.status(first)["status"] == RUNNING)
+    assert jobs.status(second)["status"] == "queued"
+
+    release.set()
+    _wait_for(lambda: jobs.status(second)["status"] == DONE)
+    assert calls == [1, 2]
+
+
+def test_failures_are_reported(loop):
+    jobs = JobQueue(lambda: loop)
+
+    async def broken():
+        raise ValueError("bad input")
+
+    job_id = jobs.submit("alice", "analysis", broken)
+    _wait_for(lambda: jobs.status(job_id)["status"] == FAILED)
+    assert jobs.status(job_id)["error"] == "ValueError: bad input"
+
+
+def test_finished_jobs_expire_after_the_ttl(loop):
+    jobs = JobQueue(lambda: loop, ttl=0.05)
+    release, blocked, calls = threading.Event(), threading.Event(), []
+    release.set()
+    done = jobs.submit("alice", "analysis", _blocking_job(release, calls), 1)
+    _wait_for(lambda: jobs.status(done)["status"] == DONE)
+    running = jobs.submit("bob", "report", _blocking_job(blocked, calls), 2)
+    time.sleep(0.1)
+
+    jobs.submit("carol", "analysis", _blocking_job(release, calls), 3)
+    assert jobs.status(done) is None
+    assert jobs.latest("alice", "analysis") is None
+    assert "alice" not in jobs._by_session
+    # Unfinished jobs never expire
+    assert jobs.status(running)["status"] == RUNNING
+    blocked.set()
@@ -0,0 +1,73 @@
+import asyncio
+import sqlite3
+import time
+
+from llm_cache import LLMResponseCache
+
+
+class _Agent:
+    name = "test_agent"
+    model = "test-model"
+    instruction = "Answer."
+    output_schema = None
+    tools = []
+
+
+def _rows(cache):
+    db = sqlite3.connect(cache.db_path)
+    try:
+        return db.execute("SELECT key, response FROM llm_cache ORDER BY expires_at").fetchall()
+    finally:
+        db.close()
+
+
+def test_answers_survive_a_restart_through_sqlite(tmp_path):
+    db_path = str(tmp_path / "llm.db")
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return "answer"
+
+    first = LLMResponseCache(db_path=db_path)
+    assert asyncio.run(first.run(_Agent(), '{"a": 1, "b": 2}', call)) == "answer"
+    # New process, empty memory tier; key order doesn't matter
+    second = LLMResponseCache(db_path=db_path)
+    assert asyncio.run(second.run(_Agent(), '{"b": 2, "a": 1}', call)) == "answer"
+    assert len(calls) == 1
+    assert second.stats()["hits"] == 1
+
+
+def test_prune_deletes_expired_rows(tmp_path):
+    cache = LLMResponseCache(ttl=3600, db_path=str(tmp_path / "llm.db"))
+    cache.put("fresh", "a", "kept", 1.0)
+    cache.ttl = -1
+    cache.put("stale", "a", "gone", 1.0)
+
+    assert cache.prune() == 1
+    assert _rows(cache) == [("fresh", "kept")]
+
+
+def test_prune_caps_rows_and_bytes(tmp_path):
+    cache = LLMResponseCache(db_path=str(tmp_path / "llm.db"), max_db_entries=3, max_db_bytes=10**6,
+                             prune_every=1000)
+    for i in range(5):
+        cache.put(f"k{i}", "a", "x" * 10, 1.0)
+        time.sleep(0.001)  # distinct expiry times
+    cache.prune()
+    # The entries closest to expiry (the oldest) go first
+    assert [key for key, _ in _rows(cache)] == ["k2", "k3", "k4"]
+
+    cache.max_db_bytes = 25
+    cache.prune()
+    assert [key for key, _ in _rows(cache)] == ["k3", "k4"]
+    assert cache.stats()["sqlite_pruned"] == 3
+
+
+def test_put_prunes_every_n_stores(tmp_path):
+    cache = LLMResponseCache(db_path=str(tmp_path / "llm.db"), max_db_entries=2, prune_every=4)
+    for i in range(3):
+        cache.put(f"k{i}", "a", "x", 1.0)
+    assert len(_rows(cache)) == 3
+    cache.put("k3", "a", "x", 1.0)
+    assert len(_rows(cache)) == 2
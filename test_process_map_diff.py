@@ -0,0 +1,80 @@
+# test_process_map_diff.py
+
+from process_mapping_agent.tools.process_map_diff import diff_process_maps, match_steps, summarize_changes
+
+
+def _steps(*names):
+    return [{"step_name": name, "role": "Clerk"} for name in names]
+
+
+def test_identical_maps_have_no_changes():
+    diff = diff_process_maps(_steps("A", "B"), _steps("A", "B"))
+    assert not diff["has_changes"] and summarize_changes(diff) == "none"
+
+
+def test_step_number_alone_is_not_a_change():
+    old = [{"step_name": "A", "step_number": 1}]
+    new = [{"step_name": "A", "step_number": 5}]
+    assert not diff_process_maps(old, new)["has_changes"]
+
+
+def test_rename_in_place_is_an_edit_not_add_and_remove():
+    diff = diff_process_maps(_steps("A", "B", "C"), _steps("A", "B2", "C"))
+    assert not diff["added"] and not diff["removed"] and not diff["structural"]
+    assert diff["modified"] == [{"index": 1, "step_name": "B2", "changes": {"step_name": ["B", "B2"]}}]
+    assert diff["redraw_nodes"] == [1]
+
+
+def test_description_edit_needs_no_redraw():
+    old = _steps("A")
+    new = [{**old[0], "description": "more detail"}]
+    diff = diff_process_maps(old, new)
+    assert diff["modified"] and diff["redraw_nodes"] == []
+    assert summarize_changes(diff) == "Step 1: description updated"
+
+
+def test_insert_and_remove_are_structural():
+    diff = diff_process_maps(_steps("A", "B", "C"), _steps("A", "X", "B"))
+    assert diff["added"] == [{"index": 1, "step_name": "X"}]
+    assert diff["removed"] == [{"index": 2, "step_name": "C"}]
+    assert diff["structural"] and not diff["modified"]
+    assert diff["edges_added"] == [[0, 1], [1, 2]]
+
+
+def test_rename_inside_an_uneven_gap_is_remove_and_add():
+    diff = diff_process_maps(_steps("A", "B", "C"), _steps("A", "New", "B2", "C"))
+    # "B2" can't pair by name, nor by position (1 old vs 2 new steps in the gap)
+    assert {s["step_name"] for s in diff["added"]} == {"New", "B2"}
+    assert diff["removed"] == [{"index": 1, "step_name": "B"}]
+
+
+def test_step_id_wins_over_name():
+    old = [{"step_id": "s1", "step_name": "A"}, {"step_id": "s2", "step_name": "B"}]
+    new = [{"step_id": "s2", "step_name": "A"}, {"step_id": "s1", "step_name": "B"}]
+    assert match_steps(old, new) == {0: 1, 1: 0}
+
+
+def test_duplicate_names_pair_in_order():
+    assert match_steps(_steps("Check", "Check"), _steps("Check", "Check")) == {0: 0, 1: 1}
+
+
+def test_moving_one_step_reports_only_that_step():
+    # Longest increasing run: the other four steps kept their order
+    diff = diff_process_maps(_steps("A", "B", "C", "D", "E"), _steps("E", "A", "B", "C", "D"))
+    assert diff["moved"] == [{"step_name": "E", "from": 4, "to": 0}]
+    assert diff["structural"] and not diff["added"] and not diff["removed"]
+    assert summarize_changes(diff) == "Moved 'E' from step 5 to 1"
+
+
+def test_swapping_two_steps_moves_one():
+    diff = diff_process_maps(_steps("A", "B"), _steps("B", "A"))
+    assert len(diff["moved"]) == 1
+
+
+def test_summary_lists_every_kind_of_change():
+    old = _steps("A", "B", "C")
+    new = [{"step_name": "A", "role": "Manager"}] + _steps("C", "D")
+    summary = summarize_changes(diff_process_maps(old, new))
+    assert "Added step 3 'D'" in summary
+    assert "Removed step 'B'" in summary
+    assert "Step 1: role 'Clerk' -> 'Manager'" in summary
@@ -0,0 +1,152 @@
+# test_process_map_patch.py
+
+from process_mapping_agent.tools.process_map_patch import apply_step_ops, assign_step_ids
+
+
+def _map(*names):
+    return assign_step_ids([{"step_name": name} for name in names])
+
+
+def _names(steps):
+    return [step["step_name"] for step in steps]
+
+
+def _ids(steps):
+    return [step["step_id"] for step in steps]
+
+
+# --- assign_step_ids ---
+
+def test_ids_follow_positions_and_numbers_are_recomputed():
+    steps = assign_step_ids([{"step_name": "A", "step_number": 7}, {"step_name": "B"}])
+    assert _ids(steps) == ["s1", "s2"]
+    assert [s["step_number"] for s in steps] == [1, 2]
+
+
+def test_existing_ids_are_kept_and_never_handed_out_again():
+    steps = assign_step_ids([{"step_name": "A"}, {"step_name": "B", "step_id": "s1"}])
+    assert _ids(steps) == ["s2", "s1"]
+
+
+def test_duplicate_incoming_ids_keep_the_first_and_renumber_the_rest():
+    steps = assign_step_ids([{"step_name": "A", "step_id": "s1"}, {"step_name": "B", "step_id": "s1"}])
+    assert _ids(steps) == ["s1", "s2"]
+
+
+def test_assign_does_not_modify_the_input():
+    original = [{"step_name": "A"}]
+    assign_step_ids(original)
+    assert original == [{"step_name": "A"}]
+
+
+# --- insert ---
+
+def test_insert_keeps_a_free_requested_id():
+    steps, applied, rejected = apply_step_ops(_map("A", "B"), [
+        {"op": "insert", "step_id": "n1", "after_step_id": "s1", "fields": {"step_name": "New"}},
+    ])
+    assert _names(steps) == ["A", "New", "B"]
+    assert steps[1]["step_id"] == "n1"
+    assert "requested_step_id" not in applied[0] and not rejected
+
+
+def test_insert_with_an_id_in_use_gets_a_fresh_one():
+    steps, applied, _ = apply_step_ops(_map("A", "B"), [
+        {"op": "insert", "step_id": "s1", "after_step_id": "s2", "fields": {"step_name": "New"}},
+    ])
+    assert _ids(steps) == ["s1", "s2", "s3"]
+    assert applied[0]["step_id"] == "s3"
+    assert applied[0]["requested_step_id"] == "s1"
+
+
+def test_insert_without_id_reports_the_given_one():
+    steps, applied, _ = apply_step_ops(_map("A"), [
+        {"op": "insert", "after_step_id": None, "fields": {"step_name": "First"}},
+    ])
+    assert _names(steps) == ["First", "A"]
+    assert applied[0]["step_id"] == "s2" and applied[0]["requested_step_id"] is None
+    assert [s["step_number"] for s in steps] == [1, 2]
+
+
+def test_insert_needs_a_name_and_a_known_anchor():
+    steps, applied, rejected = apply_step_ops(_map("A"), [
+        {"op": "insert", "fields": {"role": "Clerk"}},
+        {"op": "insert", "after_step_id": "zz", "fields": {"step_name": "X"}},
+    ])
+    assert _names(steps) == ["A"] and not applied
+    assert [r["error"] for r in rejected] == ["insert needs fields.step_name", "unknown step_id 'zz'"]
+
+
+def test_delete_then_reinsert_under_the_same_id_gets_a_new_id():
+    # A deleted id is never reused within a patch, so the diff sees a
+    # removal + an addition rather than an edit of the old step
+    steps, applied, rejected = apply_step_ops(_map("A", "B", "C"), [
+        {"op": "delete", "step_id": "s2"},
+        {"op": "insert", "step_id": "s2", "after_step_id": "s1", "fields": {"step_name": "B2"}},
+    ])
+    assert _names(steps) == ["A", "B2", "C"]
+    assert _ids(steps) == ["s1", "s4", "s3"]
+    assert applied[1]["requested_step_id"] == "s2" and not rejected
+
+
+# --- update ---
+
+def test_update_changes_only_the_given_fields():
+    start = assign_step_ids([{"step_name": "A", "role": "Clerk", "description": "old"}])
+    steps, _, rejected = apply_step_ops(start, [
+        {"op": "update", "step_id": "s1", "fields": {"description": "new", "role": None}},
+    ])
+    assert not rejected
+    assert steps[0]["role"] == "Clerk" and steps[0]["description"] == "new" and steps[0]["step_id"] == "s1"
+
+
+def test_update_with_empty_condition_clears_it():
+    start = assign_step_ids([{"step_name": "A", "decision_point": True, "condition": "ok?"}])
+    steps, _, _ = apply_step_ops(start, [{"op": "update", "step_id": "s1", "fields": {"condition": ""}}])
+    assert steps[0]["condition"] is None
+
+
+def test_invalid_update_is_rejected_and_leaves_the_step_alone():
+    start = _map("A")
+    steps, applied, rejected = apply_step_ops(start, [
+        {"op": "update", "step_id": "s1", "fields": {"decision_point": "maybe"}},
+        {"op": "update", "step_id": "s1", "fields": {}},
+    ])
+    assert steps == start and not applied
+    assert rejected[0]["error"].startswith("invalid step")
+    assert rejected[1]["error"] == "update without fields"
+
+
+# --- delete / move / unknown ---
+
+def test_delete_unknown_id_is_rejected_and_the_rest_applies():
+    steps, applied, rejected = apply_step_ops(_map("A", "B"), [
+        {"op": "delete", "step_id": "zz"},
+        {"op": "delete", "step_id": "s1"},
+    ])
+    assert _names(steps) == ["B"] and steps[0]["step_number"] == 1
+    assert len(applied) == 1 and rejected[0]["error"] == "unknown step_id 'zz'"
+
+
+def test_move_to_the_front_and_after_another_step():
+    steps, _, rejected = apply_step_ops(_map("A", "B", "C"), [
+        {"op": "move", "step_id": "s3", "after_step_id": None},
+        {"op": "move", "step_id": "s1", "after_step_id": "s2"},
+    ])
+    assert _names(steps) == ["C", "B", "A"] and not rejected
+
+
+def test_move_after_itself_is_rejected():
+    steps, _, rejected = apply_step_ops(_map("A", "B"), [{"op": "move", "step_id": "s1", "after_step_id": "s1"}])
+    assert _names(steps) == ["A", "B"]
+    assert rejected[0]["error"] == "a step can't move after itself"
+
+
+def test_move_to_an_unknown_anchor_leaves_the_step_in_place():
+    steps, _, rejected = apply_step_ops(_map("A", "B"), [{"op": "move", "step_id": "s2", "after_step_id": "zz"}])
+    assert _names(steps) == ["A", "B"] and len(rejected) == 1
+
+
+def test_unknown_op_is_rejected():
+    _, applied, rejected = apply_step_ops(_map("A"), [{"op": "rename", "step_id": "s1"}])
+    assert not applied and rejected[0]["error"] == "unknown op 'rename'"
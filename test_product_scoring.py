@@ -0,0 +1,30 @@
+# test_product_scoring.py
+
+from process_mapping_agent.tools.product_scoring import extract_features, score_tools
+
+
+def _process(*steps, issues=()):
+    return {
+        "process_map": [{"step_name": name, "description": desc, "role": "Finance"} for name, desc in steps],
+        "issues": list(issues),
+        "opportunities": [],
+    }
+
+
+def test_excel_only_process_gets_no_microsoft_bonus():
+    features = extract_features(_process(
+        ("Export ledger", "Copy the totals into the Excel workbook."),
+        ("Update tracker", "Paste the figures into the monthly Excel sheet."),
+        issues=["Manual copy between Excel files"],
+    ))
+    assert not features["flags"]["microsoft"]
+    assert features["flags"]["tabular"]
+    for tool, _, because in score_tools(features):
+        assert "microsoft" not in because, tool
+
+
+def test_explicit_microsoft_tooling_still_counts():
+    features = extract_features(_process(
+        ("Send reminder", "Chase the approver in Outlook and Teams."),
+    ))
+    assert features["flags"]["microsoft"]
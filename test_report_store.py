@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+# Importing the module opens the shared store; keep it out of ./data
+os.environ.setdefault("REPORT_STORE_DB", os.path.join(tempfile.mkdtemp(), "saved_reports.db"))
+
+import report_store
+from report_store import ReportStore, compress_text, decompress_text
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"image" * 100
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ReportStore(db_path=str(tmp_path / "reports.db"), max_reports=3, max_bytes=10**6)
+
+
+def _image_count(store):
+    db = sqlite3.connect(store.db_path)
+    try:
+        return db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+    finally:
+        db.close()
+
+
+def test_codec_round_trip():
+    text = "Process report ✓\n" * 200
+    blob = compress_text(text)
+    assert len(blob) < len(text.encode("utf-8"))
+    assert decompress_text(blob) == text
+
+
+def test_zlib_reports_stay_readable(monkeypatch):
+    monkeypatch.setattr(report_store, "ZSTD_AVAILABLE", False)
+    blob = compress_text("old report")
+    assert blob[:1] == b"z"
+    monkeypatch.undo()
+    assert decompress_text(blob) == "old report"
+
+
+def test_zstd_report_without_zstandard_says_so(monkeypatch):
+    monkeypatch.setattr(report_store, "ZSTD_AVAILABLE", False)
+    with pytest.raises(RuntimeError, match="zstandard"):
+        decompress_text(b"s" + b"whatever")
+
+
+def test_save_and_load_are_per_user(store):
+    report_id = store.save("alice", "Q1", "report text", PNG)
+
+    loaded = store.load("alice", report_id)
+    assert loaded["title"] == "Q1"
+    assert loaded["content"] == "report text"
+    assert loaded["png_bytes"] == PNG
+    assert store.load("bob", report_id) is None
+    assert store.delete("bob", report_id) is False
+    assert [r["id"] for r in store.list_reports("alice")] == [report_id]
+    assert store.list_reports("bob") == []
+
+
+def test_identical_images_are_stored_once(store):
+    first = store.save("alice", "one", "a", PNG)
+    second = store.save("bob", "two", "b", PNG)
+    assert _image_count(store) == 1
+    assert store.stats()["images_deduplicated"] == 1
+
+    # The image stays as long as any report uses it
+    assert store.delete("alice", first)
+    assert _image_count(store) == 1
+    assert store.load("bob", second)["png_bytes"] == PNG
+    assert store.delete("bob", second)
+    assert _image_count(store) == 0
+
+
+def test_quota_evicts_the_users_oldest_reports(store):
+    ids = [store.save("alice", f"r{i}", f"report {i}", PNG + bytes([i])) for i in range(5)]
+    other = store.save("bob", "mine", "untouched")
+
+    assert [r["id"] for r in store.list_reports("alice")] == ids[:1:-1]
+    assert store.load("bob", other) is not None
+    assert store.stats()["evictions"] == 2
+    # Images only the evicted reports used are gone too
+    assert _image_count(store) == 3
+
+
+def test_byte_quota_keeps_the_report_just_saved(tmp_path):
+    store = ReportStore(db_path=str(tmp_path / "reports.db"), max_reports=10, max_bytes=len(PNG) + 100)
+    first = store.save("alice", "one", "a", PNG)
+    second = store.save("alice", "two", "b", PNG + b"x")
+
+    assert store.load("alice", first) is None
+    assert store.load("alice", second) is not None
+    # Over budget on its own, but the newest report is never evicted
+    big = store.save("alice", "big", "c", PNG * 3)
+    assert [r["id"] for r in store.list_reports("alice")] == [big]
+
+
+def test_usage_counts_a_shared_image_once(store):
+    store.save("alice", "one", "a", PNG)
+    store.save("alice", "two", "b", PNG)
+    usage = store.usage("alice")
+    assert usage["reports"] == 2
+    assert len(PNG) < usage["bytes"] < 2 * len(PNG)
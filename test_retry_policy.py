@@ -0,0 +1,83 @@
+# test_retry_policy.py
+
+import asyncio
+
+from retry_policy import CircuitBreaker, RetryPolicy
+
+
+def _half_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()  # open; reset_timeout 0 -> next allow() is the trial
+    return breaker
+
+
+def test_cancelled_half_open_trial_releases_the_breaker():
+    breaker = _half_open_breaker()
+    policy = RetryPolicy(max_attempts=1, breaker=breaker)
+
+    async def main():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(60)
+
+        task = asyncio.ensure_future(policy.run(hang))
+        await started.wait()
+        assert breaker.state == "half-open"
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(main())
+    # The cancelled trial must not keep the breaker shut for good
+    assert breaker.allow()
+
+
+def test_half_open_trial_success_closes_the_breaker():
+    breaker = _half_open_breaker()
+    policy = RetryPolicy(max_attempts=1, breaker=breaker)
+
+    async def ok():
+        return "done"
+
+    assert asyncio.run(policy.run(ok)) == "done"
+    assert breaker.state == "closed"
+
+
+def test_client_deadline_doesnt_count_as_an_endpoint_failure():
+    breaker = CircuitBreaker(failure_threshold=1)
+    policy = RetryPolicy(max_attempts=3, deadline=0.05, breaker=breaker)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    try:
+        asyncio.run(policy.run(slow))
+    except asyncio.TimeoutError:
+        pass
+    else:
+        raise AssertionError("expected the deadline to expire")
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_endpoint_failures_must_be_consecutive_to_open_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=2)
+    errors = [ConnectionError("down"), ValueError("no final text"), ConnectionError("down")]
+    policy = RetryPolicy(max_attempts=3, base_delay=0.0, breaker=breaker)
+
+    async def flaky():
+        raise errors.pop(0)
+
+    try:
+        asyncio.run(policy.run(flaky))
+    except ConnectionError:
+        pass
+    # down, answered, down: never two endpoint failures in a row
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
@@ -7,6 +7,7 @@ sys.path.append(os.getcwd())
 
 # Import your tool directly
 from process_mapping_agent.tools.generate_process_diagram_tool import generate_process_diagram_tool
+from process_mapping_agent.tools.diagram_store import get_diagram
 
 # The exact data structure your Understanding Agent outputs (A LIST of Dicts)
 MOCK_DATA = [
@@ -20,16 +21,17 @@ print("--- STARTING LOCAL TOOL TEST ---")
 
 # 1. Run the function
 try:
-    result_path = generate_process_diagram_tool(MOCK_DATA)
+    result_ref = generate_process_diagram_tool(MOCK_DATA)
     print(f"✅ Tool executed successfully!")
-    print(f"📍 Result Path: {result_path}")
+    print(f"📍 Result Reference: {result_ref}")
     
-    # 2. Verify the file exists
-    if os.path.exists(result_path) and result_path.endswith('.png'):
-        print(f"✅ File actually exists at {result_path}")
-        print(f"📂 Size: {os.path.getsize(result_path)} bytes")
+    # 2. Verify the PNG is in the in-memory diagram store
+    png_bytes = get_diagram(result_ref)
+    if png_bytes and png_bytes.startswith(b"\x89PNG"):
+        print(f"✅ Diagram is in the store under {result_ref}")
+        print(f"📂 Size: {len(png_bytes)} bytes")
     else:
-        print(f"❌ File missing or invalid extension.")
+        print(f"❌ Diagram missing from the store or not a PNG.")
 
 except Exception as e:
     print(f"❌ Tool crashed: {e}")
\ No newline at end of file